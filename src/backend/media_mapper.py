@@ -1,49 +1,183 @@
+import logging
 import os
 import re
+import threading
+
+logger = logging.getLogger("overlay")
 
 IMAGE_EXTS = {".jpg", ".jpeg", ".png"}
 GIF_EXTS = {".gif"}
 VIDEO_EXTS = {".mp4", ".webm"}
+# What overlay.html can show for a chat trigger (it tries these extensions in order)
+OVERLAY_IMAGE_EXTENSIONS = (".gif", ".jpg", ".jpeg", ".png", ".webp")
 
-def get_media_files(base_dir):
-    mapping = {}
+OVERLAY_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "overlay"))
+RESCAN_DELAY = 0.25  # seconds of filesystem quiet before the index is rebuilt
+
+
+def _scan_dir(path):
+    if not os.path.isdir(path):
+        return []
+    with os.scandir(path) as it:
+        return [(entry.name, entry.is_file()) for entry in it]
+
+
+def scan_overlay_media(base_dir):
+    """Scan gifs/ and gifs/heart/ once.
+
+    Returns (heart_bases, gif_bases, media): the bases the chat overlay triggers
+    use, and the get_media_files() mapping of command -> (rel_path, duration, is_gif).
+    """
+    heart_bases = set()
+    gif_bases = set()
+    media = {}
 
     gifs_dir = os.path.join(base_dir, "gifs")
     heart_dir = os.path.join(gifs_dir, "heart")
 
     # 1. Standard gifs/images in gifs/
-    if os.path.isdir(gifs_dir):
-        for fname in os.listdir(gifs_dir):
-            fpath = os.path.join(gifs_dir, fname)
-            rel_path = os.path.relpath(fpath, base_dir).replace("\\", "/")
-            ext = os.path.splitext(fname)[1].lower()
-            command = os.path.splitext(fname)[0].lower()
-            if os.path.isfile(fpath) and (ext in IMAGE_EXTS or ext in GIF_EXTS or ext in VIDEO_EXTS):
-                is_gif = ext in GIF_EXTS
-                duration = 3 if is_gif else 5
-                mapping[f"!{command}"] = (rel_path, duration, is_gif)
+    for fname, is_file in _scan_dir(gifs_dir):
+        if not is_file:
+            continue
+        name, ext = os.path.splitext(fname)
+        ext = ext.lower()
+        if ext in OVERLAY_IMAGE_EXTENSIONS:
+            gif_bases.add(name)
+        if ext in IMAGE_EXTS or ext in GIF_EXTS or ext in VIDEO_EXTS:
+            is_gif = ext in GIF_EXTS
+            duration = 3 if is_gif else 5
+            media[f"!{name.lower()}"] = (f"gifs/{fname}", duration, is_gif)
 
     # 2. Heart gifs/images in gifs/heart/
-    if os.path.isdir(heart_dir):
-        for fname in os.listdir(heart_dir):
-            fpath = os.path.join(heart_dir, fname)
-            rel_path = os.path.relpath(fpath, base_dir).replace("\\", "/")
-            ext = os.path.splitext(fname)[1].lower()
-            base = os.path.splitext(fname)[0].lower()  # e.g. dar, dar2, hop
-            if os.path.isfile(fpath) and (ext in IMAGE_EXTS or ext in GIF_EXTS or ext in VIDEO_EXTS):
-                is_gif = ext in GIF_EXTS
-                duration = 3 if is_gif else 5
-                m = re.match(r"([a-z]+)(\d*)$", base)
-                if m:
-                    name = m.group(1)   # e.g. "dar"
-                    num = m.group(2)    # e.g. "", "2", etc.
-                    cmd = f"!{name}<3{num}"
-                    mapping[cmd] = (rel_path, duration, is_gif)
-    return mapping
+    for fname, is_file in _scan_dir(heart_dir):
+        if not is_file:
+            continue
+        name, ext = os.path.splitext(fname)
+        ext = ext.lower()
+        if ext in OVERLAY_IMAGE_EXTENSIONS and re.match(r"^([a-z][a-z0-9]*)(\d*)$", name):
+            heart_bases.add(name)
+        if ext in IMAGE_EXTS or ext in GIF_EXTS or ext in VIDEO_EXTS:
+            is_gif = ext in GIF_EXTS
+            duration = 3 if is_gif else 5
+            m = re.match(r"([a-z]+)(\d*)$", name.lower())  # e.g. dar, dar2, hop
+            if m:
+                media[f"!{m.group(1)}<3{m.group(2)}"] = (f"gifs/heart/{fname}", duration, is_gif)
+    return heart_bases, gif_bases, media
+
+
+def build_overlay_commands(heart_bases, gif_bases):
+    """Map every chat command the overlay answers to its overlay action.
+
+    A heart base like 'dar2' answers both !dar2<3 and !dar<32, so every split of
+    the base into a name and trailing digits gets its own entry.
+    """
+    overlay_commands = {}
+    for base in heart_bases:
+        action = f"trigger_{base}_heart"
+        for i in range(1, len(base) + 1):
+            name, number = base[:i], base[i:]
+            if re.match(r"^[a-z][a-z0-9]*$", name) and re.match(r"^\d*$", number):
+                overlay_commands[f"!{name}<3{number}"] = action
+    for base in gif_bases:
+        if re.match(r"^[a-z0-9_]+$", base):
+            overlay_commands[f"!{base}"] = f"trigger_{base}"
+    return overlay_commands
+
+
+def get_media_files(base_dir):
+    return scan_overlay_media(base_dir)[2]
+
+
+class OverlayMediaIndex:
+    """In-memory index of the overlay media, rebuilt by a filesystem watcher.
+
+    Chat lookups only read self.commands (a dict swapped in whole on rebuild), so
+    the event loop never touches the disk. version goes up every time the set of
+    media changes.
+    """
+
+    def __init__(self, base_dir=OVERLAY_DIR):
+        self.base_dir = base_dir
+        self.gifs_dir = os.path.join(base_dir, "gifs")
+        self.version = 0
+        self.heart_bases = set()
+        self.gif_bases = set()
+        self.media = {}
+        self.commands = {}
+        self.observer = None
+        self._timer = None
+        self._lock = threading.Lock()
+        self.rescan()
+
+    def rescan(self):
+        heart_bases, gif_bases, media = scan_overlay_media(self.base_dir)
+        with self._lock:
+            if heart_bases == self.heart_bases and gif_bases == self.gif_bases and media == self.media:
+                return False
+            self.heart_bases = heart_bases
+            self.gif_bases = gif_bases
+            self.media = media
+            self.commands = build_overlay_commands(heart_bases, gif_bases)
+            self.version += 1
+        logger.info(f"[OverlayMediaIndex] v{self.version}: {len(heart_bases)} heart bases, {len(gif_bases)} gif bases")
+        return True
+
+    def schedule_rescan(self):
+        # Debounce bursts of filesystem events (copying a folder of gifs) into one rescan
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(RESCAN_DELAY, self.rescan)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def start_watching(self):
+        if self.observer is not None:
+            return
+        if not os.path.isdir(self.base_dir):
+            logger.warning(f"[OverlayMediaIndex] {self.base_dir} does not exist, not watching for new media.")
+            return
+        from watchdog.observers import Observer
+        from watchdog.events import FileSystemEventHandler
+
+        index = self
+
+        class _Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                paths = [event.src_path, getattr(event, "dest_path", "")]
+                if any(p and os.path.abspath(p).startswith(index.gifs_dir) for p in paths):
+                    index.schedule_rescan()
+
+        self.observer = Observer()
+        # Watch the overlay dir itself so creating gifs/ later is noticed too
+        self.observer.schedule(_Handler(), self.base_dir, recursive=True)
+        self.observer.daemon = True
+        self.observer.start()
+
+    def stop_watching(self):
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer.join()
+            self.observer = None
+        if self._timer is not None:
+            self._timer.cancel()
+
+
+_overlay_index = None
+
+
+def get_overlay_index():
+    """Return the process-wide OverlayMediaIndex, starting its watcher on first use."""
+    global _overlay_index
+    if _overlay_index is None:
+        _overlay_index = OverlayMediaIndex()
+        _overlay_index.start_watching()
+    return _overlay_index
+
 
 if __name__ == "__main__":
     # For dev test: print the mapping
     base_dir = os.path.dirname(__file__)
     mapping = get_media_files(base_dir=os.path.join(base_dir, "../overlay"))
     for cmd, (rel, dur, gif) in mapping.items():
-        print(f"{cmd:15} -> {rel} ({dur}s) gif={gif}")
\ No newline at end of file
+        print(f"{cmd:15} -> {rel} ({dur}s) gif={gif}")
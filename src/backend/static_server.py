@@ -0,0 +1,172 @@
+import asyncio
+import hashlib
+import logging
+import mimetypes
+import os
+
+from aiohttp import web
+
+logger = logging.getLogger("overlay_http")
+
+OVERLAY_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "overlay"))
+HTTP_HOST = "0.0.0.0"
+HTTP_PORT = int(os.getenv("OVERLAY_HTTP_PORT", "8081"))
+CACHE_MAX_FILE = 512 * 1024         # files up to this size are served from memory
+CACHE_MAX_TOTAL = 32 * 1024 * 1024  # total bytes kept in memory
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+mimetypes.add_type("image/webp", ".webp")
+mimetypes.add_type("video/webm", ".webm")
+
+
+class Asset:
+    __slots__ = ("path", "mtime_ns", "size", "etag", "version", "body", "content_type")
+
+    def __init__(self, path, mtime_ns, size, digest, body):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.etag = f'"{digest}"'
+        self.version = digest[:12]
+        self.body = body  # bytes for small files, None for big ones (served from disk)
+        self.content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+
+def _load_asset(path, st):
+    """Hash (and for small files, read) a file. Runs on a worker thread."""
+    h = hashlib.sha1()
+    body = None
+    with open(path, "rb") as f:
+        if st.st_size <= CACHE_MAX_FILE:
+            body = f.read()
+            h.update(body)
+        else:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+    return Asset(path, st.st_mtime_ns, st.st_size, h.hexdigest(), body)
+
+
+class StaticAssets:
+    """Content-hashed view of the overlay directory.
+
+    Assets are re-hashed only when their mtime or size changes. Small files (the
+    heart/meme GIFs) stay in memory so hot triggers never touch the disk.
+    """
+
+    def __init__(self, root=OVERLAY_DIR):
+        self.root = os.path.abspath(root)
+        self.assets = {}
+        self.cached_bytes = 0
+
+    def resolve(self, rel_path):
+        path = os.path.abspath(os.path.join(self.root, rel_path))
+        if path != self.root and not path.startswith(self.root + os.sep):
+            return None  # ../ tricks
+        return path
+
+    async def get(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        asset = self.assets.get(path)
+        if asset is not None and asset.mtime_ns == st.st_mtime_ns and asset.size == st.st_size:
+            return asset
+        asset = await asyncio.get_running_loop().run_in_executor(None, _load_asset, path, st)
+        self._store(path, asset)
+        return asset
+
+    def _store(self, path, asset):
+        old = self.assets.pop(path, None)
+        if old is not None and old.body is not None:
+            self.cached_bytes -= len(old.body)
+        if asset.body is not None:
+            if self.cached_bytes + len(asset.body) > CACHE_MAX_TOTAL:
+                asset.body = None  # over budget, serve this one from disk
+            else:
+                self.cached_bytes += len(asset.body)
+        self.assets[path] = asset
+
+    async def manifest(self):
+        """{relative path: version} for every file, for building ?v= URLs.
+
+        Only files whose mtime or size changed since the last call get re-hashed.
+        """
+        paths = await asyncio.get_running_loop().run_in_executor(None, self._walk)
+        manifest = {}
+        for path in paths:
+            asset = await self.get(path)
+            if asset is not None:
+                manifest[os.path.relpath(path, self.root).replace("\\", "/")] = asset.version
+        return manifest
+
+    def _walk(self):
+        paths = []
+        for root, dirs, files in os.walk(self.root):
+            paths.extend(os.path.join(root, f) for f in files)
+        return paths
+
+
+def _cache_headers(request, asset):
+    headers = {"ETag": asset.etag}
+    if request.query.get("v") == asset.version:
+        headers["Cache-Control"] = IMMUTABLE
+    else:
+        headers["Cache-Control"] = "no-cache"  # revalidate with If-None-Match
+    return headers
+
+
+async def handle_asset(request):
+    assets = request.app["assets"]
+    rel_path = request.match_info.get("path") or "overlay.html"
+    path = assets.resolve(rel_path)
+    if path is None or not os.path.isfile(path):
+        raise web.HTTPNotFound()
+    asset = await assets.get(path)
+    if asset is None:
+        raise web.HTTPNotFound()
+    headers = _cache_headers(request, asset)
+    if asset.etag in request.headers.get("If-None-Match", ""):
+        return web.Response(status=304, headers=headers)
+
+    if asset.body is None:
+        # Big media (mp4/webm): aiohttp streams it from disk with Range support
+        return web.FileResponse(path, headers={"Cache-Control": headers["Cache-Control"]})
+
+    headers["Accept-Ranges"] = "bytes"
+    try:
+        rng = request.http_range
+    except ValueError:
+        raise web.HTTPRequestRangeNotSatisfiable(headers={"Content-Range": f"bytes */{asset.size}"})
+    if rng.start is None and rng.stop is None:
+        return web.Response(body=asset.body, content_type=asset.content_type, headers=headers)
+    start = rng.start if rng.start is not None else 0
+    if start < 0:
+        start = max(0, asset.size + start)
+    stop = min(rng.stop, asset.size) if rng.stop is not None else asset.size
+    if start >= asset.size or start >= stop:
+        raise web.HTTPRequestRangeNotSatisfiable(headers={"Content-Range": f"bytes */{asset.size}"})
+    headers["Content-Range"] = f"bytes {start}-{stop - 1}/{asset.size}"
+    return web.Response(status=206, body=asset.body[start:stop], content_type=asset.content_type, headers=headers)
+
+
+async def handle_manifest(request):
+    manifest = await request.app["assets"].manifest()
+    return web.json_response(manifest, headers={"Cache-Control": "no-cache"})
+
+
+def create_app(root=OVERLAY_DIR):
+    app = web.Application()
+    app["assets"] = StaticAssets(root)
+    app.router.add_get("/assets.json", handle_manifest)
+    app.router.add_get("/{path:.*}", handle_asset)
+    return app
+
+
+async def start_static_server(host=HTTP_HOST, port=HTTP_PORT, root=OVERLAY_DIR):
+    """Start serving the overlay directory on the running loop. Returns the AppRunner."""
+    runner = web.AppRunner(create_app(root), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(f"Overlay HTTP server serving at http://localhost:{port}")
+    return runner
@@ -1,50 +1,182 @@
 import asyncio
+import os
+import time
+from collections import deque
 import websockets
 import json
-import traceback
 import logging
 
-print("WS_SERVER: src/backend/ws_server.py loaded!")
+from metrics import WS_CLIENTS, WS_DROPPED, WS_SEND_LAG
 
-# Configure logging for more informative output
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s %(levelname)s %(message)s'
-)
+logger = logging.getLogger("overlay_ws")
 
-print("Correct ws_server.py loaded!")  # Confirm file is loaded
+# Per-client outbound queue; what happens when a client falls that far behind:
+#   "shed"       drop the oldest queued event (a late heart is worse than a missing one)
+#   "disconnect" close the client, OBS reconnects and starts fresh
+CLIENT_QUEUE_SIZE = int(os.getenv("OVERLAY_WS_QUEUE_SIZE", "32"))
+SLOW_CLIENT_POLICY = os.getenv("OVERLAY_WS_SLOW_POLICY", "shed")
+# websockets pings every client and drops the ones that don't answer in time
+PING_INTERVAL = 20
+PING_TIMEOUT = 20
+# Recent overlay events kept for clients that reconnect with {"type": "resume", "since": N}
+REPLAY_BUFFER_SIZE = int(os.getenv("OVERLAY_WS_REPLAY_SIZE", "256"))
+REPLAY_MAX_AGE = 120  # seconds; anything older isn't worth showing late
+WS_HOST = os.getenv("OVERLAY_WS_HOST", "localhost")
+WS_PORT = int(os.getenv("OVERLAY_WS_PORT", "6789"))
 
+# Changes every server start so a client can tell its last seq came from an old run
+SERVER_EPOCH = int(time.time())
+_last_seq = 0
+recent_events = deque(maxlen=REPLAY_BUFFER_SIZE)  # (seq, timestamp, event dict)
+
+class OverlayClient:
+    """One connected overlay browser source with its own queue and sender task."""
+
+    def __init__(self, websocket, max_queue=CLIENT_QUEUE_SIZE, policy=SLOW_CLIENT_POLICY):
+        self.websocket = websocket
+        self.policy = policy
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.sent = 0
+        self.dropped = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.connected_at = time.time()
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.ensure_future(self._send_loop())
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+
+    def enqueue(self, payload):
+        """Queue a frame without waiting. Returns False if something had to be dropped."""
+        item = (time.monotonic(), payload)
+        try:
+            self.queue.put_nowait(item)
+            return True
+        except asyncio.QueueFull:
+            pass
+        self.dropped += 1
+        WS_DROPPED.inc()
+        if self.policy == "disconnect":
+            logger.warning("Overlay client %s is too slow, disconnecting.", self.websocket.remote_address)
+            asyncio.ensure_future(self.websocket.close(code=1013, reason="client too slow"))
+            return False
+        self.queue.get_nowait()  # shed the stalest event
+        self.queue.put_nowait(item)
+        return False
+
+    async def _send_loop(self):
+        try:
+            while True:
+                queued_at, payload = await self.queue.get()
+                await self.websocket.send(payload)
+                self.sent += 1
+                self.last_lag = time.monotonic() - queued_at
+                WS_SEND_LAG.observe(self.last_lag)
+                self.max_lag = max(self.max_lag, self.last_lag)
+        except websockets.ConnectionClosed:
+            pass
+
+    def stats(self):
+        return {
+            "remote": str(self.websocket.remote_address),
+            "queued": self.queue.qsize(),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "last_lag_ms": round(self.last_lag * 1000, 1),
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+            "connected_for_s": round(time.time() - self.connected_at),
+        }
+
+clients = {}  # websocket -> OverlayClient
 connected = set()
+WS_CLIENTS.set_function(lambda: len(clients))
+
+def events_since(since, epoch=SERVER_EPOCH, max_age=REPLAY_MAX_AGE):
+    """Buffered events a client with last seq `since` has missed."""
+    if epoch != SERVER_EPOCH:
+        since = 0  # server restarted, every buffered event is new to the client
+    cutoff = time.time() - max_age
+    return [event for seq, ts, event in recent_events if seq > since and ts >= cutoff]
+
+def handle_client_message(client, message):
+    try:
+        msg = json.loads(message)
+    except ValueError:
+        msg = None
+    if isinstance(msg, dict) and msg.get("type") == "resume":
+        try:
+            since = int(msg.get("since", 0))
+        except (TypeError, ValueError):
+            since = 0
+        missed = events_since(since, msg.get("epoch"))
+        logger.info("Overlay client resumed from seq %s, replaying %d events.", since, len(missed))
+        client.enqueue(json.dumps({"type": "batch", "epoch": SERVER_EPOCH, "seq": _last_seq, "events": missed}))
+        return
+    # echo for debug
+    client.enqueue("pong")
 
 async def handler(websocket):
-    logging.info("Handler called with: %s", websocket)
+    logger.info("Overlay client connected: %s", websocket.remote_address)
+    client = OverlayClient(websocket)
+    clients[websocket] = client
     connected.add(websocket)
+    client.start()
     try:
-        logging.info("Handler has entered try block, waiting for messages...")
         async for message in websocket:
-            logging.debug("Received from client: %s", message)
-            # echo for debug
-            await websocket.send("pong")
+            logger.debug("Received from client: %s", message)
+            handle_client_message(client, message)
+    except websockets.ConnectionClosed:
+        pass
     except Exception as e:
-        logging.error("Exception in handler: %s", e)
-        logging.error(traceback.format_exc())  # Full stack trace
+        logger.exception("Exception in handler: %s", e)
     finally:
-        logging.info("WebSocket disconnecting: %s", websocket)
-        connected.remove(websocket)
+        logger.info("Overlay client disconnected: %s", websocket.remote_address)
+        client.stop()
+        clients.pop(websocket, None)
+        connected.discard(websocket)
 
-async def run_ws_server():
-    logging.info("Starting Overlay WS server...")
-    server = await websockets.serve(handler, "localhost", 6789)
-    print("Overlay WS server started at ws://localhost:6789")
+async def start_ws_server(host=WS_HOST, port=WS_PORT):
+    """Start the overlay WS endpoint on the running loop and return the server."""
+    logger.info("Starting Overlay WS server...")
+    server = await websockets.serve(handler, host, port, ping_interval=PING_INTERVAL, ping_timeout=PING_TIMEOUT)
+    print(f"Overlay WS server started at ws://{host}:{port}")
+    return server
+
+async def stop_ws_server(server):
+    for client in list(clients.values()):
+        client.stop()
+    server.close()
     await server.wait_closed()
 
-def start_ws_server_threaded():
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    loop.run_until_complete(run_ws_server())
+async def run_ws_server():
+    server = await start_ws_server()
+    await server.wait_closed()
 
 async def broadcast_overlay_message(payload):
-    if not isinstance(payload, str):
-        payload = json.dumps(payload)
-    if connected:
-        await asyncio.gather(*(ws.send(payload) for ws in connected))
\ No newline at end of file
+    """Queue payload for every connected client. Never waits on a slow socket.
+
+    JSON object payloads get a "seq" and are kept in the replay buffer.
+    """
+    global _last_seq
+    event = payload
+    if isinstance(payload, str):
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            event = None
+    if isinstance(event, dict):
+        _last_seq += 1
+        event = dict(event, seq=_last_seq, epoch=SERVER_EPOCH)
+        recent_events.append((_last_seq, time.time(), event))
+        payload = json.dumps(event)
+    # Snapshot: handler() may add/remove clients while we iterate
+    for client in list(clients.values()):
+        client.enqueue(payload)
+
+def get_client_stats():
+    """Per-client queue depth, lag and drop counters for status pages."""
+    return [client.stats() for client in list(clients.values())]
@@ -0,0 +1,569 @@
+"""Chat load generator: drives the real bot through the fake TMI server.
+
+    cd src
+    python -m benchmarks.chat_load --rate 20 --duration 30 --users 500
+    python -m benchmarks.chat_load --ramp 5,10,25,50,100,200 --step-duration 20
+    python -m benchmarks.chat_load --replay chat.jsonl --speed 2
+    python -m benchmarks.chat_load --no-spawn ...   # bot already running with TWITCH_IRC_HOST set
+
+By default the repo is copied to a temp dir and `python main.py` is started
+there against benchmarks/fake_tmi.py (dummy credentials, SFX_MUTE=1, spare
+ports), so raffle state and logs in the working tree are never touched.
+
+Synthetic traffic mixes plain chat with `!` commands from --users viewers. A
+mod opens a raffle before the run, so first-time chatters earn entries, and
+--burst N new viewers all chat within --burst-window seconds at the start of
+each step (the raffle-open rush).
+
+Latency is taken from the moment a line is written to the bot's socket until:
+  reply    the bot's chat line mentioning @user (!myentries, !mypicks, !raffle random)
+  award    the merged "complimentary entries" line mentioning @user
+  overlay  the overlay WS broadcast for that user (we connect as a browser source)
+  anon     replies without a mention (!tic, !derpism), matched first in, first out
+SFX file commands are sent too but produce nothing to time. Note the bot's
+replies are paced by the chat scheduler's Twitch limits (the fake server makes
+the bot a mod: 95 lines / 30 s); overlay latency shows raw handling capacity.
+
+--ramp runs one step per rate and stops at the first one where a p95 latency
+exceeds --max-p95 (plus the coalescing window for awards), fewer than
+--min-answered of the expected responses arrive, or the bot process dies.
+The report is JSON.
+"""
+import argparse
+import asyncio
+import collections
+import contextlib
+import io
+import json
+import os
+import random
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+if __package__ in (None, ""):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aiohttp
+import websockets
+
+from benchmarks.fake_tmi import FakeTMI
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_DIR = os.path.dirname(SRC_DIR)
+
+CHANNEL = "loadtest"
+BOT_NICK = "meangenebot"
+MOD_USER = "loadmod"
+
+CHAT_LINES = [
+    "hello", "lol", "PogChamp", "gg", "what game is this", "LUL that was close",
+    "hi chat", "KEKW", "nice one", "first time here, love the stream", "o7", "Kappa",
+]
+REPLY_COMMANDS = ["!myentries", "!mypicks", "!raffle random"]
+ANON_COMMANDS = ["!tic", "!derpism"]
+DEFAULT_MIX = "overlay=3,sfx=3,reply=3,anon=1"
+LOADTEST_GIFS = 5
+# Smallest valid GIF (1x1, transparent): the overlay only needs the file to exist
+TINY_GIF = (
+    b"GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00"
+    b",\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;"
+)
+NO_COOLDOWNS = {
+    "sfx": {"default": {"user": "off", "command": "off"}},
+    "overlay": {"default": {"user": "off", "command": "off"}},
+    "channel": "off",
+}
+# Chat-entry awards wait on purpose: collected for the award window into one
+# commit, then for the coalesce window so a rush is merged into one line
+COALESCE_WINDOW = float(os.getenv("CHAT_COALESCE_WINDOW", "2.0")) + float(os.getenv("RAFFLE_AWARD_WINDOW", "0.5"))
+MENTION = re.compile(r"@(\w+)")
+METRICS = ("chat_messages_total", "event_loop_lag_seconds_sum", "event_loop_lag_seconds_count",
+           "overlay_ws_dropped_total", "chat_command_errors_total")
+
+
+@contextlib.contextmanager
+def quiet():
+    # Registry scans print; keep stdout clean for the JSON
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def _percentiles(samples):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+
+    def pct(p):
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 1)
+    return {
+        "n": len(ordered),
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "max_ms": round(ordered[-1] * 1000, 1),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 1),
+    }
+
+
+class LatencyTracker:
+    """Matches what the bot sends back to the chat lines that caused it."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.pending = collections.defaultdict(collections.deque)  # (user, kind) -> send times
+        self.anon = collections.deque()
+        self.samples = collections.defaultdict(list)
+        self.expected = collections.Counter()
+        self.unmatched = 0
+
+    def expect(self, kind, user, sent_at):
+        self.expected[kind] += 1
+        if kind == "anon":
+            self.anon.append(sent_at)
+        else:
+            self.pending[(user, kind)].append(sent_at)
+
+    def _match(self, kind, user, now):
+        queue = self.pending.get((user, kind))
+        if not queue:
+            return False
+        self.samples[kind].append(now - queue.popleft())
+        return True
+
+    def on_bot_message(self, channel, text, now):
+        mentions = [m.lower() for m in MENTION.findall(text)]
+        if mentions:
+            kind = "award" if "complimentary entr" in text else "reply"
+            for user in mentions:
+                if not self._match(kind, user, now):
+                    self.unmatched += 1
+        elif self.anon:
+            self.samples["anon"].append(now - self.anon.popleft())
+        else:
+            self.unmatched += 1
+
+    def on_overlay(self, payload, now):
+        user = payload.get("user")
+        if user is None or not self._match("overlay", user.lower(), now):
+            self.unmatched += 1
+
+    def outstanding(self):
+        return sum(len(q) for q in self.pending.values()) + len(self.anon)
+
+    def report(self):
+        latency = {kind: _percentiles(samples) for kind, samples in self.samples.items()}
+        answered = sum(len(s) for s in self.samples.values())
+        expected = sum(self.expected.values())
+        every = [x for samples in self.samples.values() for x in samples]
+        return {
+            "expected": dict(self.expected),
+            "answered": answered,
+            "unanswered": expected - answered,
+            "answered_ratio": round(answered / expected, 4) if expected else None,
+            "unmatched_responses": self.unmatched,
+            "latency": latency,
+            "all": _percentiles(every),
+        }
+
+
+class LoadRun:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.tracker = LatencyTracker()
+        self.server = FakeTMI(nick=BOT_NICK, mod_channels={CHANNEL}, on_bot_message=self._on_bot_message)
+        self.bot = None
+        self.workdir = None
+        self.overlay_task = None
+        self.http = None
+        self.raffle_open = False
+        self.awarded = set()
+        self.burst_round = 0
+        self.overlay_commands = []
+        self.sfx_commands = []
+
+    def _on_bot_message(self, channel, text, now):
+        if "Raffle is now open" in text:
+            self.raffle_open = True
+            return
+        self.tracker.on_bot_message(channel, text, now)
+
+    # --- bot process ---------------------------------------------------------
+
+    def prepare_tree(self):
+        """Copy the repo somewhere disposable and give the overlay some gifs to trigger."""
+        self.workdir = tempfile.mkdtemp(prefix="meangene-load-")
+        tree = os.path.join(self.workdir, "repo")
+        shutil.copytree(REPO_DIR, tree, ignore=shutil.ignore_patterns(
+            ".git", ".env", "logs", "archive", "__pycache__", "raffle_state.json*", "raffle", "raffle.sqlite3*"))
+        gifs = os.path.join(tree, "src", "overlay", "gifs")
+        os.makedirs(gifs, exist_ok=True)
+        for i in range(1, LOADTEST_GIFS + 1):
+            with open(os.path.join(gifs, f"loadtest{i}.gif"), "wb") as f:
+                f.write(TINY_GIF)
+        return tree
+
+    def discover_commands(self, src_dir):
+        from backend.media_mapper import OverlayMediaIndex
+        from sfx_watcher import SFXRegistry
+
+        self.overlay_commands = sorted(OverlayMediaIndex(os.path.join(src_dir, "overlay")).commands)
+        with quiet():
+            registry = SFXRegistry()
+            registry.scan_and_register()
+        self.sfx_commands = sorted(registry.file_commands)
+
+    def spawn_bot(self, tree, irc_url):
+        env = dict(os.environ)
+        env.update({
+            "TWITCH_IRC_HOST": irc_url,
+            "TWITCH_NICK": BOT_NICK,
+            "TWITCH_TOKEN": "loadtest",
+            "TWITCH_CLIENT_ID": "loadtest",
+            "TWITCH_CLIENT_SECRET": "loadtest",
+            "TWITCH_CHANNELS": CHANNEL,
+            "TWITCH_MOD_CHANNELS": CHANNEL,
+            "SFX_MUTE": "1",
+            "BOT_ENV": "prod",
+            "OVERLAY_WS_PORT": str(self.args.overlay_port),
+            "OVERLAY_HTTP_PORT": str(self.args.overlay_http_port),
+            "STATUS_PORT": str(self.args.status_port),
+        })
+        if not self.args.cooldowns:
+            # Measure handling, not the spam limits: every trigger should answer
+            path = os.path.join(self.workdir, "cooldowns.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(NO_COOLDOWNS, f)
+            env["COOLDOWNS_FILE"] = path
+        log = open(os.path.join(self.workdir, "bot.log"), "wb")
+        self.bot = subprocess.Popen(
+            [sys.executable, "main.py"], cwd=os.path.join(tree, "src"), env=env,
+            stdout=log, stderr=subprocess.STDOUT,
+        )
+
+    def bot_alive(self):
+        return self.bot is None or self.bot.poll() is None
+
+    def bot_log_tail(self, lines=30):
+        if self.workdir is None:
+            return []
+        path = os.path.join(self.workdir, "bot.log")
+        if not os.path.exists(path):
+            return []
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            return f.read().splitlines()[-lines:]
+
+    async def stop_bot(self):
+        if self.bot is not None and self.bot.poll() is None:
+            self.bot.terminate()
+            for _ in range(50):
+                if self.bot.poll() is not None:
+                    break
+                await asyncio.sleep(0.1)
+            else:
+                self.bot.kill()
+
+    # --- observers ------------------------------------------------------------
+
+    async def watch_overlay(self):
+        url = f"ws://127.0.0.1:{self.args.overlay_port}"
+        while True:
+            try:
+                async with websockets.connect(url) as ws:
+                    async for raw in ws:
+                        now = time.perf_counter()
+                        try:
+                            payload = json.loads(raw)
+                        except ValueError:
+                            continue
+                        if isinstance(payload, dict):
+                            self.tracker.on_overlay(payload, now)
+            except (OSError, websockets.ConnectionClosed):
+                await asyncio.sleep(0.5)
+
+    async def scrape_metrics(self):
+        """Totals of a few counters from the bot's /metrics (None if the status page is unreachable)."""
+        url = f"http://127.0.0.1:{self.args.status_port}/metrics"
+        try:
+            async with self.http.get(url, timeout=aiohttp.ClientTimeout(total=5)) as resp:
+                text = await resp.text()
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return None
+        totals = dict.fromkeys(METRICS, 0.0)
+        for line in text.splitlines():
+            if not line or line.startswith("#"):
+                continue
+            name = line.split("{", 1)[0].split(" ", 1)[0]
+            if name in totals:
+                totals[name] += float(line.rsplit(" ", 1)[1])
+        return totals
+
+    # --- traffic -----------------------------------------------------------------
+
+    async def send(self, user, text, mod=False):
+        sent_at = time.perf_counter()
+        await self.server.say(CHANNEL, user, text, mod=mod)
+        return sent_at
+
+    async def open_raffle(self):
+        await self.send(MOD_USER, "!openraffle 1 99999", mod=True)
+        deadline = time.monotonic() + 10
+        while not self.raffle_open and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if not self.raffle_open:
+            print("Raffle did not open, awards will not be measured.", file=sys.stderr)
+
+    async def chat(self, user, text, mod=False):
+        """Send one line and register what response it should produce."""
+        sent_at = await self.send(user, text, mod)
+        command = text.split(" ", 1)[0].lower()
+        if not text.startswith("!"):
+            if self.raffle_open and user not in self.awarded:
+                self.awarded.add(user)
+                self.tracker.expect("award", user, sent_at)
+        elif command in ANON_COMMANDS:
+            self.tracker.expect("anon", user, sent_at)
+        elif text in REPLY_COMMANDS:
+            if text != "!raffle random" or self.raffle_open:
+                self.tracker.expect("reply", user, sent_at)
+        elif command in self.overlay_commands:
+            self.tracker.expect("overlay", user, sent_at)
+
+    def synthetic_line(self, mix):
+        kinds, weights = mix
+        if self.rng.random() >= self.args.command_ratio:
+            return self.rng.choice(CHAT_LINES)
+        kind = self.rng.choices(kinds, weights)[0]
+        if kind == "overlay":
+            return self.rng.choice(self.overlay_commands)
+        if kind == "sfx":
+            return self.rng.choice(self.sfx_commands)
+        if kind == "reply":
+            return self.rng.choice(REPLY_COMMANDS)
+        return self.rng.choice(ANON_COMMANDS)
+
+    def parse_mix(self):
+        available = {"overlay": bool(self.overlay_commands), "sfx": bool(self.sfx_commands),
+                     "reply": True, "anon": True}
+        kinds, weights = [], []
+        for part in self.args.mix.split(","):
+            name, _, weight = part.partition("=")
+            name = name.strip()
+            if name not in available:
+                raise SystemExit(f"Unknown mix entry {name!r}, expected overlay, sfx, reply or anon")
+            if available[name] and float(weight or 1) > 0:
+                kinds.append(name)
+                weights.append(float(weight or 1))
+        if not kinds:
+            raise SystemExit("Nothing left in --mix to send")
+        return kinds, weights
+
+    async def burst(self):
+        """The raffle-open rush: --burst new chatters within --burst-window seconds."""
+        self.burst_round += 1
+        count = self.args.burst
+        tasks = []
+        for i in range(count):
+            delay = self.rng.uniform(0, self.args.burst_window)
+            user = f"burst{self.burst_round}x{i}"
+            tasks.append(self._later(delay, self.chat(user, self.rng.choice(CHAT_LINES))))
+        await asyncio.gather(*tasks)
+        return count
+
+    async def _later(self, delay, coro):
+        await asyncio.sleep(delay)
+        await coro
+
+    async def run_synthetic(self, rate, duration, mix):
+        interval = 1.0 / rate
+        start = time.perf_counter()
+        sent = 0
+        burst = asyncio.ensure_future(self.burst()) if self.args.burst else None
+        while True:
+            due = start + sent * interval
+            now = time.perf_counter()
+            if due - start >= duration:
+                break
+            if due > now:
+                await asyncio.sleep(due - now)
+            user = f"viewer{self.rng.randrange(self.args.users)}"
+            await self.chat(user, self.synthetic_line(mix))
+            sent += 1
+            if not self.bot_alive():
+                break
+        if burst is not None:
+            sent += await burst
+        return sent, time.perf_counter() - start
+
+    async def run_replay(self, path):
+        """Replay a JSONL capture: {"t": seconds from start, "user": ..., "text": ..., "mod": bool}."""
+        with open(path, "r", encoding="utf-8") as f:
+            lines = [json.loads(line) for line in f if line.strip()]
+        lines.sort(key=lambda row: row.get("t", 0))
+        start = time.perf_counter()
+        sent = 0
+        for row in lines:
+            due = start + float(row.get("t", 0)) / self.args.speed
+            now = time.perf_counter()
+            if due > now:
+                await asyncio.sleep(due - now)
+            await self.chat(str(row["user"]).lower(), row["text"], mod=bool(row.get("mod")))
+            sent += 1
+            if not self.bot_alive():
+                break
+        return sent, time.perf_counter() - start
+
+    async def drain(self):
+        """Give the bot --grace seconds to answer what is still outstanding."""
+        deadline = time.monotonic() + self.args.grace
+        while self.tracker.outstanding() and time.monotonic() < deadline and self.bot_alive():
+            await asyncio.sleep(0.1)
+
+    async def step(self, label, runner, target_rate=None):
+        self.tracker.reset()
+        before = await self.scrape_metrics()
+        sent, elapsed = await runner
+        await self.drain()
+        after = await self.scrape_metrics()
+        result = {
+            "step": label,
+            "target_rate": target_rate,
+            "sent": sent,
+            "achieved_rate": round(sent / elapsed, 2) if elapsed else None,
+            "seconds": round(elapsed, 2),
+            "bot_alive": self.bot_alive(),
+        }
+        result.update(self.tracker.report())
+        if before and after:
+            delta = {name: after[name] - before[name] for name in METRICS}
+            lag_count = delta.pop("event_loop_lag_seconds_count")
+            lag_sum = delta.pop("event_loop_lag_seconds_sum")
+            delta["event_loop_lag_avg_ms"] = round(lag_sum / lag_count * 1000, 2) if lag_count else None
+            result["bot_metrics"] = delta
+        return result
+
+    def failed(self, result):
+        reasons = []
+        if not result["bot_alive"]:
+            reasons.append("bot exited")
+        for kind, latency in result["latency"].items():
+            budget = (self.args.max_p95 + (COALESCE_WINDOW if kind == "award" else 0)) * 1000
+            if latency and latency["p95_ms"] > budget:
+                reasons.append(f"{kind} p95 {latency['p95_ms']} ms > {budget:.0f} ms")
+        ratio = result["answered_ratio"]
+        if ratio is not None and ratio < self.args.min_answered:
+            reasons.append(f"answered {ratio:.1%} < {self.args.min_answered:.0%}")
+        return reasons
+
+    # --- orchestration ------------------------------------------------------
+
+    async def run(self):
+        args = self.args
+        irc_url = await self.server.start(port=args.irc_port)
+        self.http = aiohttp.ClientSession()
+        report = {"meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "users": args.users,
+            "command_ratio": args.command_ratio,
+            "mix": args.mix,
+            "burst": args.burst,
+            "irc": irc_url,
+        }, "steps": []}
+        try:
+            src_dir = SRC_DIR
+            if not args.no_spawn:
+                tree = self.prepare_tree()
+                src_dir = os.path.join(tree, "src")
+                self.spawn_bot(tree, irc_url)
+            self.discover_commands(src_dir)
+            try:
+                await self.server.wait_joined(CHANNEL, timeout=args.connect_timeout)
+            except asyncio.TimeoutError:
+                report["error"] = "bot never joined the channel"
+                report["bot_log"] = self.bot_log_tail()
+                return report
+            self.overlay_task = asyncio.ensure_future(self.watch_overlay())
+            await asyncio.sleep(1)  # overlay client connects, chat scheduler learns it's a mod
+            await self.open_raffle()
+
+            if args.replay:
+                report["steps"].append(await self.step("replay", self.run_replay(args.replay)))
+            else:
+                mix = self.parse_mix()
+                rates = [float(r) for r in args.ramp.split(",")] if args.ramp else [args.rate]
+                duration = args.step_duration if args.ramp else args.duration
+                for rate in rates:
+                    result = await self.step(f"{rate:g}/s", self.run_synthetic(rate, duration, mix), rate)
+                    reasons = self.failed(result)
+                    result["failed"] = reasons
+                    report["steps"].append(result)
+                    p95 = ", ".join(f"{kind} {lat['p95_ms']}" for kind, lat in sorted(result["latency"].items()) if lat)
+                    print(f"{rate:g} msg/s: p95 ms {p95 or '-'}; "
+                          f"answered {result['answered']}/{result['answered'] + result['unanswered']}"
+                          + (f" -- {'; '.join(reasons)}" if reasons else ""), file=sys.stderr)
+                    if reasons and args.ramp:
+                        break
+                passed = [s["target_rate"] for s in report["steps"] if not s["failed"]]
+                report["max_sustained_rate"] = max(passed) if passed else None
+            if not self.bot_alive():
+                report["bot_log"] = self.bot_log_tail()
+            return report
+        finally:
+            if self.overlay_task is not None:
+                self.overlay_task.cancel()
+            await self.http.close()
+            await self.stop_bot()
+            await self.server.stop()
+            if self.workdir and not args.keep:
+                shutil.rmtree(self.workdir, ignore_errors=True)
+            elif self.workdir:
+                report["workdir"] = self.workdir
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drive the bot with synthetic or replayed chat through a fake TMI server.")
+    parser.add_argument("--rate", type=float, default=10, help="chat messages per second (single step)")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of traffic (single step)")
+    parser.add_argument("--ramp", help="comma separated rates, one step each, stop at the first failing one")
+    parser.add_argument("--step-duration", type=float, default=20, help="seconds per --ramp step")
+    parser.add_argument("--users", type=int, default=500, help="distinct chatters")
+    parser.add_argument("--command-ratio", type=float, default=0.3, help="share of messages that are ! commands")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="command weights: overlay, sfx, reply, anon")
+    parser.add_argument("--burst", type=int, default=50, help="new chatters rushing in at the start of each step (0 = off)")
+    parser.add_argument("--burst-window", type=float, default=1.0, help="seconds the burst is spread over")
+    parser.add_argument("--replay", help="JSONL chat capture to replay instead of synthetic traffic")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed multiplier")
+    parser.add_argument("--grace", type=float, default=10, help="seconds to wait for late responses after a step")
+    parser.add_argument("--max-p95", type=float, default=2.0, help="seconds; a step with a slower p95 fails")
+    parser.add_argument("--min-answered", type=float, default=0.95, help="a step answering less than this fails")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--irc-port", type=int, default=16667)
+    parser.add_argument("--overlay-port", type=int, default=16789)
+    parser.add_argument("--overlay-http-port", type=int, default=18081)
+    parser.add_argument("--status-port", type=int, default=18080)
+    parser.add_argument("--connect-timeout", type=float, default=60, help="seconds to wait for the bot to join")
+    parser.add_argument("--cooldowns", action="store_true", help="keep the bot's SFX/overlay cooldowns on (blocked triggers count as unanswered)")
+    parser.add_argument("--no-spawn", action="store_true", help="don't start the bot, wait for one to connect")
+    parser.add_argument("--keep", action="store_true", help="keep the temp copy (bot.log, raffle files)")
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(LoadRun(args).run())
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 1 if report.get("error") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+"""A local stand-in for Twitch chat (TMI) that twitchio can connect to.
+
+Speaks just enough of Twitch IRC over a websocket for twitchio's login, CAP,
+JOIN, PING and tagged PRIVMSG handling. Chat is injected with say(); every
+PRIVMSG the bot sends is kept in `received` with the time it arrived.
+
+    server = FakeTMI(nick="meangenebot", mod_channels={"loadtest"})
+    await server.start(port=16667)
+    # bot: TWITCH_IRC_HOST=ws://127.0.0.1:16667 python main.py
+    await server.wait_joined("loadtest")
+    await server.say("loadtest", "viewer1", "!mypicks")
+"""
+import asyncio
+import itertools
+import time
+import uuid
+
+from aiohttp import web, WSMsgType
+
+HOST = "tmi.twitch.tv"
+
+
+def _escape_tag(value):
+    return str(value).replace("\\", "\\\\").replace(";", "\\:").replace(" ", "\\s")
+
+
+class FakeTMI:
+    def __init__(self, nick="meangenebot", mod_channels=(), on_bot_message=None):
+        self.nick = nick.lower()
+        self.mod_channels = {c.lower().lstrip("#") for c in mod_channels}
+        self.on_bot_message = on_bot_message  # called with (channel, text, received_at)
+        self.received = []  # (perf_counter, channel, text) for every PRIVMSG from the bot
+        self.joined = {}    # channel -> asyncio.Event
+        self.sent = 0
+        self.sockets = set()
+        self._user_ids = {}
+        self._ids = itertools.count(1000)
+        self._runner = None
+
+    # --- server lifecycle ----------------------------------------------------
+
+    async def start(self, host="127.0.0.1", port=16667):
+        app = web.Application()
+        app.router.add_get("/", self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        return f"ws://{host}:{port}"
+
+    async def stop(self):
+        for ws in list(self.sockets):
+            await ws.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def _joined_event(self, channel):
+        return self.joined.setdefault(channel.lower().lstrip("#"), asyncio.Event())
+
+    async def wait_joined(self, channel, timeout=30):
+        await asyncio.wait_for(self._joined_event(channel).wait(), timeout)
+
+    # --- injecting chat --------------------------------------------------------
+
+    def _user_id(self, user):
+        if user not in self._user_ids:
+            self._user_ids[user] = next(self._ids)
+        return self._user_ids[user]
+
+    def privmsg(self, channel, user, text, mod=False):
+        """The raw line Twitch would deliver for `user` saying `text` in `channel`."""
+        user = user.lower()
+        channel = channel.lower().lstrip("#")
+        tags = {
+            "badge-info": "",
+            "badges": "moderator/1" if mod else "",
+            "color": "",
+            "display-name": user,
+            "emotes": "",
+            "first-msg": "0",
+            "flags": "",
+            "id": uuid.uuid4(),
+            "mod": "1" if mod else "0",
+            "returning-chatter": "0",
+            "room-id": "1",
+            "subscriber": "0",
+            "tmi-sent-ts": int(time.time() * 1000),
+            "turbo": "0",
+            "user-id": self._user_id(user),
+            "user-type": "mod" if mod else "",
+        }
+        tag_str = ";".join(f"{k}={_escape_tag(v)}" for k, v in tags.items())
+        return f"@{tag_str} :{user}!{user}@{user}.{HOST} PRIVMSG #{channel} :{text}"
+
+    async def say(self, channel, user, text, mod=False):
+        """Deliver a chat message to every connected bot."""
+        line = self.privmsg(channel, user, text, mod) + "\r\n"
+        self.sent += 1
+        for ws in list(self.sockets):
+            try:
+                await ws.send_str(line)
+            except ConnectionResetError:
+                self.sockets.discard(ws)
+
+    # --- protocol ----------------------------------------------------------------
+
+    async def _handle(self, request):
+        ws = web.WebSocketResponse(heartbeat=None)
+        await ws.prepare(request)
+        self.sockets.add(ws)
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                for line in msg.data.split("\r\n"):
+                    if line:
+                        await self._command(ws, line)
+        finally:
+            self.sockets.discard(ws)
+        return ws
+
+    async def _command(self, ws, line):
+        verb, _, rest = line.partition(" ")
+        verb = verb.upper()
+        nick = self.nick
+        if verb == "NICK":
+            self.nick = nick = rest.strip().lower()
+            welcome = [
+                f":{HOST} 001 {nick} :Welcome, GLHF!",
+                f":{HOST} 002 {nick} :Your host is {HOST}",
+                f":{HOST} 003 {nick} :This server is rather new",
+                f":{HOST} 004 {nick} :-",
+                f":{HOST} 375 {nick} :-",
+                f":{HOST} 372 {nick} :You are in a maze of twisty passages, all alike.",
+                f":{HOST} 376 {nick} :>",
+            ]
+            await ws.send_str("\r\n".join(welcome) + "\r\n")
+        elif verb == "CAP":
+            caps = rest.partition(":")[2]
+            await ws.send_str(f":{HOST} CAP * ACK :{caps}\r\n")
+        elif verb == "JOIN":
+            for channel in rest.strip().split(","):
+                await self._join(ws, channel.strip().lstrip("#").lower())
+        elif verb == "PING":
+            await ws.send_str(f":{HOST} PONG {HOST} :{rest.lstrip(':')}\r\n")
+        elif verb == "PRIVMSG":
+            target, _, text = rest.partition(" :")
+            now = time.perf_counter()
+            channel = target.lstrip("#").lower()
+            self.received.append((now, channel, text))
+            if self.on_bot_message is not None:
+                self.on_bot_message(channel, text, now)
+
+    async def _join(self, ws, channel):
+        nick = self.nick
+        mod = channel in self.mod_channels
+        badges = "moderator/1" if mod else ""
+        lines = [
+            f":{nick}!{nick}@{nick}.{HOST} JOIN #{channel}",
+            f":{nick}.{HOST} 353 {nick} = #{channel} :{nick}",
+            f":{nick}.{HOST} 366 {nick} #{channel} :End of /NAMES list",
+            f"@badge-info=;badges={badges};color=;display-name={nick};emote-sets=0;mod={int(mod)};"
+            f"subscriber=0;user-type={'mod' if mod else ''} :{HOST} USERSTATE #{channel}",
+            f"@emote-only=0;followers-only=-1;r9k=0;room-id=1;slow=0;subs-only=0 :{HOST} ROOMSTATE #{channel}",
+        ]
+        await ws.send_str("\r\n".join(lines) + "\r\n")
+        self._joined_event(channel).set()
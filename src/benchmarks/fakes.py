@@ -0,0 +1,58 @@
+"""Stand-ins for the twitchio objects the cogs touch, for offline benchmarks."""
+
+
+class FakeAuthor:
+    def __init__(self, name, is_mod=False):
+        self.name = name
+        self.display_name = name
+        self.is_mod = is_mod
+        self.is_broadcaster = False
+        self.badges = {}
+
+
+class FakeChannel:
+    def __init__(self, name="benchchannel"):
+        self.name = name
+        self.sent = []
+
+    async def send(self, content):
+        self.sent.append(content)
+
+    def _bot_is_mod(self):
+        return False
+
+
+class FakeMessage:
+    def __init__(self, content, author=None, channel=None, echo=False):
+        self.content = content
+        self.author = author or FakeAuthor("viewer")
+        self.channel = channel or FakeChannel()
+        self.echo = echo
+        self.tags = {}
+
+
+class FakeContext:
+    """Enough of commands.Context for calling a command's callback directly."""
+
+    def __init__(self, message, bot=None):
+        self.message = message
+        self.author = message.author
+        self.channel = message.channel
+        self.bot = bot
+
+    async def send(self, content):
+        await self.channel.send(content)
+
+
+class FakeSFXPlayer:
+    """Counts clips instead of playing them."""
+
+    def __init__(self):
+        self.played = 0
+
+    def play(self, path):
+        self.played += 1
+        return True
+
+    def stats(self):
+        return {"played": self.played}
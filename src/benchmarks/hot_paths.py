@@ -0,0 +1,444 @@
+"""Microbenchmarks for the bot's per-message hot paths.
+
+Runs offline against fake twitchio objects and temp files, prints JSON, and
+optionally compares with a saved baseline:
+
+    cd src
+    python -m benchmarks.hot_paths --out bench.json
+    python -m benchmarks.hot_paths --save-baseline benchmarks/baseline.json
+    python -m benchmarks.hot_paths --baseline benchmarks/baseline.json --fail-on-regression
+
+Numbers are ns per operation (best and median of --repeat runs).
+"""
+import argparse
+import asyncio
+import contextlib
+import glob
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+if __package__ in (None, ""):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fakes import FakeAuthor, FakeChannel, FakeContext, FakeMessage, FakeSFXPlayer
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RAFFLE_SIZES = (10, 1000, 100000)
+
+
+def _result(timings, number):
+    per_op = [t / number * 1e9 for t in timings]
+    return {
+        "ops": number,
+        "repeat": len(timings),
+        "best_ns": round(min(per_op), 1),
+        "median_ns": round(statistics.median(per_op), 1),
+    }
+
+
+def bench(fn, number, repeat, setup=None):
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        timings.append(time.perf_counter() - start)
+    return _result(timings, number)
+
+
+async def abench(fn, number, repeat, setup=None):
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        for _ in range(number):
+            await fn()
+        timings.append(time.perf_counter() - start)
+    return _result(timings, number)
+
+
+@contextlib.contextmanager
+def quiet():
+    # Cog constructors print; keep stdout clean for the JSON
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def _cycle(items):
+    items = list(items)
+    state = {"i": -1}
+
+    def next_item():
+        state["i"] = (state["i"] + 1) % len(items)
+        return items[state["i"]]
+    return next_item
+
+
+# --- Router, overlay, SFX ---------------------------------------------------
+
+def build_bot(registry, raffle_state):
+    from twitchio.ext import commands
+
+    from twitch_commands.message_router import MessageRouter, _no_default_command_handling
+    from twitch_commands.overlay_cog import OverlayCog
+    from twitch_commands.raffle import RaffleCog
+    from twitch_commands.sfx import SFXCog
+
+    bot = commands.Bot(token="oauth:benchmark", prefix="!", initial_channels=[])
+    bot._connection.nick = "meangenebot"
+    bot.sfx_registry = registry
+    bot.sfx_player = FakeSFXPlayer()
+    with quiet():
+        bot.add_cog(OverlayCog(bot))
+        bot.add_cog(SFXCog(bot, registry, bot.sfx_player))
+        bot.add_cog(RaffleCog(bot, raffle_state))
+        bot.add_cog(MessageRouter(bot))
+    bot.event_message = _no_default_command_handling
+    # One viewer repeats the same triggers here; keep the cooldowns from
+    # turning the router numbers into "blocked" numbers (bench_cooldowns covers them)
+    from cooldowns import Cooldowns
+    unlimited = Cooldowns({"channel": None})
+    bot.get_cog("OverlayCog").cooldowns = unlimited
+    bot.get_cog("SFXCog").cooldowns = unlimited
+    return bot
+
+
+async def bench_router(results, registry, raffle_state, number, repeat):
+    import backend.ws_server as ws_server
+
+    bot = build_bot(registry, raffle_state)
+    router = bot.get_cog("MessageRouter")
+    overlay = bot.get_cog("OverlayCog")
+    event_message = type(router).event_message.func
+    channel = FakeChannel()
+    author = FakeAuthor("viewer")
+    ws_server.recent_events.clear()
+
+    def messages(contents):
+        return _cycle(FakeMessage(c, author, channel) for c in contents)
+
+    sfx_files = sorted(registry.file_commands)[:50] or ["!nosfx"]
+    sfx_folders = sorted(registry.folder_commands)[:10] or ["!nofolder"]
+    overlay_cmds = sorted(overlay.index.commands)[:50] or ["!nooverlay"]
+    mixes = {
+        "router.plain_chat": ["hello there", "lol", "PogChamp nice one", "gg"],
+        "router.unknown_command": ["!notacommand", "!zzz", "!foo bar"],
+        "router.sfx_file": sfx_files,
+        "router.sfx_folder": sfx_folders,
+        "router.overlay": overlay_cmds,
+        "router.mixed": ["hello", sfx_files[0], "!zzz", overlay_cmds[0], "lol", sfx_folders[0]],
+    }
+    for name, contents in mixes.items():
+        next_message = messages(contents)
+
+        async def run(next_message=next_message):
+            await event_message(router, next_message())
+        results[name] = await abench(run, number, repeat, setup=channel.sent.clear)
+
+    next_overlay = messages(overlay_cmds)
+
+    async def try_overlay():
+        await overlay.try_handle_overlay(next_overlay())
+    results["overlay.try_handle_overlay"] = await abench(try_overlay, number, repeat)
+
+    raffle_cog = bot.get_cog("RaffleCog")
+    ctx = FakeContext(FakeMessage("!myentries", FakeAuthor("user0"), channel), bot)
+
+    async def myentries():
+        await raffle_cog.myentries_cmd._callback(raffle_cog, ctx)
+    results["raffle.myentries_command"] = await abench(myentries, number, repeat, setup=channel.sent.clear)
+
+
+def bench_sfx_registry(results, tmp_dir, number, repeat):
+    from sfx_watcher import SFXRegistry
+
+    def scan():
+        registry = SFXRegistry()
+        registry.scan_and_register()
+        return registry
+
+    manifest = os.path.join(tmp_dir, "sfx_manifest.json")
+
+    def startup():
+        SFXRegistry().load_or_scan(manifest)
+
+    with quiet():
+        registry = scan()
+        results["sfx.scan_and_register"] = bench(scan, 1, max(3, repeat))
+        startup()  # write the manifest; the timed runs are warm starts
+        results["sfx.startup_from_manifest"] = bench(startup, 1, max(3, repeat))
+    hits = _cycle(sorted(registry.file_commands) or ["!none"])
+    misses = _cycle(["!nope", "!notasound", "!zzz"])
+    results["sfx.lookup_hit"] = bench(lambda: hits() in registry.file_commands, number, repeat)
+    results["sfx.lookup_miss"] = bench(
+        lambda: misses() in registry.file_commands or misses() in registry.folder_commands, number, repeat
+    )
+    return registry
+
+
+def bench_cooldowns(results, number, repeat):
+    from cooldowns import Cooldowns, DEFAULT_CONFIG
+
+    clock = {"now": 0.0}
+    cooldowns = Cooldowns(DEFAULT_CONFIG, clock=lambda: clock["now"])
+    next_user = _cycle(f"user{i}" for i in range(5000))
+    next_command = _cycle(f"!clip{i}" for i in range(50))
+
+    def allowed():
+        # Distinct viewers and clips, 0.5 s apart: every trigger passes and
+        # idle buckets keep getting evicted
+        clock["now"] += 0.5
+        cooldowns.check("sfx", "lenny", next_command(), next_user(), "benchchannel")
+    results["cooldowns.check_allowed"] = bench(allowed, number, repeat)
+
+    def blocked():
+        cooldowns.check("overlay", "dar", "!dar<3", "spammer", "benchchannel")
+    results["cooldowns.check_blocked"] = bench(blocked, number, repeat)
+    results["cooldowns.check_mod"] = bench(
+        lambda: cooldowns.check("sfx", "lenny", "!lenny", "mod", "benchchannel", is_mod=True), number, repeat
+    )
+
+
+# --- Raffle -----------------------------------------------------------------
+
+def open_raffle_state(tmp_dir, users, backend):
+    from raffle_sqlite import RaffleDB, SqliteRaffleStore
+    from twitch_commands.raffle import RaffleState
+
+    path = os.path.join(tmp_dir, f"raffle_{users}.json")
+    if backend == "sqlite":
+        return RaffleState(path, store=SqliteRaffleStore(RaffleDB(path[:-5] + ".sqlite3"), "bench"))
+    return RaffleState(path)
+
+
+def seed_raffle(state):
+    # Seeded straight into memory, so write the whole state once
+    if hasattr(state.journal, "write_snapshot"):
+        state.journal.write_snapshot(state.state)
+    else:
+        state.save()
+
+
+def make_raffle(tmp_dir, users, backend="json"):
+    for stale in glob.glob(os.path.join(tmp_dir, f"raffle_{users}.*")):
+        os.remove(stale)
+    import twitch_commands.raffle as raffle
+
+    state = open_raffle_state(tmp_dir, users, backend)
+    max_number = max(999, users * 10 - 1)
+    # 100k users with a pick each need more numbers than !openraffle allows by default
+    raffle.RAFFLE_MAX_NUMBER = max(raffle.RAFFLE_MAX_NUMBER, max_number)
+    state.open_raffle(5, max_number)
+    # Seed directly and snapshot once: committing 100k entries one by one would
+    # mostly benchmark the setup.
+    state.state["entries"] = {f"user{i}": 50 for i in range(users)}
+    seed_raffle(state)
+    return state
+
+
+def bench_raffle(results, tmp_dir, repeat, backend="json"):
+    rng = random.Random(1234)
+    for users in RAFFLE_SIZES:
+        # JSON keeps the original names so older baselines still compare
+        tag = f"raffle.{users}_users" if backend == "json" else f"raffle.{backend}.{users}_users"
+        state = make_raffle(tmp_dir, users, backend)
+        names = [f"user{i}" for i in range(users)]
+        number = min(1000, users * 5)
+
+        def pick_specific():
+            user = names[rng.randrange(users)]
+            free = state.index.sample_free(1)
+            state.pick_numbers(user, free)
+        results[f"{tag}.pick_numbers"] = bench(pick_specific, number, repeat)
+
+        results[f"{tag}.pick_random_numbers"] = bench(
+            lambda: state.pick_random_numbers(names[rng.randrange(users)], 1), number, repeat
+        )
+
+        # Give every user a pick so draw/save work on a realistic picks map
+        # (seeded directly, like the entries above)
+        for user, n in zip(names, state.index.sample_free(users)):
+            state.state["picks"].setdefault(user, set()).add(n)
+        state.index.rebuild(state.state["picks"])
+        seed_raffle(state)
+        results[f"{tag}.save"] = bench(state.save, 1, max(3, repeat))
+
+        def cold_load():
+            loaded = open_raffle_state(tmp_dir, users, backend)
+            loaded.journal.close()
+            if backend == "sqlite":
+                loaded.journal.db.close()
+        results[f"{tag}.load"] = bench(cold_load, 1, max(3, repeat))
+
+        def gift():
+            state.gift_entries(names[rng.randrange(users)], names[rng.randrange(users)], 1)
+        results[f"{tag}.gift_entries"] = bench(gift, number, repeat)
+
+        picks_copy = {user: set(nums) for user, nums in state.state["picks"].items()}
+
+        def restore_picks():
+            state.state["picks"] = {user: set(nums) for user, nums in picks_copy.items()}
+            state.index.rebuild(state.state["picks"])
+        results[f"{tag}.draw_winner"] = bench(state.draw_winner, 1, max(3, repeat), setup=restore_picks)
+        results[f"{tag}.draw_weighted_1"] = bench(lambda: state.draw_weighted(1, seed=1), 1, max(3, repeat))
+        results[f"{tag}.draw_weighted_10"] = bench(lambda: state.draw_weighted(10, seed=1), 1, max(3, repeat))
+
+        # A raffle-open rush of 50 new chatters: one commit each vs one batch
+        fresh = itertools.count()
+
+        def award_each():
+            for _ in range(50):
+                state.award_chat_entry(f"chatter{next(fresh)}")
+
+        def award_batch():
+            state.award_chat_entries([f"chatter{next(fresh)}" for _ in range(50)])
+
+        def forget_chatters():
+            # Keep the snapshot the same size for every run (memory only)
+            for user in [u for u in state.state["entries"] if u.startswith("chatter")]:
+                del state.state["entries"][user]
+            state.state["chat_awarded"].clear()
+        results[f"{tag}.award_50_each"] = bench(award_each, 20, repeat, setup=forget_chatters)
+        results[f"{tag}.award_50_batch"] = bench(award_batch, 20, repeat, setup=forget_chatters)
+        forget_chatters()
+        restore_picks()
+        state.journal.close()
+        yield users, state
+
+
+def bench_weighted_draws(results, number, repeat):
+    from raffle_draw import AliasTable, FenwickTree
+
+    rng = random.Random(99)
+    weights = [rng.randint(1, 50) for _ in range(100000)]
+    results["raffle_draw.alias_build_100k"] = bench(lambda: AliasTable(weights), 1, max(3, repeat))
+    table = AliasTable(weights)
+    results["raffle_draw.alias_sample"] = bench(lambda: table.sample(rng), number, repeat)
+    results["raffle_draw.fenwick_build_100k"] = bench(lambda: FenwickTree(weights), 1, max(3, repeat))
+    tree = [None]
+
+    def fresh_tree():
+        tree[0] = FenwickTree(weights)
+    results["raffle_draw.fenwick_take"] = bench(lambda: tree[0].take(rng), min(number, 50000), repeat, setup=fresh_tree)
+
+
+# --- Quote files --------------------------------------------------------------
+
+def bench_quote_files(results, number, repeat):
+    from quote_store import QuoteStore
+
+    for path in sorted(glob.glob(os.path.join(SRC_DIR, "data", "*.txt"))):
+        name = os.path.splitext(os.path.basename(path))[0]
+
+        def cold_load(path=path):
+            QuoteStore(path).refresh()
+        results[f"quotes.{name}.load"] = bench(cold_load, 1, max(5, repeat))
+        store = QuoteStore(path)
+        store.refresh()
+        results[f"quotes.{name}.random"] = bench(store.random, number, repeat)
+
+
+# --- Baseline comparison ------------------------------------------------------
+
+def compare(results, baseline, tolerance):
+    """{name: {"baseline_ns", "current_ns", "ratio", "regressed"}} for benchmarks in both runs."""
+    report = {}
+    for name, current in results.items():
+        old = baseline.get("results", {}).get(name)
+        if not old or not old.get("median_ns"):
+            continue
+        ratio = current["median_ns"] / old["median_ns"]
+        report[name] = {
+            "baseline_ns": old["median_ns"],
+            "current_ns": current["median_ns"],
+            "ratio": round(ratio, 3),
+            "regressed": ratio > 1 + tolerance,
+        }
+    return report
+
+
+async def run_all(args):
+    results = {}
+    tmp_dir = tempfile.mkdtemp(prefix="meangene-bench-")
+    try:
+        registry = bench_sfx_registry(results, tmp_dir, args.number, args.repeat)
+        bench_cooldowns(results, args.number, args.repeat)
+        raffle_state = None
+        for users, state in bench_raffle(results, tmp_dir, args.repeat):
+            if users == 1000:
+                raffle_state = state
+        for users, state in bench_raffle(results, tmp_dir, args.repeat, backend="sqlite"):
+            state.journal.db.close()
+        bench_weighted_draws(results, args.number, args.repeat)
+        await bench_router(results, registry, raffle_state, args.number, args.repeat)
+        bench_quote_files(results, args.number, args.repeat)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the bot's hot paths.")
+    parser.add_argument("--number", type=int, default=2000, help="operations per timing run")
+    parser.add_argument("--repeat", type=int, default=5, help="timing runs per benchmark")
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="compare against this JSON report")
+    parser.add_argument("--save-baseline", help="also write this run's results as a baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs baseline (0.25 = 25%%)")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit 1 if anything regressed")
+    parser.add_argument("--filter", help="only keep benchmarks whose name contains this")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run_all(args))
+    if args.filter:
+        results = {k: v for k, v in results.items() if args.filter in k}
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "number": args.number,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    regressed = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        report["comparison"] = compare(results, baseline, args.tolerance)
+        regressed = [name for name, row in report["comparison"].items() if row["regressed"]]
+        report["regressions"] = regressed
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({"meta": report["meta"], "results": results}, f, indent=2)
+            f.write("\n")
+    if regressed:
+        print(f"{len(regressed)} benchmark(s) slower than baseline by more than {args.tolerance:.0%}: "
+              f"{', '.join(regressed)}", file=sys.stderr)
+        if args.fail_on_regression:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import os
+from collections import deque
+
+from twitchio.errors import IRCCooldownError
+
+from helix_client import TokenBucket
+
+logger = logging.getLogger("chat")
+
+# Priority lanes, lowest number goes first
+HIGH, NORMAL, LOW = 0, 1, 2
+
+# Twitch: 20 messages per 30s in a channel, 100 per 30s where the bot is a mod.
+# twitchio raises IRCCooldownError past these, so stay just under them.
+LIMIT_PERIOD = 30.0
+USER_LIMIT = int(os.getenv("CHAT_USER_LIMIT", "19"))
+MOD_LIMIT = int(os.getenv("CHAT_MOD_LIMIT", "95"))
+COALESCE_WINDOW = float(os.getenv("CHAT_COALESCE_WINDOW", "2.0"))
+LOW_LANE_SIZE = 20  # flavor text older than this is dropped when chat is backed up
+MAX_LINE = 490      # Twitch cuts messages at 500 characters
+
+
+class ChannelOutbox:
+    """Pending lines for one channel and the task that sends them."""
+
+    def __init__(self, scheduler, channel):
+        self.scheduler = scheduler
+        self.channel = channel
+        self.lanes = (deque(), deque(), deque(maxlen=LOW_LANE_SIZE))
+        self.bucket = TokenBucket(USER_LIMIT / LIMIT_PERIOD, USER_LIMIT)
+        self.is_mod = None
+        self.wakeup = asyncio.Event()
+        self.task = asyncio.ensure_future(self._run())
+        self.sent = 0
+        self.dropped = 0
+
+    def put(self, text, priority):
+        lane = self.lanes[priority]
+        if lane.maxlen is not None and len(lane) == lane.maxlen:
+            self.dropped += 1
+        lane.append(text)
+        self.wakeup.set()
+
+    def pending(self):
+        return sum(len(lane) for lane in self.lanes)
+
+    def _update_limits(self):
+        is_mod = self.scheduler.is_mod_channel(self.channel)
+        if is_mod != self.is_mod:
+            self.is_mod = is_mod
+            limit = MOD_LIMIT if is_mod else USER_LIMIT
+            self.bucket.rate = limit / LIMIT_PERIOD
+            self.bucket.capacity = limit
+
+    def _next(self):
+        for priority, lane in enumerate(self.lanes):
+            if lane:
+                return priority, lane.popleft()
+        return None
+
+    async def _run(self):
+        while True:
+            item = self._next()
+            if item is None:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+            priority, text = item
+            self._update_limits()
+            await self.bucket.acquire()
+            try:
+                await self.channel.send(text)
+                self.sent += 1
+            except IRCCooldownError as e:
+                # twitchio's own limiter disagrees with ours; put it back and wait
+                logger.warning(f"Chat rate limited in #{self.channel.name}: {e}")
+                self.lanes[priority].appendleft(text)
+                await asyncio.sleep(2)
+            except Exception as e:
+                logger.error(f"Failed to send chat message to #{self.channel.name}: {e!r}")
+
+
+class ChatScheduler:
+    """Every outgoing chat line goes through here.
+
+    Each channel gets its own token bucket (mod or non-mod limits) and three
+    priority lanes, so replies to mods go out ahead of flavor text. notify()
+    merges lines of the same kind arriving within COALESCE_WINDOW into one
+    ("@a @b @c – Here are 5 complimentary entries.").
+    """
+
+    def __init__(self, mod_channels=(), coalesce_window=COALESCE_WINDOW):
+        self.mod_channels = {name.lower().lstrip("#") for name in mod_channels}
+        self.coalesce_window = coalesce_window
+        self.outboxes = {}
+        self.pending_notices = {}  # (channel name, key) -> [channel, template, items, priority]
+
+    def is_mod_channel(self, channel):
+        if channel.name.lower() in self.mod_channels:
+            return True
+        try:
+            return bool(channel._bot_is_mod())
+        except Exception:
+            return False
+
+    def _outbox(self, channel):
+        outbox = self.outboxes.get(channel.name)
+        if outbox is None:
+            outbox = self.outboxes[channel.name] = ChannelOutbox(self, channel)
+        else:
+            outbox.channel = channel
+        return outbox
+
+    def send(self, channel, text, priority=NORMAL):
+        """Queue a line; returns right away."""
+        self._outbox(channel).put(text, priority)
+
+    def notify(self, channel, key, item, template, priority=LOW):
+        """Queue item for a merged line. template has an {items} placeholder.
+
+        Items with the same key in the same channel within the coalesce window
+        become one line (split again if it would go over Twitch's length limit).
+        """
+        pending = self.pending_notices.get((channel.name, key))
+        if pending is None:
+            self.pending_notices[(channel.name, key)] = [channel, template, [item], priority]
+            asyncio.get_running_loop().call_later(self.coalesce_window, self._flush_notice, channel.name, key)
+        else:
+            pending[2].append(item)
+
+    def _flush_notice(self, channel_name, key):
+        pending = self.pending_notices.pop((channel_name, key), None)
+        if pending is None:
+            return
+        channel, template, items, priority = pending
+        room = MAX_LINE - len(template.replace("{items}", ""))
+        line = []
+        for item in items:
+            if line and len(" ".join(line + [item])) > room:
+                self.send(channel, template.replace("{items}", " ".join(line)), priority)
+                line = []
+            line.append(item)
+        if line:
+            self.send(channel, template.replace("{items}", " ".join(line)), priority)
+
+    def stats(self):
+        return {
+            name: {"pending": outbox.pending(), "sent": outbox.sent, "dropped": outbox.dropped, "mod": bool(outbox.is_mod)}
+            for name, outbox in self.outboxes.items()
+        }
+
+    async def stop(self):
+        self.pending_notices.clear()
+        for outbox in self.outboxes.values():
+            outbox.task.cancel()
+        await asyncio.gather(*(outbox.task for outbox in self.outboxes.values()), return_exceptions=True)
+
+
+_chat_scheduler = None
+
+
+def start_chat_scheduler():
+    """Create the shared scheduler. TWITCH_MOD_CHANNELS lists channels where the bot is a mod."""
+    global _chat_scheduler
+    if _chat_scheduler is None:
+        mod_channels = [c.strip() for c in os.getenv("TWITCH_MOD_CHANNELS", "").split(",") if c.strip()]
+        _chat_scheduler = ChatScheduler(mod_channels)
+    return _chat_scheduler
+
+
+def get_chat_scheduler():
+    return _chat_scheduler
+
+
+async def stop_chat_scheduler():
+    global _chat_scheduler
+    if _chat_scheduler is not None:
+        await _chat_scheduler.stop()
+        _chat_scheduler = None
+
+
+def _priority(source):
+    author = getattr(source, "author", None)
+    return HIGH if author is not None and getattr(author, "is_mod", False) else NORMAL
+
+
+async def say(source, text, priority=None):
+    """Reply in the channel of a Context or Message.
+
+    Replies to mods default to the HIGH lane. Without a running scheduler this
+    is a plain channel.send.
+    """
+    if _chat_scheduler is None:
+        await source.channel.send(text)
+        return
+    _chat_scheduler.send(source.channel, text, _priority(source) if priority is None else priority)
+
+
+async def notify(source, key, item, template, priority=LOW):
+    """Coalesced flavor line, see ChatScheduler.notify."""
+    if _chat_scheduler is None:
+        await source.channel.send(template.replace("{items}", item))
+        return
+    _chat_scheduler.notify(source.channel, key, item, template, priority)
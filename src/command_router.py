@@ -1,5 +1,84 @@
+import re
 from twitchio.ext import commands
 
+
+class DispatchSource:
+    __slots__ = ("name", "build", "version", "last_version", "tokens", "patterns")
+
+    def __init__(self, name, build, version):
+        self.name = name
+        self.build = build
+        self.version = version
+        self.last_version = version() if version else None
+        self.tokens = {}
+        self.patterns = []
+
+    def rebuild(self):
+        tokens, patterns = self.build()
+        self.tokens = tokens
+        self.patterns = [(re.compile(p) if isinstance(p, str) else p, handler) for p, handler in patterns]
+
+
+class DispatchTable:
+    """One lookup table for every "!" command the bot answers.
+
+    Each source (a cog, the twitchio commands, ...) is registered with a build
+    function returning (tokens, patterns): tokens maps an exact command word such
+    as "!lenny" to an async handler(message, command, args), patterns is a list of (regex, handler) for
+    commands that can't be listed up front. Sources registered first win when two
+    of them claim the same token.
+
+    A source can also pass a version function. refresh() compares versions and
+    only rebuilds the sources whose version moved, so the chat path normally costs
+    a couple of int compares plus one dict lookup.
+    """
+
+    def __init__(self):
+        self.sources = []
+        self.tokens = {}
+        self.patterns = []
+
+    def add_source(self, name, build, version=None):
+        source = DispatchSource(name, build, version)
+        source.rebuild()
+        self.sources.append(source)
+        self._merge()
+
+    def refresh(self):
+        changed = False
+        for source in self.sources:
+            if source.version is None:
+                continue
+            current = source.version()
+            if current != source.last_version:
+                source.last_version = current
+                source.rebuild()
+                changed = True
+        if changed:
+            self._merge()
+        return changed
+
+    def lookup(self, command):
+        """Return the handler for a command word, or None."""
+        handler = self.tokens.get(command)
+        if handler is not None:
+            return handler
+        for regex, handler in self.patterns:
+            if regex.match(command):
+                return handler
+        return None
+
+    def _merge(self):
+        tokens = {}
+        patterns = []
+        for source in reversed(self.sources):
+            tokens.update(source.tokens)
+        for source in self.sources:
+            patterns.extend(source.patterns)
+        self.tokens = tokens
+        self.patterns = patterns
+
+
 class CommandRouter(commands.Cog):
     def __init__(self, bot, sfx_registry):
         self.bot = bot
@@ -19,4 +98,4 @@ def prepare(bot):
         bot.add_cog(CommandRouter(bot, sfx_registry))
         print("Loaded cog : CommandRouter")
     else:
-        print("CommandRouter already loaded")
\ No newline at end of file
+        print("CommandRouter already loaded")
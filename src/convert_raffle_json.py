@@ -1,27 +1,89 @@
+import glob
 import json
+import os
+import sys
 
-with open("raffle_state.json", "r", encoding="utf-8") as f:
-    state = json.load(f)
+from raffle_journal import RaffleJournal, apply_record, channel_key, copy_state_files, default_state
 
-if isinstance(state["picks"], dict):
-    # Convert from {"pick": "user", ...} to {"user": [pick, ...]}
-    user_picks = {}
-    for pick, user in state["picks"].items():
-        user_picks.setdefault(user, []).append(pick)
-    state["picks"] = user_picks
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+# Single state file from before each channel had its own raffle
+LEGACY_STATE_FILE = os.path.join(DATA_DIR, "raffle_state.json")
+# One <channel>.json (+ .journal) per channel, where RaffleShards loads them from
+RAFFLE_DIR = os.path.join(DATA_DIR, "raffle")
 
-# Clean up nuclear
-if "nuclear_key" in state:
-    del state["nuclear_key"]
-if "nuclear" not in state or not isinstance(state["nuclear"], dict):
-    state["nuclear"] = {}
 
-# Clean up chat_awarded (should be a list)
-if "chat_awarded" in state and not isinstance(state["chat_awarded"], list):
-    state["chat_awarded"] = list(state["chat_awarded"])
+def convert_state(state):
+    """Bring an older raffle_state.json dict up to the current format."""
+    if isinstance(state.get("picks"), dict) and any(not isinstance(v, list) for v in state["picks"].values()):
+        # Convert from {"pick": "user", ...} to {"user": [pick, ...]}
+        user_picks = {}
+        for pick, user in state["picks"].items():
+            user_picks.setdefault(user, []).append(int(pick))
+        state["picks"] = user_picks
 
-with open("raffle_state.json", "w", encoding="utf-8") as f:
-    json.dump(state, f, ensure_ascii=False, indent=2)
+    # Clean up nuclear
+    if "nuclear_key" in state:
+        del state["nuclear_key"]
+    if "nuclear" not in state or not isinstance(state["nuclear"], dict):
+        state["nuclear"] = {}
 
-print("Conversion complete. New format:")
-print(json.dumps(state, indent=2))
\ No newline at end of file
+    # Clean up chat_awarded (should be a list)
+    if "chat_awarded" in state and not isinstance(state["chat_awarded"], list):
+        state["chat_awarded"] = list(state["chat_awarded"])
+    return state
+
+
+def migrate(state_file):
+    """Convert a raffle_state.json in place into a journal snapshot.
+
+    Any journal records already next to the file are replayed first, so running
+    this on a live data dir never loses mutations.
+    """
+    journal = RaffleJournal(state_file)
+    snapshot, records = journal.load()
+    state = default_state()
+    if snapshot is not None:
+        state.update(convert_state(snapshot))
+    state["picks"] = {user: set(int(n) for n in nums) for user, nums in state.get("picks", {}).items()}
+    state["chat_awarded"] = set(state.get("chat_awarded", []))
+    for rec in records:
+        apply_record(state, rec)
+    journal.compact(state)
+    journal.close()
+    return state, len(records)
+
+
+def channel_paths(channel=None, raffle_dir=RAFFLE_DIR, legacy_file=LEGACY_STATE_FILE):
+    """State files to convert: one channel's, or every channel's in raffle_dir.
+
+    A channel without a file yet starts from a copy of the legacy file, the
+    same way RaffleShards adopts it on first load.
+    """
+    if channel is None:
+        return sorted(glob.glob(os.path.join(raffle_dir, "*.json")))
+    path = os.path.join(raffle_dir, channel_key(channel) + ".json")
+    if not os.path.exists(path) and os.path.exists(legacy_file):
+        os.makedirs(raffle_dir, exist_ok=True)
+        copy_state_files(legacy_file, path)
+        print(f"Copied {legacy_file} to {path}.")
+    return [path] if os.path.exists(path) else []
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert per-channel raffle state files to the current format.")
+    parser.add_argument("--channel", help="only this channel (starts from the legacy raffle_state.json if it has no file yet)")
+    parser.add_argument("--file", help="convert this state file instead")
+    args = parser.parse_args()
+    paths = [args.file] if args.file else channel_paths(args.channel)
+    if not paths:
+        sys.exit(f"No raffle state files in {RAFFLE_DIR}. Use --channel <name> to start one from {LEGACY_STATE_FILE}.")
+    for path in paths:
+        state, replayed = migrate(path)
+        print(f"{path}: conversion complete ({replayed} journal records replayed). New format:")
+        print(json.dumps({"picks": {u: sorted(n) for u, n in state["picks"].items()},
+                          "entries": state["entries"],
+                          "is_open": state["is_open"],
+                          "winner": state["winner"],
+                          "winning_number": state["winning_number"]}, indent=2))
@@ -0,0 +1,203 @@
+import json
+import logging
+import os
+import re
+import time
+from collections import OrderedDict, namedtuple
+
+from metrics import COOLDOWN_BLOCKED, COOLDOWN_BUCKETS
+
+logger = logging.getLogger("cooldowns")
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+COOLDOWNS_FILE = os.getenv("COOLDOWNS_FILE", os.path.join(DATA_DIR, "cooldowns.json"))
+MAX_BUCKETS = int(os.getenv("COOLDOWN_MAX_BUCKETS", "100000"))
+
+# "N/S": N triggers per S seconds, bursts of up to N. None = no limit.
+# Overridden per SFX folder / overlay base by data/cooldowns.json, e.g.
+#   {"sfx": {"default": {"user": "3/30"}, "lenny": {"user": "1/60", "command": "2/20"}},
+#    "overlay": {"dar": {"command": "1/5"}},
+#    "channel": "30/10"}
+DEFAULT_CONFIG = {
+    "sfx": {"default": {"user": "3/30", "command": "5/10"}},
+    "overlay": {"default": {"user": "2/30", "command": "4/10"}},
+    "channel": "30/10",
+}
+
+Limit = namedtuple("Limit", "capacity per rate")
+
+
+def parse_limit(value):
+    """'3/30' -> Limit(3, 30.0, 0.1); None, 0, '' or 'off' -> None."""
+    if value in (None, 0, "", "off"):
+        return None
+    count, _, seconds = str(value).partition("/")
+    capacity = float(count)
+    per = float(seconds or 1)
+    if capacity <= 0 or per <= 0:
+        return None
+    return Limit(capacity, per, capacity / per)
+
+
+def overlay_group(action):
+    """trigger_dar2_heart -> 'dar', trigger_lol -> 'lol': heart variants share their base's limits."""
+    base = action[len("trigger_"):] if action.startswith("trigger_") else action
+    if base.endswith("_heart"):
+        base = re.sub(r"\d+$", "", base[:-len("_heart")]) or base
+    return base
+
+
+def sfx_group(command, rel_path=None):
+    """The folder a clip lives in (or the command itself for clips at the top of sfx/)."""
+    folder = os.path.basename(os.path.dirname(rel_path)) if rel_path else ""
+    return folder or command.lstrip("!")
+
+
+class Cooldowns:
+    """Token buckets for SFX and overlay triggers.
+
+    Every trigger has to find a token in three buckets: (user, command),
+    (command) and (channel). Limits come from the trigger's group, an SFX
+    folder or overlay base, falling back to the kind's "default"; mods and the
+    broadcaster are never limited. A bucket is a two-item list in an
+    OrderedDict kept in last-use order. A bucket idle long enough to have
+    refilled is the same as no bucket, so those are dropped from the front as
+    time passes (as are the oldest beyond max_buckets), which keeps memory
+    bounded however many people chat.
+    """
+
+    def __init__(self, config=None, max_buckets=MAX_BUCKETS, clock=time.monotonic):
+        self.clock = clock
+        self.max_buckets = max_buckets
+        self.buckets = OrderedDict()  # key -> [tokens, last refill]
+        self.blocked = 0
+        self.evicted = 0
+        self.configure(config or DEFAULT_CONFIG)
+
+    def configure(self, config):
+        self.config = config
+        self.channel_limit = parse_limit(config.get("channel"))
+        self._limits = {}  # (kind, group) -> (user limit, command limit)
+        pers = [self.channel_limit.per] if self.channel_limit else []
+        for kind in ("sfx", "overlay"):
+            for scopes in (config.get(kind) or {}).values():
+                for scope in ("user", "command"):
+                    limit = parse_limit(scopes.get(scope))
+                    if limit:
+                        pers.append(limit.per)
+        # Nothing idle for longer than the slowest refill can still be holding anything back
+        self.idle_ttl = max(pers, default=0.0)
+        self.buckets.clear()
+
+    def limits(self, kind, group):
+        key = (kind, group)
+        limits = self._limits.get(key)
+        if limits is None:
+            section = self.config.get(kind) or {}
+            default = section.get("default") or {}
+            own = section.get(group) or {}
+            limits = tuple(parse_limit(own[s] if s in own else default.get(s)) for s in ("user", "command"))
+            self._limits[key] = limits
+        return limits
+
+    def check(self, kind, group, command, user, channel, is_mod=False):
+        """Take a token for this trigger. Returns 0.0 if it may fire, else seconds until it could."""
+        if is_mod:
+            return 0.0
+        now = self.clock()
+        self._evict(now)
+        user_limit, command_limit = self.limits(kind, group)
+        scopes = (
+            ("user", ("u", user, command), user_limit),
+            ("command", ("c", command), command_limit),
+            ("channel", ("ch", channel), self.channel_limit),
+        )
+        taken = []
+        wait = 0.0
+        blocked_scope = None
+        for scope, key, limit in scopes:
+            if limit is None:
+                continue
+            bucket = self._bucket(key, limit, now)
+            if bucket[0] < 1:
+                needed = (1 - bucket[0]) / limit.rate
+                if needed > wait:
+                    wait, blocked_scope = needed, scope
+            taken.append(bucket)
+        if blocked_scope is not None:
+            self.blocked += 1
+            COOLDOWN_BLOCKED.inc(kind=kind, scope=blocked_scope)
+            return wait
+        # Only spend tokens once every bucket agreed
+        for bucket in taken:
+            bucket[0] -= 1
+        return 0.0
+
+    def _bucket(self, key, limit, now):
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = [limit.capacity, now]
+        else:
+            bucket[0] = min(limit.capacity, bucket[0] + (now - bucket[1]) * limit.rate)
+            bucket[1] = now
+            self.buckets.move_to_end(key)
+        return bucket
+
+    def allow(self, kind, group, command, message):
+        """check() for a chat message; logs and returns False when it's on cooldown."""
+        author = message.author
+        is_mod = bool(getattr(author, "is_mod", False) or getattr(author, "is_broadcaster", False))
+        channel = message.channel.name if message.channel else "-"
+        wait = self.check(kind, group, command, author.name.lower(), channel, is_mod)
+        if wait:
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("%s from %s on cooldown for %.1fs", command, author.name, wait,
+                             extra={"user": author.name, "channel": channel})
+            return False
+        return True
+
+    def _evict(self, now):
+        buckets = self.buckets
+        cutoff = now - self.idle_ttl
+        while buckets:
+            oldest = next(iter(buckets.values()))
+            if oldest[1] > cutoff and len(buckets) <= self.max_buckets:
+                break
+            buckets.popitem(last=False)
+            self.evicted += 1
+
+    def stats(self):
+        return {"buckets": len(self.buckets), "blocked": self.blocked, "evicted": self.evicted}
+
+
+def load_cooldown_config(path=COOLDOWNS_FILE):
+    """DEFAULT_CONFIG with data/cooldowns.json layered on top, merged per group and scope."""
+    config = {kind: dict(groups) if isinstance(groups, dict) else groups for kind, groups in DEFAULT_CONFIG.items()}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            overrides = json.load(f)
+    except FileNotFoundError:
+        return config
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable cooldown config {path}: {e}")
+        return config
+    for kind, value in overrides.items():
+        if isinstance(value, dict) and isinstance(config.get(kind), dict):
+            for group, scopes in value.items():
+                config[kind][group] = {**config[kind].get(group, {}), **scopes}
+        else:
+            config[kind] = value
+    return config
+
+
+_cooldowns = None
+
+
+def get_cooldowns():
+    """Return the process-wide Cooldowns, configured from data/cooldowns.json on first use."""
+    global _cooldowns
+    if _cooldowns is None:
+        _cooldowns = Cooldowns(load_cooldown_config())
+        COOLDOWN_BUCKETS.set_function(lambda: len(_cooldowns.buckets))
+    return _cooldowns
+
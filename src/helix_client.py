@@ -0,0 +1,220 @@
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+
+import aiohttp
+
+from metrics import HELIX_ERRORS, HELIX_LATENCY, SHOUTOUT_LOOKUP
+
+logger = logging.getLogger("helix")
+
+HELIX_URL = "https://api.twitch.tv/helix"
+_MISSING = object()
+
+
+class TTLCache:
+    """Small LRU dict whose entries expire after ttl seconds."""
+
+    def __init__(self, ttl, max_size=1024):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries = OrderedDict()
+
+    def get(self, key, default=_MISSING):
+        item = self.entries.get(key)
+        if item is None:
+            return default
+        expires, value = item
+        if expires < time.monotonic():
+            del self.entries[key]
+            return default
+        self.entries.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+
+class TokenBucket:
+    """Client-side throttle that also follows Twitch's Ratelimit-* response headers."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate  # tokens per second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return now
+
+    async def acquire(self):
+        while True:
+            now = self._refill()
+            if now < self.blocked_until:
+                await asyncio.sleep(self.blocked_until - now)
+                continue
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def update_from_headers(self, headers):
+        """Follow Ratelimit-Remaining/Reset; missing or malformed headers are ignored."""
+        remaining = _header_number(headers, "Ratelimit-Remaining")
+        if remaining is None:
+            return
+        reset = _header_number(headers, "Ratelimit-Reset")
+        self._refill()
+        self.tokens = min(self.tokens, remaining)
+        if remaining <= 0 and reset is not None:
+            # Ratelimit-Reset is a unix timestamp; turn it into a monotonic deadline
+            self.blocked_until = time.monotonic() + max(0.0, reset - time.time())
+
+
+def _header_number(headers, name):
+    try:
+        value = float(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+
+class HelixClient:
+    """Long-lived Twitch Helix client for the shoutout lookups.
+
+    One aiohttp session (and connection pool) is reused for every request,
+    login -> user id and user id -> channel info are cached with a TTL, and
+    concurrent lookups of the same login (raid trains spamming !so) share one
+    request. base_url can point at a local stand-in server for testing.
+    """
+
+    def __init__(self, client_id, token, base_url=HELIX_URL, timeout=5.0,
+                 user_ttl=3600, channel_ttl=300, rate_per_minute=800, max_connections=8):
+        self.client_id = client_id
+        self.token = token
+        self.base_url = base_url.rstrip("/")
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.max_connections = max_connections
+        self.users = TTLCache(user_ttl)
+        self.channels = TTLCache(channel_ttl)
+        self.bucket = TokenBucket(rate_per_minute / 60.0, rate_per_minute)
+        self.session = None
+        self._inflight = {}
+
+    def _session(self):
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                timeout=self.timeout,
+                headers={
+                    "Client-ID": self.client_id,
+                    "Authorization": f"Bearer {self.token}",
+                },
+            )
+        return self.session
+
+    async def get(self, path, params):
+        """GET a Helix endpoint and return its "data" list, or None if the request failed."""
+        for attempt in range(2):
+            await self.bucket.acquire()
+            start = time.perf_counter()
+            try:
+                async with self._session().get(f"{self.base_url}/{path}", params=params) as resp:
+                    self.bucket.update_from_headers(resp.headers)
+                    if resp.status == 429 and attempt == 0:
+                        logger.warning("Helix rate limit hit, waiting for reset.")
+                        continue
+                    if resp.status != 200:
+                        logger.warning(f"Helix {path} returned HTTP {resp.status}")
+                        HELIX_ERRORS.inc(endpoint=path)
+                        return None
+                    data = await resp.json()
+                    return data.get("data") or []
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning(f"Helix {path} request failed: {e!r}")
+                HELIX_ERRORS.inc(endpoint=path)
+                return None
+            finally:
+                HELIX_LATENCY.observe(time.perf_counter() - start, endpoint=path)
+        HELIX_ERRORS.inc(endpoint=path)
+        return None
+
+    async def get_user_id(self, login):
+        login = login.lower()
+        user_id = self.users.get(login)
+        if user_id is not _MISSING:
+            return user_id
+        data = await self.get("users", {"login": login})
+        if data is None:
+            return None  # don't cache failures
+        user_id = data[0]["id"] if data else None
+        self.users.set(login, user_id)
+        return user_id
+
+    async def get_channel(self, user_id):
+        channel = self.channels.get(user_id)
+        if channel is not _MISSING:
+            return channel
+        data = await self.get("channels", {"broadcaster_id": user_id})
+        if data is None:
+            return None
+        channel = data[0] if data else None
+        self.channels.set(user_id, channel)
+        return channel
+
+    async def get_last_game(self, login):
+        """Last game the channel was set to, or None. Concurrent calls for one login share a request."""
+        login = login.lower()
+        task = self._inflight.get(login)
+        if task is None:
+            task = asyncio.ensure_future(self._timed_last_game(login))
+            self._inflight[login] = task
+            task.add_done_callback(lambda _: self._inflight.pop(login, None))
+        return await asyncio.shield(task)
+
+    async def _timed_last_game(self, login):
+        with SHOUTOUT_LOOKUP.time():
+            return await self._lookup_last_game(login)
+
+    async def _lookup_last_game(self, login):
+        user_id = await self.get_user_id(login)
+        if not user_id:
+            return None
+        channel = await self.get_channel(user_id)
+        return channel.get("game_name") if channel else None
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+
+
+_helix_client = None
+
+
+def get_helix_client():
+    """Shared HelixClient built from TWITCH_CLIENT_ID / TWITCH_OAUTH_TOKEN, or None if unset."""
+    global _helix_client
+    if _helix_client is None:
+        client_id = os.getenv("TWITCH_CLIENT_ID")
+        token = os.getenv("TWITCH_OAUTH_TOKEN")
+        if not client_id or not token:
+            return None
+        _helix_client = HelixClient(client_id, token, base_url=os.getenv("HELIX_BASE_URL", HELIX_URL))
+    return _helix_client
+
+
+async def close_helix_client():
+    global _helix_client
+    if _helix_client is not None:
+        await _helix_client.close()
+        _helix_client = None
@@ -0,0 +1,172 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+LOGS_DIR = os.path.join(BASE_DIR, "logs")
+MAX_BYTES = 5 * 1024 * 1024
+BACKUP_COUNT = 5
+STOP_TIMEOUT = 5.0  # seconds stop_logging() waits for queued records to be written
+
+# Loggers that also get a file of their own (besides bot.log)
+SUBSYSTEM_FILES = {
+    "sfx_creation": "sfx_creation.log",
+}
+
+# Attributes every LogRecord has; anything else came in through extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, plus any extra= fields."""
+
+    def format(self, record):
+        data = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep 1 in N records below WARNING for the configured loggers.
+
+    rates is {logger name: N}; child loggers ("router.x") use their parent's rate.
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+        self.counts = {}
+
+    def _rate(self, name):
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition(".")[0]
+        return 1
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        if rate <= 1:
+            return True
+        count = self.counts.get(record.name, 0)
+        self.counts[record.name] = count + 1
+        return count % rate == 0
+
+
+def _parse_pairs(value):
+    """'router=DEBUG,sfx=WARNING' -> {'router': 'DEBUG', 'sfx': 'WARNING'}"""
+    pairs = {}
+    for part in (value or "").split(","):
+        name, sep, setting = part.partition("=")
+        if sep and name.strip() and setting.strip():
+            pairs[name.strip()] = setting.strip()
+    return pairs
+
+
+def is_quiet(argv=None):
+    argv = sys.argv if argv is None else argv
+    return "--quiet" in argv or os.getenv("BOT_ENV", "").lower() == "prod"
+
+
+def setup_logging(level=None, quiet=None, logs_dir=LOGS_DIR):
+    """Route all logging through a queue to a background writer thread.
+
+    Loggers only put records on a queue; the QueueListener thread formats them
+    as JSON into logs/bot.log (rotated) and, unless quiet, echoes them to the
+    console. Env:
+      LOG_LEVEL   root level (default INFO, WARNING when quiet)
+      LOG_LEVELS  per-subsystem levels, e.g. "router=DEBUG,overlay_ws=WARNING"
+      LOG_SAMPLE  keep 1 in N sub-WARNING records, e.g. "router=100,sfx=10"
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+    if quiet is None:
+        quiet = is_quiet()
+    level = level or os.getenv("LOG_LEVEL") or ("WARNING" if quiet else "INFO")
+
+    os.makedirs(logs_dir, exist_ok=True)
+    json_formatter = JsonFormatter()
+    handlers = []
+    main_file = logging.handlers.RotatingFileHandler(
+        os.path.join(logs_dir, "bot.log"), maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT, encoding="utf-8"
+    )
+    main_file.setFormatter(json_formatter)
+    handlers.append(main_file)
+    for name, filename in SUBSYSTEM_FILES.items():
+        handler = logging.handlers.RotatingFileHandler(
+            os.path.join(logs_dir, filename), maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT, encoding="utf-8"
+        )
+        handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+        handler.addFilter(logging.Filter(name))
+        handlers.append(handler)
+    if not quiet:
+        console = logging.StreamHandler(sys.stdout)
+        console.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s"))
+        handlers.append(console)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    rates = {}
+    for name, rate in _parse_pairs(os.getenv("LOG_SAMPLE")).items():
+        try:
+            rates[name] = max(1, int(rate))
+        except ValueError:
+            pass
+    if rates:
+        # Filter before enqueueing so sampled-out records cost nothing further
+        queue_handler.addFilter(SamplingFilter(rates))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper())
+    for name, sub_level in _parse_pairs(os.getenv("LOG_LEVELS")).items():
+        logging.getLogger(name).setLevel(sub_level.upper())
+    # twitchio logs every IRC line at DEBUG
+    if not logging.getLogger("twitchio").level:
+        logging.getLogger("twitchio").setLevel(logging.INFO)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging(timeout=STOP_TIMEOUT):
+    """Flush whatever is still queued and stop the writer thread.
+
+    Waits at most `timeout` seconds: QueueListener.stop() joins the writer with
+    no timeout, so it runs on a helper thread that shutdown can give up on if
+    the writer is stuck on a dead disk or console.
+    """
+    global _listener
+    listener, _listener = _listener, None
+    if listener is None:
+        return
+    stopper = threading.Thread(target=listener.stop, name="log-stop", daemon=True)
+    stopper.start()
+    stopper.join(timeout)
+    if stopper.is_alive():
+        print(f"Log writer didn't finish within {timeout}s; some log lines may be lost.", file=sys.stderr)
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+
+from metrics import histogram
+
+logger = logging.getLogger("watchdog")
+
+LOOP_LAG = histogram(
+    "event_loop_lag_seconds", "How late the event loop ran a timer",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+
+INTERVAL = float(os.getenv("LOOP_WATCHDOG_INTERVAL_MS", "100")) / 1000
+THRESHOLD = float(os.getenv("LOOP_LAG_THRESHOLD_MS", "250")) / 1000
+
+# What each router task is running right now: {task: (handler label, user, message text, started)}.
+# Handler tasks overlap (one awaits Helix while another runs), so the marker is
+# kept per task and the watchdog reads the one for the task the loop is running.
+# Written on the loop thread, read by the watchdog thread; values replaced whole, never mutated.
+_running = {}
+
+
+def note_handler(handler, message):
+    """Called by the router before it awaits a handler; returns a token for clear_handler."""
+    task = asyncio.current_task()
+    previous = _running.get(task)
+    author = getattr(message, "author", None)
+    _running[task] = (handler, getattr(author, "name", None), (message.content or "")[:200], time.monotonic())
+    return task, previous
+
+
+def clear_handler(token):
+    task, previous = token
+    if previous is None:
+        _running.pop(task, None)
+    else:
+        _running[task] = previous
+
+
+class LoopWatchdog:
+    """Measures event loop lag and catches whatever is blocking it.
+
+    A coroutine sleeps for `interval` and records how late it woke up
+    (event_loop_lag_seconds). A helper thread watches that heartbeat; when the
+    loop has not ticked for `threshold`, it grabs the loop thread's stack with
+    sys._current_frames() while the blocking call is still on it and logs it
+    with the handler and chat message of the task that is stuck.
+    """
+
+    def __init__(self, interval=INTERVAL, threshold=THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self.heartbeat = time.monotonic()
+        self.loop = None
+        self.loop_thread_id = None
+        self.stalls = 0
+        self.max_lag = 0.0
+        self._task = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        self.loop = asyncio.get_event_loop()
+        self.loop_thread_id = threading.get_ident()
+        self.heartbeat = time.monotonic()
+        self._task = asyncio.ensure_future(self._measure())
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+
+    async def _measure(self):
+        while True:
+            before = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self.heartbeat = now
+            lag = max(0.0, now - before - self.interval)
+            LOOP_LAG.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag >= self.threshold:
+                logger.warning("Event loop lagged %.0f ms", lag * 1000, extra={"lag_ms": round(lag * 1000, 1)})
+
+    def _watch(self):
+        reported = None  # heartbeat value of the stall we already dumped
+        while not self._stop.wait(self.interval / 2):
+            heartbeat = self.heartbeat
+            stalled_for = time.monotonic() - heartbeat - self.interval
+            if stalled_for < self.threshold or heartbeat == reported:
+                continue
+            reported = heartbeat
+            self.stalls += 1
+            self._report(stalled_for)
+
+    def _report(self, stalled_for):
+        frame = sys._current_frames().get(self.loop_thread_id)
+        stack = "".join(traceback.format_stack(frame)) if frame is not None else "(no frame)"
+        blocking = "?"
+        if frame is not None:
+            blocking = f"{frame.f_code.co_filename}:{frame.f_lineno} in {frame.f_code.co_name}"
+        # The task the loop is stuck in right now, not whichever handler started last
+        task = asyncio.current_task(self.loop) if self.loop is not None else None
+        current = _running.get(task) if task is not None else None
+        handler = user = content = None
+        running_for = None
+        if current is not None:
+            handler, user, content, started = current
+            running_for = round((time.monotonic() - started) * 1000, 1)
+        logger.warning(
+            "Event loop blocked for %.0f ms at %s (handler=%s, user=%s, message=%r)\n%s",
+            stalled_for * 1000, blocking, handler, user, content, stack,
+            extra={
+                "stall_ms": round(stalled_for * 1000, 1),
+                "blocking_frame": blocking,
+                "handler": handler,
+                "user": user,
+                "chat_message": content,
+                "handler_running_ms": running_for,
+            },
+        )
+
+    def stats(self):
+        return {"stalls": self.stalls, "max_lag_ms": round(self.max_lag * 1000, 1)}
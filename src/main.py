@@ -5,7 +5,6 @@ import logging
 from twitchio.ext import commands
 import asyncio
 from dotenv import load_dotenv
-import threading
 
 print("Loaded basic imports.")
 
@@ -22,6 +21,12 @@ try:
 except Exception as e:
     print("FAILED to import build_sfx_registry:", e)
 
+try:
+    from sfx_player import build_sfx_player
+    print("Imported build_sfx_player from sfx_player.")
+except Exception as e:
+    print("FAILED to import build_sfx_player:", e)
+
 try:
     from sfx import prepare as prepare_sfx
     print("Imported prepare_sfx from sfx.")
@@ -34,25 +39,19 @@ try:
 except Exception as e:
     print("FAILED to import prepare_command_router:", e)
 
-# --- Logging setup ---
-os.makedirs("logs", exist_ok=True)
-print("Ensured logs directory exists.")
-
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-    handlers=[
-        logging.FileHandler("logs/bot_debug.log", encoding="utf-8"),
-    ]
-)
-logger = logging.getLogger(__name__)
-print("Logging configured.")
-
 # --- Environment loading ---
 print("Loading .env...")
 load_dotenv()
 print(".env loaded.")
 
+# --- Logging setup (after .env so LOG_LEVEL/LOG_LEVELS/LOG_SAMPLE can live there) ---
+# Records go through a queue to a writer thread: nothing on the event loop
+# blocks on a file or the console. --quiet (or BOT_ENV=prod) drops the console.
+from log_setup import setup_logging, stop_logging
+setup_logging()
+logger = logging.getLogger("main")
+print("Logging configured.")
+
 TWITCH_TOKEN = os.getenv("TWITCH_TOKEN")
 TWITCH_CLIENT_ID = os.getenv("TWITCH_CLIENT_ID")
 TWITCH_CLIENT_SECRET = os.getenv("TWITCH_CLIENT_SECRET")
@@ -71,32 +70,50 @@ if not TWITCH_CHANNELS_RAW: raise RuntimeError("TWITCH_CHANNELS is not set! Chec
 TWITCH_CHANNELS = [ch.strip() for ch in TWITCH_CHANNELS_RAW.split(",") if ch.strip()]
 print(f"TWITCH_CHANNELS parsed: {TWITCH_CHANNELS}")
 
+# Point chat at another IRC endpoint instead of Twitch, e.g. the local stand-in
+# in benchmarks/fake_tmi.py. The token is not validated then; TWITCH_NICK is the login.
+TWITCH_IRC_HOST = os.getenv("TWITCH_IRC_HOST")
+TWITCH_NICK = os.getenv("TWITCH_NICK", "meangenebot")
+
 # === Overlay Server Integration ===
-def start_overlay_ws_server():
+# Everything runs on one asyncio loop: the bot, the overlay WS endpoint, the
+# overlay HTTP server and the status page. An overlay trigger is a plain await
+# from the chat handler to the WS client queues, no thread hops.
+async def start_overlay_ws_server():
     # Import here to avoid import errors if overlay backend is missing
-    from backend.ws_server import start_ws_server_threaded
-    ws_thread = threading.Thread(target=start_ws_server_threaded, daemon=True)
-    ws_thread.start()
-    print("Overlay WebSocket server thread started.")
-
-def start_overlay_http_server():
-    # Serve overlay.html and gifs via HTTP for OBS
-    import http.server
-    import socketserver
-    overlay_dir = os.path.join(os.path.dirname(__file__), 'overlay')
-    os.chdir(overlay_dir)
-    Handler = http.server.SimpleHTTPRequestHandler
-    httpd = socketserver.TCPServer(("", 8081), Handler)
-    print("Overlay HTTP server serving at http://localhost:8081")
-    http_thread = threading.Thread(target=httpd.serve_forever, daemon=True)
-    http_thread.start()
-    return httpd
-
-def run_twitch_bot():
-    print("Entering run_twitch_bot()")
-    logger.info("Starting Twitch bot event loop.")
-    asyncio.set_event_loop(asyncio.new_event_loop())
-    print("Created new asyncio event loop.")
+    from backend.ws_server import start_ws_server
+    return await start_ws_server()
+
+async def start_overlay_http_server():
+    # Serve overlay.html and gifs via HTTP for OBS (aiohttp: ETags, Range, in-memory GIFs)
+    from backend.static_server import start_static_server
+    return await start_static_server()
+
+def start_sfx_watcher(bot):
+    from sfx_watcher import SFXWatcher
+    watcher = SFXWatcher(bot.sfx_registry)
+    cache = getattr(bot.sfx_player, "cache", None)
+    if cache is not None:
+        def invalidate_clips(paths):
+            for path in paths:
+                cache.invalidate(path)
+        watcher.listeners.append(invalidate_clips)
+    watcher.start(asyncio.get_running_loop())
+    print(f"SFX watcher started on {bot.sfx_registry.sfx_dir}")
+    return watcher
+
+def use_irc_host(bot, host, nick):
+    import aiohttp
+    import twitchio.websocket
+    twitchio.websocket.HOST = host
+    # A known nick makes twitchio skip the id.twitch.tv token validation, which is
+    # also where it would have created its HTTP session.
+    bot._http.nick = nick
+    if bot._http.session is None:
+        bot._http.session = aiohttp.ClientSession()
+
+def build_bot():
+    print("Entering build_bot()")
 
     # --- Build SFX registry BEFORE loading cogs ---
     sfx_registry = None
@@ -115,6 +132,15 @@ def run_twitch_bot():
     else:
         print("No build_sfx_registry available, skipping SFX registry.")
 
+    # --- Start the SFX playback workers (clips never play on the event loop) ---
+    sfx_player = None
+    if 'build_sfx_player' in globals() and build_sfx_player:
+        try:
+            sfx_player = build_sfx_player()
+            print(f"SFX player started: {sfx_player.stats()}")
+        except Exception as e:
+            print(f"Failed to start SFX player: {e}")
+
     # --- Instantiate bot ---
     bot = commands.Bot(
         token=TWITCH_TOKEN,
@@ -122,9 +148,19 @@ def run_twitch_bot():
         initial_channels=TWITCH_CHANNELS
     )
     print("Bot instantiated.")
+    if TWITCH_IRC_HOST:
+        use_irc_host(bot, TWITCH_IRC_HOST, TWITCH_NICK)
+        print(f"Chat IRC host overridden: {TWITCH_IRC_HOST} as {TWITCH_NICK}")
     bot.sfx_registry = sfx_registry  # Make registry available to cogs
+    bot.sfx_player = sfx_player
     if sfx_registry and hasattr(sfx_registry, 'sfx_dir'):
         bot.sfx_dir = sfx_registry.sfx_dir
+    try:
+        from backend.media_mapper import get_overlay_index
+        bot.overlay_index = get_overlay_index()  # Watched overlay media, shared by cogs
+        print(f"Overlay media index ready (v{bot.overlay_index.version}).")
+    except Exception as e:
+        print(f"Failed to build overlay media index: {e}")
     print(f"Assigned sfx_registry to bot: {bot.sfx_registry}")
     if hasattr(bot, "sfx_dir"):
         print(f"Assigned sfx_dir to bot: {bot.sfx_dir}")
@@ -145,14 +181,68 @@ def run_twitch_bot():
     #     prepare_command_router(bot)
     #     print("CommandRouter cog loaded.")
 
-    print("About to run bot...")
-    bot.run()
-    print("bot.run() returned (should never get here unless bot stops).")
+    return bot
+
+async def main():
+    logger.info("Starting Twitch bot event loop.")
+    bot = build_bot()
+    import web_status
+    from backend.ws_server import stop_ws_server
+    from chat_scheduler import start_chat_scheduler, stop_chat_scheduler
+    from helix_client import close_helix_client
+
+    from metrics import CHANNELS, SERVICE_UP
+
+    @bot.event()
+    async def event_ready():
+        SERVICE_UP.set(1, service="twitch")
+        for channel in TWITCH_CHANNELS:
+            CHANNELS.set(1, service="twitch", channel=channel.lower())
+
+    # Start order: overlay endpoints first so the browser source can connect,
+    # then the status page, then chat (outbound scheduler, then the bot).
+    # Shutdown runs the stack in reverse.
+    shutdown = []
+    try:
+        from loop_watchdog import LoopWatchdog
+        watchdog = LoopWatchdog()  # logs the stack of anything that blocks the loop
+        watchdog.start()
+        shutdown.append(("loop watchdog", watchdog.stop))
+        ws_server = await start_overlay_ws_server()
+        shutdown.append(("overlay WS server", lambda: stop_ws_server(ws_server)))
+        http_runner = await start_overlay_http_server()  # Optional: comment out if you serve with nginx or another HTTP server
+        shutdown.append(("overlay HTTP server", http_runner.cleanup))
+        status_server, status_task = await web_status.start_status_server()
+        shutdown.append(("status page", lambda: web_status.stop_status_server(status_server, status_task)))
+        start_chat_scheduler()  # outgoing chat: per-channel rate limits, priority lanes
+        shutdown.append(("chat scheduler", stop_chat_scheduler))
+        if getattr(bot, "sfx_registry", None):
+            sfx_watcher = start_sfx_watcher(bot)  # new/removed clips apply live, in debounced batches
+            shutdown.append(("SFX watcher", lambda: asyncio.to_thread(sfx_watcher.stop)))
+        print("About to start bot...")
+        await bot.start()  # disconnects from chat itself when cancelled
+    finally:
+        SERVICE_UP.set(0, service="twitch")
+        for name, stop in reversed(shutdown):
+            try:
+                await stop()
+                print(f"Stopped {name}.")
+            except Exception as e:
+                print(f"Error stopping {name}: {e}")
+        await close_helix_client()
+        if getattr(bot, "sfx_player", None):
+            bot.sfx_player.stop()
+        if getattr(bot, "overlay_index", None):
+            bot.overlay_index.stop_watching()
+        raffle = bot.get_cog("RaffleCog")
+        if raffle:
+            raffle.close()  # write pending chat awards, compact each loaded channel
 
 if __name__ == "__main__":
     print("Running as __main__!")
-    # === Start Overlay Servers before bot ===
-    start_overlay_ws_server()
-    start_overlay_http_server()  # Optional: comment out if you serve with nginx or another HTTP server
-    run_twitch_bot()
-    print("End of main.py reached (should never see this unless bot.run() exits).")
\ No newline at end of file
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    print("Mean Gene Bot stopped.")
+    stop_logging()
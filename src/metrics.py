@@ -0,0 +1,206 @@
+import bisect
+import time
+from contextlib import contextmanager
+
+# Seconds; chat handlers should sit in the first few buckets
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    pairs.extend(f'{n}="{_escape(v)}"' for n, v in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """[(suffix, label values, extra labels, value)] for rendering."""
+        return [("", key, (), value) for key, value in sorted(self.values.items())]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for suffix, key, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self.values.get(self._key(labels), 0)
+
+    def total(self):
+        return sum(self.values.values())
+
+
+class Gauge(Metric):
+    """A value that goes up and down. set_function() makes it read a live value at scrape time."""
+
+    type = "gauge"
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self.function = None
+
+    def set(self, value, **labels):
+        self.values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function):
+        """function() returns a number, or {label value tuple: number} for labelled gauges."""
+        self.function = function
+
+    def samples(self):
+        if self.function is None:
+            return super().samples()
+        try:
+            value = self.function()
+        except Exception:
+            return []
+        if isinstance(value, dict):
+            return [("", tuple(map(str, key)), (), v) for key, v in sorted(value.items())]
+        return [("", (), (), value)]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        series = self.values.get(key)
+        if series is None:
+            # per-bucket counts (last one is +Inf), sum, count
+            series = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def quantile(self, q, key):
+        """Upper bound of the bucket holding quantile q (what a status page needs)."""
+        series = self.values.get(key)
+        if not series or not series[2]:
+            return None
+        rank = q * series[2]
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), series[0]):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def samples(self):
+        out = []
+        for key, (counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                out.append(("_bucket", key, (("le", _format_value(bound)),), cumulative))
+            out.append(("_sum", key, (), total))
+            out.append(("_count", key, (), count))
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        existing = self.metrics.get(metric.name)
+        if existing is not None:
+            return existing  # module reloaded, keep counting into the same series
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        """Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+START_TIME = time.time()
+
+
+def counter(name, help_text, labelnames=()):
+    return REGISTRY.register(Counter(name, help_text, labelnames))
+
+
+def gauge(name, help_text, labelnames=()):
+    return REGISTRY.register(Gauge(name, help_text, labelnames))
+
+
+def histogram(name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return REGISTRY.register(Histogram(name, help_text, labelnames, buckets))
+
+
+# Shared metrics; modules import these instead of creating their own copies
+CHAT_MESSAGES = counter("chat_messages_total", "Chat messages seen", ("channel",))
+COMMANDS = counter("chat_commands_total", "Commands dispatched, by cog and handler", ("cog", "handler"))
+COMMAND_ERRORS = counter("chat_command_errors_total", "Command handlers that raised", ("cog", "handler"))
+HANDLER_LATENCY = histogram("chat_handler_seconds", "Time spent in a command handler", ("cog", "handler"))
+SERVICE_UP = gauge("bot_connected", "1 while connected to the service", ("service",))
+CHANNELS = gauge("bot_channel_joined", "Channels the bot has joined", ("service", "channel"))
+SFX_QUEUE_DEPTH = gauge("sfx_queue_depth", "SFX clips waiting for a voice")
+SFX_ACTIVE = gauge("sfx_active_voices", "SFX clips playing right now")
+SFX_PLAYED = counter("sfx_played_total", "SFX clips played since start")
+SFX_DROPPED = counter("sfx_dropped_total", "SFX clips dropped by the queue policy")
+WS_CLIENTS = gauge("overlay_ws_clients", "Connected overlay browser sources")
+WS_SEND_LAG = histogram("overlay_ws_send_lag_seconds", "Time an overlay event waited in a client queue")
+WS_DROPPED = counter("overlay_ws_dropped_total", "Overlay events shed for slow clients")
+RAFFLE_SAVE = histogram("raffle_save_seconds", "Raffle journal append / snapshot time", ("kind",))
+RAFFLE_SHARDS = gauge("raffle_channels_loaded", "Channels whose raffle state is in memory")
+HELIX_LATENCY = histogram("helix_request_seconds", "Helix API request time", ("endpoint",))
+SHOUTOUT_LOOKUP = histogram("helix_last_game_seconds", "Time to resolve a channel's last game for !so")
+HELIX_ERRORS = counter("helix_errors_total", "Failed Helix API requests", ("endpoint",))
+COOLDOWN_BLOCKED = counter("cooldown_blocked_total", "SFX/overlay triggers refused by a cooldown", ("kind", "scope"))
+COOLDOWN_BUCKETS = gauge("cooldown_buckets", "Token buckets held for SFX/overlay cooldowns")
@@ -0,0 +1,121 @@
+import asyncio
+import os
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+# One writer thread keeps appends to the same file in order
+_write_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="quote-writer")
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def non_empty(line):
+    return bool(line)
+
+
+class QuoteStore:
+    """A one-line-per-entry text file (tics, derpisms, DAH cards) kept in memory.
+
+    The file is read once and re-read only when its mtime or size changes, so
+    hand edits still show up. lines keeps file order for "#12" lookups and
+    line_set makes the duplicate check O(1). New lines are appended to the file
+    on a background thread and go into memory once the write has succeeded.
+    """
+
+    def __init__(self, path, line_filter=non_empty):
+        self.path = os.path.abspath(path)
+        self.line_filter = line_filter
+        self.lines = []
+        self.line_set = set()
+        self._stat = None
+        self._adding = set()  # lines being written right now, for dedupe
+        self._writes = 0  # appends in flight; the file changes under refresh() meanwhile
+
+    def _file_stat(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def refresh(self):
+        if self._writes:
+            return  # our own appends; add() updates memory when each one lands
+        st = self._file_stat()
+        if st == self._stat:
+            return
+        lines = []
+        if st is not None:
+            with open(self.path, "r", encoding="utf-8") as f:
+                lines = [line.strip() for line in f if self.line_filter(line.strip())]
+        self.lines = lines
+        self.line_set = set(lines)
+        self._stat = st
+
+    def exists(self):
+        return os.path.isfile(self.path)
+
+    def all(self):
+        self.refresh()
+        return self.lines
+
+    def get(self, index):
+        """0-based lookup, None if out of range."""
+        lines = self.all()
+        if 0 <= index < len(lines):
+            return lines[index]
+        return None
+
+    def random(self):
+        lines = self.all()
+        return random.choice(lines) if lines else None
+
+    def sample(self, count):
+        return random.sample(self.all(), count)
+
+    def __contains__(self, text):
+        self.refresh()
+        return text in self.line_set
+
+    def __len__(self):
+        self.refresh()
+        return len(self.lines)
+
+    async def add(self, text, dedupe=True):
+        """Add a line. Returns its 1-based number, or None if dedupe found it already.
+
+        If the write fails the exception propagates and memory is left as it was.
+        """
+        self.refresh()
+        if dedupe and (text in self.line_set or text in self._adding):
+            return None
+        self._adding.add(text)
+        self._writes += 1
+        try:
+            st = await asyncio.get_running_loop().run_in_executor(_write_pool, self._append_line, text)
+        finally:
+            self._writes -= 1
+            self._adding.discard(text)
+        self.lines.append(text)
+        self.line_set.add(text)
+        # Our own write shouldn't trigger a full reload on the next read
+        self._stat = st
+        return len(self.lines)
+
+    def _append_line(self, text):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(f"{text}\n")
+        return self._file_stat()
+
+
+def get_quote_store(path, line_filter=non_empty):
+    """Return the shared QuoteStore for a file (one instance per path)."""
+    key = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = QuoteStore(key, line_filter)
+        return store
@@ -0,0 +1,111 @@
+"""Weighted raffle draws: "entries = tickets" instead of one chance per picked number.
+
+Weights are whole numbers (entries left, chat lines), so both samplers work in
+integers and a seed gives the same winners on any machine:
+
+  AliasTable   Walker/Vose alias method: O(n) to build, O(1) per draw, with
+               replacement (the same user may win more than once).
+  FenwickTree  prefix sums: O(n) to build, O(log n) per draw, and a winner's
+               weight can be zeroed in O(log n), so N winners without
+               replacement cost O(n + N log n).
+
+Users are sorted before building, so the outcome depends only on the weights
+and the seed, not on the order a dict happened to be loaded in. weights_digest
+fingerprints the weights for the audit record; replaying a draw with weights
+that have the same digest and the recorded seed gives the same winners.
+"""
+import hashlib
+import random
+
+
+class AliasTable:
+    def __init__(self, weights):
+        n = len(weights)
+        total = sum(weights)
+        if n == 0 or total <= 0:
+            raise ValueError("Need at least one positive weight.")
+        self.n = n
+        self.total = total
+        # Column i keeps i with probability prob[i] / total and hands over to alias[i] otherwise
+        scaled = [w * n for w in weights]
+        prob = [total] * n
+        alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < total]
+        large = [i for i, p in enumerate(scaled) if p >= total]
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            prob[s] = scaled[s]
+            alias[s] = l
+            scaled[l] += scaled[s] - total
+            (small if scaled[l] < total else large).append(l)
+        self.prob = prob
+        self.alias = alias
+
+    def sample(self, rng):
+        i = rng.randrange(self.n)
+        return i if rng.randrange(self.total) < self.prob[i] else self.alias[i]
+
+
+class FenwickTree:
+    def __init__(self, weights):
+        n = len(weights)
+        tree = [0] + list(weights)
+        for i in range(1, n + 1):
+            parent = i + (i & -i)
+            if parent <= n:
+                tree[parent] += tree[i]
+        self.n = n
+        self.tree = tree
+        self.weights = list(weights)
+        self.total = sum(weights)
+        self.top = 1 << (n.bit_length() - 1) if n else 0
+
+    def add(self, i, delta):
+        self.weights[i] += delta
+        self.total += delta
+        i += 1
+        while i <= self.n:
+            self.tree[i] += delta
+            i += i & -i
+
+    def find(self, target):
+        """Index of the item covering target, 0 <= target < total."""
+        pos = 0
+        step = self.top
+        while step:
+            nxt = pos + step
+            if nxt <= self.n and self.tree[nxt] <= target:
+                pos = nxt
+                target -= self.tree[nxt]
+            step >>= 1
+        return pos
+
+    def take(self, rng):
+        """Draw one index by weight and remove it from later draws."""
+        i = self.find(rng.randrange(self.total))
+        self.add(i, -self.weights[i])
+        return i
+
+
+def weighted_sample(weights, count=1, seed=None, replace=False):
+    """Draw `count` keys from a {key: weight} dict; keys with weight <= 0 never win.
+
+    Without replacement fewer than `count` come back if fewer keys have weight.
+    """
+    users = sorted(user for user, weight in weights.items() if weight > 0)
+    if not users or count < 1:
+        return []
+    values = [int(weights[user]) for user in users]
+    rng = random.Random(seed)
+    if replace:
+        table = AliasTable(values)
+        return [users[table.sample(rng)] for _ in range(count)]
+    tree = FenwickTree(values)
+    return [users[tree.take(rng)] for _ in range(min(count, len(users)))]
+
+
+def weights_digest(weights):
+    """Short SHA-256 of the positive weights, for the draw's audit record."""
+    lines = "".join(f"{user}:{int(weight)}\n" for user, weight in sorted(weights.items()) if weight > 0)
+    return hashlib.sha256(lines.encode()).hexdigest()[:16]
@@ -0,0 +1,95 @@
+import logging
+import random
+from array import array
+
+logger = logging.getLogger("raffle")
+
+
+class NumberIndex:
+    """Live number -> owner index for raffle picks.
+
+    owners[n] is the user holding number n (or None). The free numbers live in a
+    dense array with a reverse position table, so claiming or releasing a number
+    is a swap-remove and sampling k free numbers is O(k) no matter how big the
+    range is. taken works the same way for the picked numbers, which makes a
+    uniform draw a single random index.
+    """
+
+    def __init__(self, size=1000):
+        self.size = size
+        self.clear()
+
+    def clear(self):
+        self.owners = [None] * self.size
+        self.free = array("l", range(self.size))
+        self.free_pos = array("l", range(self.size))
+        self.taken = array("l")
+        self.taken_pos = array("l", [-1]) * self.size
+
+    def rebuild(self, picks):
+        """Reset the index from a {user: {numbers}} dict.
+
+        Old state files can hold a number twice or one outside the range; those
+        picks are logged and left out of the index instead of failing the load.
+        """
+        self.clear()
+        for user, nums in picks.items():
+            for n in nums:
+                n = int(n)
+                if not self.in_range(n):
+                    logger.warning(f"Skipping {user}'s raffle pick {n}: outside 0-{self.size - 1}")
+                elif not self.is_free(n):
+                    logger.warning(f"Skipping {user}'s raffle pick {n}: already held by {self.owners[n]}")
+                else:
+                    self.claim(n, user)
+
+    def in_range(self, n):
+        return 0 <= n < self.size
+
+    def owner(self, n):
+        return self.owners[n]
+
+    def is_free(self, n):
+        return self.owners[n] is None
+
+    def free_count(self):
+        return len(self.free)
+
+    def claim(self, n, user):
+        if self.owners[n] is not None:
+            raise ValueError(f"Number {n} is already taken by {self.owners[n]}.")
+        self.owners[n] = user
+        # swap-remove n from free
+        i = self.free_pos[n]
+        last = self.free[-1]
+        self.free[i] = last
+        self.free_pos[last] = i
+        self.free.pop()
+        self.free_pos[n] = -1
+        self.taken_pos[n] = len(self.taken)
+        self.taken.append(n)
+
+    def release(self, n):
+        if self.owners[n] is None:
+            return
+        self.owners[n] = None
+        i = self.taken_pos[n]
+        last = self.taken[-1]
+        self.taken[i] = last
+        self.taken_pos[last] = i
+        self.taken.pop()
+        self.taken_pos[n] = -1
+        self.free_pos[n] = len(self.free)
+        self.free.append(n)
+
+    def sample_free(self, count, rng=random):
+        """Return count distinct free numbers (not claimed yet)."""
+        positions = rng.sample(range(len(self.free)), count)
+        return [self.free[i] for i in positions]
+
+    def random_taken(self, rng=random):
+        """Return (owner, number) for a uniformly chosen picked number, or None."""
+        if not self.taken:
+            return None
+        n = self.taken[rng.randrange(len(self.taken))]
+        return self.owners[n], n
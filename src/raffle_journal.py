@@ -0,0 +1,197 @@
+import json
+import logging
+import os
+import re
+import shutil
+
+# A raffle mutation is stored as a small "record" dict, e.g.
+#   {"op": "ent", "u": "someuser", "v": 5}     entries for a user (absolute value)
+#   {"op": "pick", "u": "someuser", "n": [7]}  numbers added to a user's picks
+#   {"op": "award", "u": "someuser"}           user got their chat entries
+#   {"op": "set", "k": "is_open", "v": true}   plain top-level field
+#   {"op": "draw", "u": "someuser", "n": 7}    winner + winning number
+#   {"op": "wdraw", "u": ["a", "b"], "by": "entries", "seed": 42}
+#                                              weighted draw (raffle_draw.py)
+#   {"op": "clear", "k": "picks"}              reset picks / chat_awarded / entries
+# Records are applied in memory first and then appended to the journal, one
+# JSON line per transaction, so a restart is snapshot + replay of the journal.
+
+logger = logging.getLogger("raffle")
+
+COMPACT_EVERY = 500  # records appended before the snapshot is rewritten
+
+
+def default_state():
+    return {
+        "is_open": False,
+        "entries_per_chat": 1,
+        "max_number": 999,
+        "entries": {},
+        "picks": {},
+        "chat_awarded": set(),
+        "winning_number": None,
+        "winner": None,
+        "draw_log": [],  # the last weighted draws, for audits
+    }
+
+
+def apply_record(state, rec):
+    """Apply one journal record to an in-memory raffle state dict."""
+    op = rec["op"]
+    if op == "ent":
+        if rec["v"]:
+            state["entries"][rec["u"]] = rec["v"]
+        else:
+            state["entries"].pop(rec["u"], None)  # a missing user has 0 entries
+    elif op == "pick":
+        state["picks"].setdefault(rec["u"], set()).update(rec["n"])
+    elif op == "award":
+        state["chat_awarded"].add(rec["u"])
+    elif op == "set":
+        state[rec["k"]] = rec["v"]
+    elif op == "draw":
+        state["winner"] = rec["u"]
+        state["winning_number"] = rec["n"]
+    elif op == "wdraw":
+        state["winner"] = rec["u"][0]
+        state["winning_number"] = None
+    elif op == "clear":
+        state[rec["k"]] = set() if rec["k"] == "chat_awarded" else {}
+    else:
+        raise ValueError(f"Unknown raffle journal op: {op}")
+
+
+def snapshot_data(state):
+    """Convert the in-memory state (sets) into plain JSON data."""
+    data = dict(state)
+    data["picks"] = {user: sorted(int(n) for n in nums) for user, nums in state["picks"].items()}
+    data["chat_awarded"] = sorted(state["chat_awarded"])
+    return data
+
+
+def channel_key(channel):
+    """Twitch login -> per-channel file name; anything outside [a-z0-9_] is dropped so it's a safe filename."""
+    return re.sub(r"[^a-z0-9_]", "", (channel or "").lstrip("#").lower()) or "_"
+
+
+def copy_state_files(state_file, dest_file):
+    """Copy a state file and its journal (if any) to dest_file and its journal."""
+    shutil.copyfile(state_file, dest_file)
+    journal = os.path.splitext(state_file)[0] + ".journal"
+    if os.path.exists(journal):
+        shutil.copyfile(journal, os.path.splitext(dest_file)[0] + ".journal")
+
+
+def _parse_tx(line):
+    """One journal line as a transaction dict, or None if it's torn or garbled."""
+    for start in (0, line.rfind(b'{"s":')):
+        if start < 0:
+            break
+        try:
+            tx = json.loads(line[start:])
+        except ValueError:
+            continue
+        if isinstance(tx, dict) and "s" in tx and "ops" in tx:
+            return tx
+    return None
+
+
+def _ends_with_newline(path):
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+class RaffleJournal:
+    """Write-ahead log + compacted snapshot for raffle_state.json."""
+
+    def __init__(self, state_file, journal_file=None, compact_every=COMPACT_EVERY, fsync=False):
+        self.state_file = state_file
+        self.journal_file = journal_file or os.path.splitext(state_file)[0] + ".journal"
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self.seq = 0
+        self.pending = 0  # records written since the last snapshot
+        self.damaged = False  # load() found a line it couldn't read
+        self._fh = None
+
+    def load(self, repair=True):
+        """Return (snapshot, records) where records are the journal entries newer than the snapshot.
+
+        snapshot is None if there is no state file yet. A torn last line (crash in
+        the middle of a write) is ignored, so a transaction is either replayed whole
+        or not at all, and cut off the file so the next append starts on a clean
+        line. A line written onto an older torn fragment is recovered from where
+        its own transaction starts. Either way the journal is marked damaged, so
+        the caller writes a fresh snapshot (needs_snapshot()). With repair=False
+        the files are only read, never cut.
+        """
+        snapshot = None
+        if os.path.exists(self.state_file):
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+            self.seq = int(snapshot.pop("journal_seq", 0))
+        records = []
+        self.damaged = False
+        if os.path.exists(self.journal_file):
+            offset = good_end = 0
+            with open(self.journal_file, "rb") as f:
+                for line in f:
+                    offset += len(line)
+                    tx = _parse_tx(line)
+                    if tx is None:
+                        self.damaged = True
+                        continue
+                    good_end = offset
+                    if tx["s"] <= self.seq:
+                        continue
+                    self.seq = tx["s"]
+                    records.extend(tx["ops"])
+            if good_end < offset and repair:
+                logger.warning(f"Dropping a torn transaction at the end of {self.journal_file}")
+                with open(self.journal_file, "r+b") as f:
+                    f.truncate(good_end)
+        self.pending = len(records)
+        return snapshot, records
+
+    def append(self, records):
+        """Append one transaction (a list of records) as a single compact line."""
+        self.seq += 1
+        line = json.dumps({"s": self.seq, "ops": list(records)}, separators=(",", ":"))
+        if self._fh is None:
+            self._fh = open(self.journal_file, "a", encoding="utf-8")
+            if self._fh.tell() and not _ends_with_newline(self.journal_file):
+                self._fh.write("\n")  # never continue someone else's half-written line
+        self._fh.write(line + "\n")
+        self._fh.flush()
+        if self.fsync:
+            os.fsync(self._fh.fileno())
+        self.pending += len(records)
+
+    def should_compact(self):
+        return self.pending >= self.compact_every
+
+    def needs_snapshot(self):
+        """True after load() if there was no snapshot, the journal had records on top of it or was damaged."""
+        return self.pending > 0 or self.damaged or not os.path.exists(self.state_file)
+
+    def compact(self, state):
+        """Write a full snapshot of state and truncate the journal."""
+        data = snapshot_data(state)
+        data["journal_seq"] = self.seq
+        tmp_path = self.state_file + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, self.state_file)
+        # The snapshot already covers every record, so a crash before this
+        # truncate just means those lines get skipped by seq on the next load.
+        if self._fh is not None:
+            self._fh.close()
+        self._fh = open(self.journal_file, "w", encoding="utf-8")
+        self.pending = 0
+        self.damaged = False
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
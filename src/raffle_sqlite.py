@@ -0,0 +1,192 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+
+from raffle_journal import RaffleJournal
+
+logger = logging.getLogger("raffle")
+
+# Same records as raffle_journal.py, stored as rows instead of JSON lines.
+# Every RaffleState.commit() is one SQLite transaction, so a gift, trade or
+# multi-number pick lands whole or not at all. This swaps the durability layer
+# only: load() still reads the channel's whole state (balances, picks, who got
+# their chat entries) into RaffleState, as the JSON backend does. Users whose
+# balance drops to zero lose their row and their dict slot, so neither grows
+# with everyone who ever chatted.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    channel TEXT NOT NULL, key TEXT NOT NULL, value TEXT,
+    PRIMARY KEY (channel, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS entries (
+    channel TEXT NOT NULL, user TEXT NOT NULL, count INTEGER NOT NULL,
+    PRIMARY KEY (channel, user)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS picks (
+    channel TEXT NOT NULL, number INTEGER NOT NULL, user TEXT NOT NULL,
+    PRIMARY KEY (channel, number)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS picks_user ON picks (channel, user);
+CREATE TABLE IF NOT EXISTS awarded (
+    channel TEXT NOT NULL, user TEXT NOT NULL,
+    PRIMARY KEY (channel, user)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS draws (
+    id INTEGER PRIMARY KEY, channel TEXT NOT NULL, user TEXT NOT NULL,
+    number INTEGER, drawn_at REAL NOT NULL, mode TEXT, seed TEXT
+);
+CREATE INDEX IF NOT EXISTS draws_channel ON draws (channel, drawn_at);
+"""
+
+# state keys kept in their own tables; everything else is a meta row
+_TABLES = {"entries": "entries", "picks": "picks", "chat_awarded": "awarded"}
+
+
+class RaffleDB:
+    """One WAL-mode SQLite file shared by every channel's SqliteRaffleStore."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Autocommit mode: transactions are opened explicitly in transaction()
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL: a commit is an append to the WAL file, no fsync per transaction
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(draws)")}
+        for column in ("mode", "seed"):
+            if column not in columns:  # databases from before weighted draws
+                self.conn.execute(f"ALTER TABLE draws ADD COLUMN {column} TEXT")
+
+    def transaction(self, statements):
+        """Run [(sql, params), ...] as one transaction; rolls back and re-raises on any error."""
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for sql, params in statements:
+                if isinstance(params, list):
+                    conn.executemany(sql, params)
+                else:
+                    conn.execute(sql, params)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def checkpoint(self):
+        self.conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def close(self):
+        self.checkpoint()
+        self.conn.close()
+
+
+class SqliteRaffleStore:
+    """RaffleJournal's interface (load/append/compact) over a channel's rows in a RaffleDB.
+
+    import_file is a JSON state file (plus journal) to take over when the
+    channel has no rows yet: a channel's older data/raffle/<channel>.json,
+    or the legacy raffle_state.json. It is only read, never rewritten.
+    """
+
+    def __init__(self, db, channel, import_file=None):
+        self.db = db
+        self.channel = channel
+        self.import_file = import_file
+        self.importing = False
+        self.pending = 0
+
+    def load(self):
+        """(snapshot, records) like RaffleJournal.load(); records is always empty."""
+        conn = self.db.conn
+        ch = (self.channel,)
+        meta = conn.execute("SELECT key, value FROM meta WHERE channel = ?", ch).fetchall()
+        if not meta:
+            if self.import_file and os.path.exists(self.import_file):
+                logger.info(f"Importing raffle state for {self.channel} from {self.import_file}")
+                self.importing = True
+                return RaffleJournal(self.import_file).load(repair=False)
+            return None, []
+        snapshot = {key: json.loads(value) for key, value in meta}
+        snapshot["entries"] = dict(conn.execute("SELECT user, count FROM entries WHERE channel = ?", ch))
+        picks = {}
+        for number, user in conn.execute("SELECT number, user FROM picks WHERE channel = ?", ch):
+            picks.setdefault(user, []).append(number)
+        snapshot["picks"] = picks
+        snapshot["chat_awarded"] = [user for (user,) in conn.execute("SELECT user FROM awarded WHERE channel = ?", ch)]
+        return snapshot, []
+
+    def needs_snapshot(self):
+        return self.importing or not self.db.conn.execute(
+            "SELECT 1 FROM meta WHERE channel = ? LIMIT 1", (self.channel,)).fetchone()
+
+    def append(self, records):
+        """Write one RaffleState.commit() as one transaction."""
+        self.db.transaction(self._statements(records))
+
+    def _statements(self, records):
+        ch = self.channel
+        for rec in records:
+            op = rec["op"]
+            if op == "ent":
+                if rec["v"]:
+                    yield ("INSERT INTO entries (channel, user, count) VALUES (?, ?, ?) "
+                           "ON CONFLICT (channel, user) DO UPDATE SET count = excluded.count", (ch, rec["u"], rec["v"]))
+                else:
+                    yield "DELETE FROM entries WHERE channel = ? AND user = ?", (ch, rec["u"])
+            elif op == "pick":
+                # The primary key refuses a number someone already holds and rolls the whole pick back
+                yield "INSERT INTO picks (channel, number, user) VALUES (?, ?, ?)", [(ch, n, rec["u"]) for n in rec["n"]]
+            elif op == "award":
+                yield "INSERT OR IGNORE INTO awarded (channel, user) VALUES (?, ?)", (ch, rec["u"])
+            elif op == "set":
+                yield self._meta(rec["k"], rec["v"])
+            elif op == "draw":
+                yield ("INSERT INTO draws (channel, user, number, drawn_at) VALUES (?, ?, ?, ?)",
+                       (ch, rec["u"], rec["n"], time.time()))
+                yield self._meta("winner", rec["u"])
+                yield self._meta("winning_number", rec["n"])
+            elif op == "wdraw":
+                now = time.time()
+                yield ("INSERT INTO draws (channel, user, number, drawn_at, mode, seed) VALUES (?, ?, NULL, ?, ?, ?)",
+                       [(ch, user, now, rec["by"], str(rec["seed"])) for user in rec["u"]])
+                yield self._meta("winner", rec["u"][0])
+                yield self._meta("winning_number", None)
+            elif op == "clear":
+                yield f"DELETE FROM {_TABLES[rec['k']]} WHERE channel = ?", (ch,)
+            else:
+                raise ValueError(f"Unknown raffle journal op: {op}")
+
+    def _meta(self, key, value):
+        return ("INSERT INTO meta (channel, key, value) VALUES (?, ?, ?) "
+                "ON CONFLICT (channel, key) DO UPDATE SET value = excluded.value", (self.channel, key, json.dumps(value)))
+
+    def should_compact(self):
+        return False
+
+    def compact(self, state):
+        """Rows are always current; only an import (or a new channel) needs the full state written."""
+        if self.needs_snapshot():
+            self.write_snapshot(state)
+        else:
+            self.db.checkpoint()
+
+    def write_snapshot(self, state):
+        """Replace all of this channel's rows with state."""
+        ch = self.channel
+        statements = [(f"DELETE FROM {table} WHERE channel = ?", (ch,)) for table in ("meta", *_TABLES.values())]
+        statements += [self._meta(key, value) for key, value in state.items() if key not in _TABLES]
+        statements.append(("INSERT INTO entries (channel, user, count) VALUES (?, ?, ?)",
+                           [(ch, user, count) for user, count in state["entries"].items() if count]))
+        statements.append(("INSERT INTO picks (channel, number, user) VALUES (?, ?, ?)",
+                           [(ch, int(n), user) for user, nums in state["picks"].items() for n in nums]))
+        statements.append(("INSERT INTO awarded (channel, user) VALUES (?, ?)",
+                           [(ch, user) for user in state["chat_awarded"]]))
+        self.db.transaction(statements)
+        self.importing = False
+
+    def close(self):
+        pass  # the RaffleDB is shared; RaffleShards closes it
@@ -0,0 +1,170 @@
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict, namedtuple
+
+logger = logging.getLogger("sfx")
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+SFX_USAGE_FILE = os.path.join(DATA_DIR, "sfx_usage.json")
+USAGE_SAVE_EVERY = 25  # plays between writes of the usage counts
+
+# Raw PCM ready to hand to the audio device
+Clip = namedtuple("Clip", "pcm channels sample_width frame_rate mtime")
+
+
+def decode_mp3(path, mtime):
+    """Decode an audio file to PCM with pydub (needs ffmpeg on PATH)."""
+    from pydub import AudioSegment
+    seg = AudioSegment.from_file(path)
+    return Clip(seg.raw_data, seg.channels, seg.sample_width, seg.frame_rate, mtime)
+
+
+def decoding_available():
+    """pydub + simpleaudio importable and an ffmpeg for pydub to decode mp3s with."""
+    try:
+        import simpleaudio  # noqa: F401
+        from pydub.utils import which
+    except ImportError:
+        return False
+    return bool(which("ffmpeg") or which("avconv"))
+
+
+class DecodedAudioCache:
+    """LRU cache of decoded SFX clips, bounded by total PCM bytes.
+
+    Entries are keyed by the clip path and remember the file's mtime; a lookup
+    that finds a newer file on disk decodes it again, so edited clips are picked
+    up without a restart. invalidate() drops an entry right away (for watchers).
+    """
+
+    def __init__(self, budget_bytes=64 * 1024 * 1024, decoder=decode_mp3, usage_file=SFX_USAGE_FILE):
+        self.budget_bytes = budget_bytes
+        self.decoder = decoder
+        self.usage_file = usage_file
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.usage = self._load_usage()
+        self._plays_since_save = 0
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        mtime = os.stat(path).st_mtime
+        with self._lock:
+            clip = self.entries.get(path)
+            if clip is not None and clip.mtime == mtime:
+                self.entries.move_to_end(path)
+                self.hits += 1
+                return clip
+            self.misses += 1
+        # Decode outside the lock so other voices can keep hitting the cache
+        clip = self.decoder(path, mtime)
+        with self._lock:
+            self._store(path, clip)
+        return clip
+
+    def _store(self, path, clip):
+        old = self.entries.pop(path, None)
+        if old is not None:
+            self.total_bytes -= len(old.pcm)
+        if len(clip.pcm) > self.budget_bytes:
+            return  # never fits, just play it uncached
+        self.entries[path] = clip
+        self.total_bytes += len(clip.pcm)
+        while self.total_bytes > self.budget_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.total_bytes -= len(evicted.pcm)
+
+    def invalidate(self, path):
+        with self._lock:
+            old = self.entries.pop(path, None)
+            if old is not None:
+                self.total_bytes -= len(old.pcm)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def record_play(self, path):
+        with self._lock:
+            self.usage[path] = self.usage.get(path, 0) + 1
+            self._plays_since_save += 1
+            save = self._plays_since_save >= USAGE_SAVE_EVERY
+            if save:
+                self._plays_since_save = 0
+                usage = dict(self.usage)
+        if save:
+            self._save_usage(usage)
+
+    def most_used(self, count):
+        return sorted(self.usage, key=self.usage.get, reverse=True)[:count]
+
+    def prewarm(self, count):
+        """Decode the `count` most played clips (by saved usage) into the cache."""
+        warmed = 0
+        for path in self.most_used(count):
+            if not os.path.isfile(path):
+                continue
+            try:
+                self.get(path)
+                warmed += 1
+            except Exception as e:
+                logger.warning(f"Could not pre-warm SFX {path}: {e}")
+        logger.info(f"Pre-warmed {warmed} SFX clips ({self.total_bytes // 1024} KiB).")
+        return warmed
+
+    def stats(self):
+        return {
+            "clips": len(self.entries),
+            "bytes": self.total_bytes,
+            "budget_bytes": self.budget_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def _load_usage(self):
+        if not self.usage_file or not os.path.exists(self.usage_file):
+            return {}
+        try:
+            with open(self.usage_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable SFX usage file: {e}")
+            return {}
+
+    def _save_usage(self, usage):
+        if not self.usage_file:
+            return
+        try:
+            with open(self.usage_file, "w", encoding="utf-8") as f:
+                json.dump(usage, f)
+        except OSError as e:
+            logger.warning(f"Could not save SFX usage counts: {e}")
+
+
+class CachedPlayback:
+    """SFXPlayer play_func that plays decoded clips from a DecodedAudioCache.
+
+    A clip that can't be decoded is handed to `fallback` (e.g. playsound) instead.
+    """
+
+    def __init__(self, cache, fallback=None):
+        self.cache = cache
+        self.fallback = fallback
+
+    def __call__(self, path):
+        import simpleaudio
+        try:
+            clip = self.cache.get(path)
+        except Exception as e:
+            if self.fallback is None:
+                raise
+            logger.warning(f"Could not decode SFX {path}, playing it directly: {e}")
+            self.fallback(path)
+            return
+        self.cache.record_play(path)
+        simpleaudio.play_buffer(clip.pcm, clip.channels, clip.sample_width, clip.frame_rate).wait_done()
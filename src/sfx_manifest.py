@@ -0,0 +1,193 @@
+"""Persistent manifest of the SFX library so startup doesn't walk every clip.
+
+The manifest (data/sfx_manifest.json) keeps, per directory under sfx/, the
+directory's mtime, its subdirectories and its clips (size, mtime, duration),
+plus the commands they produced. On startup every directory is stat'ed once;
+only directories whose mtime changed are listed again, and only clips that are
+new or changed in those are probed for a duration. Adding, removing or
+renaming a clip changes its directory's mtime; a clip edited in place does not,
+which the decoded-audio cache already handles by checking mtimes at play time.
+
+    python sfx_manifest.py --rebuild     # full rescan, rewrite the manifest
+"""
+import json
+import logging
+import os
+import struct
+import time
+
+logger = logging.getLogger("sfx")
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+SFX_MANIFEST_FILE = os.path.join(DATA_DIR, "sfx_manifest.json")
+MANIFEST_FORMAT = 1
+SFX_EXTENSIONS = (".mp3",)
+
+# MPEG audio layer III tables, indexed by the header's bitrate / sample rate bits
+_BITRATES_V1 = (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320)
+_BITRATES_V2 = (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)
+_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+
+def mp3_duration(path):
+    """Duration of an MP3 in seconds from its headers, or None if it can't be told.
+
+    Reads a few KB: skips an ID3v2 tag, then uses the Xing/Info or VBRI frame
+    count when there is one and the first frame's bitrate otherwise (CBR).
+    """
+    try:
+        size = os.path.getsize(path)
+        with open(path, "rb") as f:
+            head = f.read(10)
+            start = 0
+            if head[:3] == b"ID3" and len(head) == 10:
+                tag_size = (head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9]
+                start = 10 + tag_size + (10 if head[5] & 0x10 else 0)
+            f.seek(start)
+            buf = f.read(8192)
+    except OSError:
+        return None
+
+    for i in range(len(buf) - 4):
+        if buf[i] != 0xFF or buf[i + 1] & 0xE0 != 0xE0:
+            continue
+        version = (buf[i + 1] >> 3) & 0x03   # 3 = MPEG1, 2 = MPEG2, 0 = MPEG2.5
+        layer = (buf[i + 1] >> 1) & 0x03     # 1 = layer III
+        bitrate_index = buf[i + 2] >> 4
+        rate_index = (buf[i + 2] >> 2) & 0x03
+        if version == 1 or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+            continue
+        sample_rate = _SAMPLE_RATES[version][rate_index]
+        samples_per_frame = 1152 if version == 3 else 576
+        mono = (buf[i + 3] >> 6) == 3
+        if version == 3:
+            side_info = 17 if mono else 32
+        else:
+            side_info = 9 if mono else 17
+
+        xing = i + 4 + side_info
+        if buf[xing:xing + 4] in (b"Xing", b"Info") and len(buf) >= xing + 12:
+            flags = struct.unpack(">I", buf[xing + 4:xing + 8])[0]
+            if flags & 0x1:
+                frames = struct.unpack(">I", buf[xing + 8:xing + 12])[0]
+                return round(frames * samples_per_frame / sample_rate, 3)
+        vbri = i + 4 + 32
+        if buf[vbri:vbri + 4] == b"VBRI" and len(buf) >= vbri + 18:
+            frames = struct.unpack(">I", buf[vbri + 14:vbri + 18])[0]
+            return round(frames * samples_per_frame / sample_rate, 3)
+
+        kbps = (_BITRATES_V1 if version == 3 else _BITRATES_V2)[bitrate_index]
+        audio_bytes = size - start - i
+        return round(audio_bytes * 8 / (kbps * 1000), 3)
+    return None
+
+
+def is_clip(name):
+    return name.lower().endswith(SFX_EXTENSIONS)
+
+
+def scan_library(sfx_dir, previous=None, probe=mp3_duration):
+    """Walk sfx_dir and return (dirs, stats).
+
+    dirs maps a directory relative to sfx_dir ("." for the root) to
+    {"mtime_ns", "subdirs", "files": {name: [size, mtime_ns, duration]}}.
+    Directories whose mtime matches `previous` (an earlier `dirs`) are taken
+    from it without listing them; stats counts what was reused and rescanned.
+    """
+    previous = previous or {}
+    dirs = {}
+    stats = {"dirs_reused": 0, "dirs_scanned": 0, "clips_probed": 0}
+    pending = ["."]
+    while pending:
+        rel = pending.pop()
+        path = sfx_dir if rel == "." else os.path.join(sfx_dir, rel)
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            continue
+        old = previous.get(rel)
+        if old is not None and old.get("mtime_ns") == mtime_ns:
+            dirs[rel] = old
+            stats["dirs_reused"] += 1
+        else:
+            dirs[rel] = _scan_dir(path, mtime_ns, old, probe, stats)
+            stats["dirs_scanned"] += 1
+        for sub in dirs[rel]["subdirs"]:
+            pending.append(sub if rel == "." else os.path.join(rel, sub))
+    return dirs, stats
+
+
+def _scan_dir(path, mtime_ns, old, probe, stats):
+    old_files = (old or {}).get("files", {})
+    subdirs = []
+    files = {}
+    try:
+        with os.scandir(path) as it:
+            entries = list(it)
+    except OSError:
+        entries = []
+    for entry in entries:
+        if entry.is_dir():
+            subdirs.append(entry.name)
+        elif entry.is_file() and is_clip(entry.name):
+            st = entry.stat()
+            known = old_files.get(entry.name)
+            if known and known[0] == st.st_size and known[1] == st.st_mtime_ns:
+                files[entry.name] = known
+            else:
+                stats["clips_probed"] += 1
+                files[entry.name] = [st.st_size, st.st_mtime_ns, probe(entry.path) if probe else None]
+    return {"mtime_ns": mtime_ns, "subdirs": sorted(subdirs), "files": dict(sorted(files.items()))}
+
+
+def clip_entries(dirs):
+    """{clip path relative to sfx_dir: (size, mtime_ns, duration)} for a scan_library() result."""
+    return {
+        (name if rel == "." else os.path.join(rel, name)): tuple(info)
+        for rel, entry in dirs.items() for name, info in entry["files"].items()
+    }
+
+
+def load_manifest(sfx_dir, manifest_file=SFX_MANIFEST_FILE):
+    """The `dirs` of a saved manifest for sfx_dir, or None if there is no usable one."""
+    try:
+        with open(manifest_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable SFX manifest {manifest_file}: {e}")
+        return None
+    if data.get("format") != MANIFEST_FORMAT or data.get("sfx_dir") != os.path.abspath(sfx_dir):
+        return None
+    return data.get("dirs")
+
+
+def save_manifest(sfx_dir, dirs, file_commands, folder_commands, manifest_file=SFX_MANIFEST_FILE):
+    data = {
+        "format": MANIFEST_FORMAT,
+        "sfx_dir": os.path.abspath(sfx_dir),
+        "saved": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "file_commands": file_commands,
+        "folder_commands": folder_commands,
+        "dirs": dirs,
+    }
+    os.makedirs(os.path.dirname(manifest_file), exist_ok=True)
+    tmp_path = manifest_file + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, manifest_file)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from sfx_watcher import SFXRegistry
+
+    parser = argparse.ArgumentParser(description="Update or rebuild the SFX manifest.")
+    parser.add_argument("--rebuild", action="store_true", help="ignore the saved manifest and rescan everything")
+    parser.add_argument("--manifest", default=SFX_MANIFEST_FILE)
+    args = parser.parse_args()
+    registry = SFXRegistry()
+    stats = registry.load_or_scan(args.manifest, rebuild=args.rebuild)
+    print(json.dumps(stats))
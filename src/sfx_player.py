@@ -0,0 +1,172 @@
+import logging
+import os
+import queue
+import threading
+
+from metrics import SFX_ACTIVE, SFX_DROPPED, SFX_PLAYED, SFX_QUEUE_DEPTH
+from sfx_cache import CachedPlayback, DecodedAudioCache, decoding_available
+
+logger = logging.getLogger("sfx")
+
+# queue:   one voice, clips play back to back
+# overlap: up to `voices` clips play at the same time, the rest wait in the queue
+# drop:    up to `voices` clips play at the same time, anything else is dropped
+POLICIES = ("queue", "overlap", "drop")
+
+
+def _playsound(path):
+    from playsound import playsound
+    playsound(path)
+
+
+class SFXPlayer:
+    """Plays SFX clips on worker threads so the bot's event loop never blocks on audio."""
+
+    def __init__(self, policy="queue", voices=1, max_queue=8, play_func=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown SFX policy {policy!r}, expected one of {', '.join(POLICIES)}")
+        self.policy = policy
+        self.voices = 1 if policy == "queue" else max(1, int(voices))
+        self.play_func = play_func or _playsound
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.cache = None  # DecodedAudioCache behind play_func, if any
+        self._lock = threading.Lock()
+        self._threads = []
+        self._stopping = False
+        self.pending = 0  # queued + playing
+        self.active = 0
+        self.played = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def start(self):
+        if self._threads:
+            return
+        with self._lock:
+            self._stopping = False
+            self.queue = queue.Queue(maxsize=self.queue.maxsize)  # no sentinel left over from stop()
+        for i in range(self.voices):
+            t = threading.Thread(target=self._worker, name=f"sfx-voice-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self):
+        """Drop the clips still waiting and stop the workers; never blocks on a full queue."""
+        with self._lock:
+            self._stopping = True
+            while True:
+                try:
+                    path = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if path is not None:
+                    self.pending -= 1
+                    self.dropped += 1
+                    SFX_DROPPED.inc()
+            if self._threads:
+                # One sentinel; each worker passes it on to the next before exiting
+                self.queue.put_nowait(None)
+        for t in self._threads:
+            t.join(timeout=1)
+        self._threads = []
+
+    def play(self, path):
+        """Hand a clip to the workers. Returns False if it was dropped. Never blocks."""
+        if not self._threads:
+            self.start()
+        with self._lock:
+            if self._stopping:
+                return False
+            if self.policy == "drop" and self.pending >= self.voices:
+                self.dropped += 1
+                SFX_DROPPED.inc()
+                logger.info(f"SFX dropped (busy): {path}")
+                return False
+            try:
+                self.queue.put_nowait(path)
+            except queue.Full:
+                self.dropped += 1
+                SFX_DROPPED.inc()
+                logger.info(f"SFX dropped (queue full): {path}")
+                return False
+            self.pending += 1
+        return True
+
+    def queue_depth(self):
+        return self.queue.qsize()
+
+    def stats(self):
+        stats = {
+            "policy": self.policy,
+            "voices": self.voices,
+            "queue_depth": self.queue.qsize(),
+            "active": self.active,
+            "played": self.played,
+            "dropped": self.dropped,
+            "errors": self.errors,
+        }
+        if self.cache is not None:
+            stats["cache"] = self.cache.stats()
+        return stats
+
+    def _worker(self):
+        while True:
+            path = self.queue.get()
+            if path is None:
+                self.queue.put_nowait(None)  # wake the next worker; play() adds nothing once stopping
+                break
+            with self._lock:
+                self.active += 1
+            ok = False
+            try:
+                self.play_func(path)
+                ok = True
+            except Exception as e:
+                logger.error(f"Error playing SFX sound {path}: {e}")
+            finally:
+                with self._lock:
+                    self.active -= 1
+                    self.pending -= 1
+                    if ok:
+                        self.played += 1
+                        SFX_PLAYED.inc()
+                    else:
+                        self.errors += 1
+
+
+def _mute(path):
+    pass
+
+
+def build_sfx_player():
+    """Builds and starts an SFXPlayer configured from SFX_POLICY / SFX_VOICES / SFX_QUEUE_SIZE.
+
+    If pydub + simpleaudio are installed and ffmpeg is on PATH, clips are decoded once into a
+    DecodedAudioCache (SFX_CACHE_MB budget, 0 disables it) and the
+    SFX_CACHE_PREWARM most played clips are decoded in the background at startup.
+    SFX_MUTE=1 keeps the queueing but plays nothing (load tests, headless boxes).
+    """
+    play_func = None
+    cache = None
+    cache_mb = int(os.getenv("SFX_CACHE_MB", "64"))
+    if os.getenv("SFX_MUTE", "").lower() in ("1", "true", "yes"):
+        play_func = _mute
+    elif cache_mb > 0 and decoding_available():
+        cache = DecodedAudioCache(budget_bytes=cache_mb * 1024 * 1024)
+        play_func = CachedPlayback(cache, fallback=_playsound)
+        prewarm = int(os.getenv("SFX_CACHE_PREWARM", "20"))
+        if prewarm > 0:
+            threading.Thread(target=cache.prewarm, args=(prewarm,), name="sfx-prewarm", daemon=True).start()
+    elif cache_mb > 0:
+        logger.info("pydub/simpleaudio/ffmpeg not available, SFX clips will not be cached.")
+    player = SFXPlayer(
+        policy=os.getenv("SFX_POLICY", "queue"),
+        voices=int(os.getenv("SFX_VOICES", "3")),
+        max_queue=int(os.getenv("SFX_QUEUE_SIZE", "8")),
+        play_func=play_func,
+    )
+    player.cache = cache
+    player.start()
+    SFX_QUEUE_DEPTH.set_function(player.queue_depth)
+    SFX_ACTIVE.set_function(lambda: player.active)
+    return player
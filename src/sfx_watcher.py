@@ -2,156 +2,402 @@ import os
 import threading
 import time
 import logging
+from collections import defaultdict
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 
+from sfx_manifest import SFX_MANIFEST_FILE, clip_entries, is_clip, load_manifest, mp3_duration, save_manifest, scan_library
+
 # Base directory is the project root (one level above this file)
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 
 # SFX directory (always ../sfx relative to this script)
 SFX_DIR = os.path.join(BASE_DIR, "sfx")
 
-# Logs directory and log file
-LOGS_DIR = os.path.join(BASE_DIR, "logs")
-os.makedirs(LOGS_DIR, exist_ok=True)
-SFX_LOG_PATH = os.path.join(LOGS_DIR, "sfx_creation.log")
+# Seconds of filesystem quiet before a burst of changes is applied as one batch
+WATCH_DEBOUNCE = float(os.getenv("SFX_WATCH_DEBOUNCE", "0.5"))
 
+# SFX changes also go to logs/sfx_creation.log (see log_setup.SUBSYSTEM_FILES)
 sfx_logger = logging.getLogger("sfx_creation")
 sfx_logger.setLevel(logging.INFO)
-file_handler = logging.FileHandler(SFX_LOG_PATH)
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-file_handler.setFormatter(formatter)
-if not any(isinstance(h, logging.FileHandler) and h.baseFilename == file_handler.baseFilename for h in sfx_logger.handlers):
-    sfx_logger.addHandler(file_handler)
 
-class SFXRegistry:
+
+def clip_command(path):
+    return f"!{os.path.splitext(os.path.basename(path))[0]}"
+
+
+def folder_command(folder):
+    return f"!{os.path.basename(folder)}"
+
+
+def _rank(path):
+    # Shallowest first, then case-insensitive path order
+    return (path.count(os.sep), path.casefold(), path)
+
+
+class CommandIndex:
+    """Which clip or folder answers each command, kept per clip so a change
+    only re-resolves the commands it touches.
+
+    Collisions are settled the same way whatever order the disk lists things in:
+      1. a clip name found in several folders: the shallowest clip wins, then
+         the first path in case-insensitive order;
+      2. a folder name found in several places: same rule on the folder path;
+      3. a clip and a folder with the same name: the clip wins.
+    The losers are listed in `conflicts` and take over if the winner goes away.
+    """
+
     def __init__(self):
         self.file_commands = {}    # '!zap': 'fe/zap.mp3'
         self.folder_commands = {}  # '!fe': ['fe/zap.mp3', ...]
-        self.registered_commands = set()
+        self.conflicts = {}        # '!zap': ['other/zap.mp3'] paths that lost to the winner
+        self._clip_paths = defaultdict(set)    # command -> clips named like it
+        self._folder_paths = defaultdict(set)  # command -> folders named like it
+        self._folder_clips = {}                # folder -> clips directly in it
+
+    @classmethod
+    def from_clips(cls, paths):
+        index = cls()
+        touched = set()
+        for path in paths:
+            touched |= index.add(path)
+        for cmd in touched:
+            index.resolve(cmd)
+        return index
+
+    def add(self, path):
+        """Index a clip; returns the commands to resolve()."""
+        cmd = clip_command(path)
+        self._clip_paths[cmd].add(path)
+        touched = {cmd}
+        folder = os.path.dirname(path)
+        if folder:
+            clips = self._folder_clips.get(folder)
+            if clips is None:
+                clips = self._folder_clips[folder] = set()
+                self._folder_paths[folder_command(folder)].add(folder)
+            clips.add(path)
+            touched.add(folder_command(folder))
+        return touched
+
+    def remove(self, path):
+        cmd = clip_command(path)
+        paths = self._clip_paths.get(cmd)
+        if paths is not None:
+            paths.discard(path)
+            if not paths:
+                del self._clip_paths[cmd]
+        touched = {cmd}
+        folder = os.path.dirname(path)
+        clips = self._folder_clips.get(folder) if folder else None
+        if clips is not None:
+            clips.discard(path)
+            fcmd = folder_command(folder)
+            touched.add(fcmd)
+            if not clips:
+                del self._folder_clips[folder]
+                self._folder_paths[fcmd].discard(folder)
+                if not self._folder_paths[fcmd]:
+                    del self._folder_paths[fcmd]
+        return touched
+
+    def resolve(self, cmd):
+        clips = sorted(self._clip_paths.get(cmd, ()), key=_rank)
+        folders = sorted(self._folder_paths.get(cmd, ()), key=_rank)
+        if clips:
+            self.file_commands[cmd] = clips[0]
+            self.folder_commands.pop(cmd, None)
+            losers = clips[1:] + folders
+        elif folders:
+            self.file_commands.pop(cmd, None)
+            self.folder_commands[cmd] = sorted(self._folder_clips[folders[0]], key=_rank)
+            losers = folders[1:]
+        else:
+            self.file_commands.pop(cmd, None)
+            self.folder_commands.pop(cmd, None)
+            losers = []
+        if losers:
+            self.conflicts[cmd] = losers
+        else:
+            self.conflicts.pop(cmd, None)
+
+    def clips_under(self, folder):
+        """Every indexed clip inside folder or its subfolders."""
+        prefix = folder + os.sep
+        return [
+            path
+            for name, clips in list(self._folder_clips.items())
+            if name == folder or name.startswith(prefix)
+            for path in list(clips)
+        ]
+
+
+class SFXRegistry:
+    def __init__(self):
+        self.index = CommandIndex()
+        self.file_commands = self.index.file_commands      # '!zap': 'fe/zap.mp3'
+        self.folder_commands = self.index.folder_commands  # '!fe': ['fe/zap.mp3', ...]
+        self.clips = {}            # 'fe/zap.mp3': (size, mtime_ns, duration seconds or None)
         self.sfx_dir = SFX_DIR     # Store absolute SFX dir for use by cogs
+        self.version = 0           # Bumped on every change so consumers can rebuild lookups
+
+    @property
+    def registered_commands(self):
+        return set(self.file_commands) | set(self.folder_commands)
+
+    @property
+    def conflicts(self):
+        return self.index.conflicts
 
     def scan_and_register(self, notify_callback=None):
-        file_cmd_count = 0
-        folder_cmd_count = 0
-        for root, dirs, files in os.walk(self.sfx_dir):
-            rel_folder = os.path.relpath(root, self.sfx_dir)
-            for f in files:
-                if f.lower().endswith(".mp3"):
-                    cmd = f"!{os.path.splitext(f)[0]}"
-                    path = f if rel_folder == "." else os.path.join(rel_folder, f)
-                    if cmd not in self.registered_commands:
-                        self.file_commands[cmd] = path
-                        self.registered_commands.add(cmd)
-                        file_cmd_count += 1
-            if rel_folder != ".":
-                folder_cmd = f"!{os.path.basename(rel_folder)}"
-                mp3s = [f for f in files if f.lower().endswith(".mp3")]
-                if mp3s and folder_cmd not in self.registered_commands:
-                    self.folder_commands[folder_cmd] = [os.path.join(rel_folder, f) for f in mp3s]
-                    self.registered_commands.add(folder_cmd)
-                    folder_cmd_count += 1
+        """Full walk of the library, ignoring and not touching the manifest."""
+        dirs, stats = scan_library(self.sfx_dir)
+        self.apply(dirs, CommandIndex.from_clips(clip_entries(dirs)), notify_callback)
+
+    def scan(self, manifest_file=SFX_MANIFEST_FILE, rebuild=False):
+        """Rescan what changed since the manifest (everything if rebuild) and save it.
+
+        Safe to run off the event loop: returns (dirs, index, stats) for
+        apply() and leaves the registry itself alone.
+        """
+        previous = None if rebuild else load_manifest(self.sfx_dir, manifest_file)
+        started = time.perf_counter()
+        dirs, stats = scan_library(self.sfx_dir, previous)
+        index = CommandIndex.from_clips(clip_entries(dirs))
+        stats["manifest"] = "rebuilt" if rebuild else ("missing" if previous is None else "loaded")
+        stats["seconds"] = round(time.perf_counter() - started, 3)
+        if previous is None or stats["dirs_scanned"] or len(dirs) != len(previous):
+            try:
+                save_manifest(self.sfx_dir, dirs, index.file_commands, index.folder_commands, manifest_file=manifest_file)
+            except OSError as e:
+                sfx_logger.warning(f"Could not save SFX manifest {manifest_file}: {e}")
+        sfx_logger.info(
+            f"SFX manifest {stats['manifest']}: {stats['dirs_reused']} directories reused, "
+            f"{stats['dirs_scanned']} rescanned, {stats['clips_probed']} clips probed in {stats['seconds']}s."
+        )
+        return dirs, index, stats
+
+    def load_or_scan(self, manifest_file=SFX_MANIFEST_FILE, rebuild=False, notify_callback=None):
+        dirs, index, stats = self.scan(manifest_file, rebuild)
+        self.apply(dirs, index, notify_callback)
+        return stats
+
+    def apply(self, dirs, index, notify_callback=None):
+        """Swap in a full scan. Call on the event loop thread once the bot runs."""
+        self.clips = clip_entries(dirs)
+        self.index = index
+        self.file_commands = index.file_commands
+        self.folder_commands = index.folder_commands
+        self.version += 1
+        file_cmd_count = len(self.file_commands)
+        folder_cmd_count = len(self.folder_commands)
         total_cmds = file_cmd_count + folder_cmd_count
         print(f"SFX: {file_cmd_count} file commands and {folder_cmd_count} folder commands registered ({total_cmds} total).")
         sfx_logger.info(f"{file_cmd_count} SFX file commands and {folder_cmd_count} folder commands registered ({total_cmds} total).")
+        for cmd, losers in sorted(self.conflicts.items()):
+            sfx_logger.info(f"{cmd} plays {self.file_commands.get(cmd) or cmd + ' (folder)'}, shadowing {', '.join(losers)}")
         if notify_callback:
             notify_callback(f"{file_cmd_count} file and {folder_cmd_count} folder SFX commands registered.")
 
-    def register_file_command(self, cmd, path, notify_callback=None):
-        if cmd not in self.registered_commands:
-            self.file_commands[cmd] = path
-            self.registered_commands.add(cmd)
-            msg = f"Registering command {cmd} for {path}"
-            sfx_logger.info(msg)
-            if notify_callback:
-                notify_callback(f"SFX command {cmd} added for {path}")
-
-    def unregister_file_command(self, cmd, notify_callback=None):
-        if cmd in self.registered_commands:
-            path = self.file_commands.get(cmd, "")
-            self.file_commands.pop(cmd, None)
-            self.registered_commands.remove(cmd)
-            msg = f"Unregistered command {cmd}"
-            sfx_logger.info(msg)
-            if notify_callback:
-                notify_callback(f"SFX command {cmd} removed (was for {path})")
-
-    def register_folder_command(self, cmd, files, notify_callback=None):
-        if cmd not in self.registered_commands:
-            self.folder_commands[cmd] = files
-            self.registered_commands.add(cmd)
-            msg = f"Registering folder command {cmd}"
-            sfx_logger.info(msg)
-            if notify_callback:
-                notify_callback(f"SFX folder command {cmd} added")
-
-    def unregister_folder_command(self, cmd, notify_callback=None):
-        if cmd in self.registered_commands:
-            self.folder_commands.pop(cmd, None)
-            self.registered_commands.remove(cmd)
-            msg = f"Unregistered folder command {cmd}"
-            sfx_logger.info(msg)
-            if notify_callback:
-                notify_callback(f"SFX folder command {cmd} removed")
+    def update(self, added, removed, notify_callback=None):
+        """Apply one batch of clip changes and return what it did.
+
+        added maps clip paths (relative to sfx_dir) to (size, mtime_ns, duration),
+        removed lists clip paths. Only the commands named after those clips and
+        their folders are resolved again. Call it on the event loop thread:
+        lookups there see the registry before or after the batch, never half of it.
+        """
+        touched = set()
+        for path in removed:
+            if self.clips.pop(path, None) is not None:
+                touched |= self.index.remove(path)
+        for path, info in added.items():
+            if path not in self.clips:
+                touched |= self.index.add(path)
+            self.clips[path] = tuple(info)
+        before = {cmd: cmd in self.file_commands or cmd in self.folder_commands for cmd in touched}
+        for cmd in touched:
+            self.index.resolve(cmd)
+        now = {cmd: cmd in self.file_commands or cmd in self.folder_commands for cmd in touched}
+        changes = {
+            "added": sorted(cmd for cmd in touched if now[cmd] and not before[cmd]),
+            "removed": sorted(cmd for cmd in touched if before[cmd] and not now[cmd]),
+            "paths": sorted(set(removed) | set(added)),
+        }
+        if touched:
+            self.version += 1
+        for cmd in changes["added"]:
+            sfx_logger.info(f"Registering command {cmd} for {self.file_commands.get(cmd) or 'folder'}")
+        for cmd in changes["removed"]:
+            sfx_logger.info(f"Unregistered command {cmd}")
+        for cmd in sorted(touched):
+            if cmd in self.conflicts:
+                sfx_logger.info(f"{cmd} plays {self.file_commands.get(cmd) or cmd + ' (folder)'}, shadowing {', '.join(self.conflicts[cmd])}")
+        if notify_callback and (changes["added"] or changes["removed"]):
+            parts = []
+            if changes["added"]:
+                parts.append(f"added {', '.join(changes['added'])}")
+            if changes["removed"]:
+                parts.append(f"removed {', '.join(changes['removed'])}")
+            notify_callback(f"SFX commands {'; '.join(parts)}")
+        return changes
+
+    def clip_info(self, rel_path, full_path):
+        """(size, mtime_ns, duration) for a clip on disk; reuses the known duration if unchanged."""
+        st = os.stat(full_path)
+        known = self.clips.get(rel_path)
+        if known and known[0] == st.st_size and known[1] == st.st_mtime_ns:
+            return known
+        return (st.st_size, st.st_mtime_ns, mp3_duration(full_path))
 
 class SFXEventHandler(FileSystemEventHandler):
-    def __init__(self, registry, notify_callback=None):
+    def __init__(self, watcher):
         super().__init__()
-        self.registry = registry
-        self.notify_callback = notify_callback
+        self.watcher = watcher
 
     def on_created(self, event):
-        if event.is_directory or not event.src_path.lower().endswith(".mp3"):
-            return
-        rel_path = os.path.relpath(event.src_path, SFX_DIR)
-        cmd = f"!{os.path.splitext(os.path.basename(event.src_path))[0]}"
-        self.registry.register_file_command(cmd, rel_path, self.notify_callback)
+        self.watcher.touch(event.src_path)
 
     def on_deleted(self, event):
-        if event.is_directory or not event.src_path.lower().endswith(".mp3"):
-            return
-        cmd = f"!{os.path.splitext(os.path.basename(event.src_path))[0]}"
-        self.registry.unregister_file_command(cmd, self.notify_callback)
+        self.watcher.touch(event.src_path)
+
+    def on_modified(self, event):
+        # A directory's own mtime changes with every entry; the entries get their own events
+        if not event.is_directory:
+            self.watcher.touch(event.src_path)
 
     def on_moved(self, event):
-        if event.is_directory or not event.dest_path.lower().endswith(".mp3"):
-            return
-        old_cmd = f"!{os.path.splitext(os.path.basename(event.src_path))[0]}"
-        new_cmd = f"!{os.path.splitext(os.path.basename(event.dest_path))[0]}"
-        self.registry.unregister_file_command(old_cmd, self.notify_callback)
-        rel_path = os.path.relpath(event.dest_path, SFX_DIR)
-        self.registry.register_file_command(new_cmd, rel_path, self.notify_callback)
+        self.watcher.touch(event.src_path, event.dest_path)
 
 class SFXWatcher:
-    def __init__(self, notify_callback=None):
-        self.registry = SFXRegistry()
+    """Keeps an SFXRegistry in step with sfx/ while the bot runs.
+
+    Filesystem events only record which paths changed. After `debounce`
+    seconds without events the paths are stat'ed on the timer thread and the
+    batch is handed to the event loop, where SFXRegistry.update() applies it in
+    one go. `listeners` are called there with the absolute paths of the clips
+    that changed (e.g. to drop them from the decoded-audio cache).
+    """
+
+    def __init__(self, registry=None, notify_callback=None, debounce=WATCH_DEBOUNCE):
+        self.registry = registry or SFXRegistry()
         self.notify_callback = notify_callback
+        self.debounce = debounce
+        self.listeners = []
         self.observer = None
+        self.loop = None
+        self.batches = 0
+        self._pending = set()
+        self._timer = None
+        self._lock = threading.Lock()
 
-    def start(self):
-        self.registry.scan_and_register(notify_callback=None)
-        event_handler = SFXEventHandler(self.registry, self.notify_callback)
+    def start(self, loop=None):
+        """Start watching. With a loop, batches are applied on that loop's thread."""
+        if self.registry.version == 0:
+            self.registry.load_or_scan(notify_callback=None)
+        self.loop = loop
         self.observer = Observer()
-        self.observer.schedule(event_handler, SFX_DIR, recursive=True)
+        self.observer.schedule(SFXEventHandler(self), self.registry.sfx_dir, recursive=True)
         self.observer.start()
 
     def stop(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._pending.clear()
         if self.observer:
             self.observer.stop()
             self.observer.join()
+            self.observer = None
+
+    def touch(self, *paths):
+        with self._lock:
+            self._pending.update(paths)
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.debounce, self._flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush(self):
+        with self._lock:
+            paths, self._pending = self._pending, set()
+            self._timer = None
+        added, removed = self.collect(paths)
+        if not added and not removed:
+            return
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._apply, added, removed)
+        else:
+            self._apply(added, removed)
+
+    def collect(self, paths):
+        """Look at what the events pointed to: (added {rel: info}, removed {rel})."""
+        registry = self.registry
+        sfx_dir = registry.sfx_dir
+        added = {}
+        removed = set()
+        for path in paths:
+            rel = os.path.relpath(path, sfx_dir)
+            if rel == os.curdir or rel.startswith(os.pardir):
+                continue
+            if os.path.isdir(path):
+                # A folder appeared or was moved in: take everything under it
+                found = {}
+                for root, _, files in os.walk(path):
+                    for name in files:
+                        if is_clip(name):
+                            full = os.path.join(root, name)
+                            try:
+                                found[os.path.relpath(full, sfx_dir)] = registry.clip_info(os.path.relpath(full, sfx_dir), full)
+                            except OSError:
+                                pass
+                removed.update(p for p in registry.index.clips_under(rel) if p not in found)
+                added.update(found)
+            elif os.path.isfile(path):
+                if not is_clip(path):
+                    continue
+                try:
+                    info = registry.clip_info(rel, path)
+                except OSError:
+                    removed.add(rel)
+                    continue
+                if registry.clips.get(rel) != info:
+                    added[rel] = info
+            else:
+                # Gone: a clip or a whole folder
+                if rel in registry.clips:
+                    removed.add(rel)
+                removed.update(registry.index.clips_under(rel))
+        removed.difference_update(added)
+        return added, removed
+
+    def _apply(self, added, removed):
+        self.batches += 1
+        changes = self.registry.update(added, removed, self.notify_callback)
+        paths = [os.path.join(self.registry.sfx_dir, p) for p in changes["paths"]]
+        for listener in self.listeners:
+            try:
+                listener(paths)
+            except Exception as e:
+                sfx_logger.error(f"SFX change listener failed: {e}")
 
 def build_sfx_registry():
-    """Builds and returns a ready-to-use SFXRegistry. For use in main.py."""
+    """Builds and returns a ready-to-use SFXRegistry. For use in main.py.
+
+    Loads data/sfx_manifest.json and only rescans directories that changed.
+    """
     registry = SFXRegistry()
-    registry.scan_and_register(notify_callback=None)
+    registry.load_or_scan(notify_callback=None)
     return registry
 
 # For standalone testing
 if __name__ == "__main__":
-    watcher = SFXWatcher()
+    watcher = SFXWatcher(notify_callback=print)
     watcher.start()
     try:
         while True:
             time.sleep(1)
     except KeyboardInterrupt:
-        watcher.stop()
\ No newline at end of file
+        watcher.stop()
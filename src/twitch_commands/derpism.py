@@ -1,9 +1,12 @@
 import os
-import random
 import logging
 from twitchio.ext import commands
 
-DERPISM_FILE = "data/derpisms.txt"
+from chat_scheduler import say
+from quote_store import DATA_DIR, get_quote_store
+
+# Same file as the !os anti-shoutout (shoutout.py), so both share one QuoteStore
+DERPISM_FILE = os.path.join(DATA_DIR, "derpisms.txt")
 
 class DerpismCog(commands.Cog):
 
@@ -15,12 +18,13 @@ class DerpismCog(commands.Cog):
         if not os.path.isfile(self.file_path):
             with open(self.file_path, "w", encoding="utf-8") as f:
                 f.write("")
+        self.store = get_quote_store(self.file_path)
         self.logger = logging.getLogger("derpism")
 
     @commands.command(name="derpism")
     async def derpism(self, ctx: commands.Context):
-        print(f"[DEBUG] DerpismCog.derpism handler triggered by: {ctx.author.name} ({ctx.message.content})")
         """Show a random derpism, a specific one, or add a new one (mods only)."""
+        self.logger.debug("derpism triggered by %s: %s", ctx.author.name, ctx.message.content)
         parts = ctx.message.content.split(maxsplit=2)
 
         if len(parts) == 1:
@@ -29,14 +33,14 @@ class DerpismCog(commands.Cog):
 
         elif parts[1].lower() == "add":
             if not (hasattr(ctx.author, "is_mod") and ctx.author.is_mod):
-                await ctx.send("❌ Only mods can add derpisms.")
+                await say(ctx, "❌ Only mods can add derpisms.")
                 return
             if len(parts) < 3:
-                await ctx.send("⚠️ Usage: !derpism add <text>")
+                await say(ctx, "⚠️ Usage: !derpism add <text>")
                 return
             new_derpism = parts[2].strip()
             if not new_derpism:
-                await ctx.send("⚠️ Cannot add empty derpism.")
+                await say(ctx, "⚠️ Cannot add empty derpism.")
                 return
             await self.add_derpism(ctx, new_derpism)
 
@@ -44,38 +48,32 @@ class DerpismCog(commands.Cog):
             index = int(parts[1]) - 1  # 1-based input
             await self.send_derpism_by_index(ctx, index)
         else:
-            await ctx.send("❌ Invalid usage. Try !derpism, !derpism 12, or !derpism add <text>")
+            await say(ctx, "❌ Invalid usage. Try !derpism, !derpism 12, or !derpism add <text>")
 
     async def send_random_derpism(self, ctx):
-        derpisms = self.load_derpisms()
-        if not derpisms:
-            await ctx.send("🫠 No derpisms found.")
+        quote = self.store.random()
+        if quote is None:
+            await say(ctx, "🫠 No derpisms found.")
             return
-        quote = random.choice(derpisms)
-        await ctx.send(f"🌀 Derpism: \"{quote}\"")
+        await say(ctx, f"🌀 Derpism: \"{quote}\"")
 
     async def send_derpism_by_index(self, ctx, index):
-        derpisms = self.load_derpisms()
-        if 0 <= index < len(derpisms):
-            await ctx.send(f"📘 Derpism #{index + 1}: \"{derpisms[index]}\"")
+        derpism = self.store.get(index)
+        if derpism is not None:
+            await say(ctx, f"📘 Derpism #{index + 1}: \"{derpism}\"")
         else:
-            await ctx.send(f"❌ No derpism at #{index + 1}.")
+            await say(ctx, f"❌ No derpism at #{index + 1}.")
 
     async def add_derpism(self, ctx, text):
-        derpisms = self.load_derpisms()
-        if text in derpisms:
-            await ctx.send("⚠️ That derpism already exists.")
+        number = await self.store.add(text)
+        if number is None:
+            await say(ctx, "⚠️ That derpism already exists.")
             return
-        with open(self.file_path, "a", encoding="utf-8") as f:
-            f.write(f"{text}\n")
-        await ctx.send(f"✅ Added derpism #{len(derpisms) + 1}: \"{text}\"")
+        await say(ctx, f"✅ Added derpism #{number}: \"{text}\"")
         self.logger.info(f"Derpism added by {ctx.author.name}: {text}")
 
     def load_derpisms(self):
-        if not os.path.isfile(self.file_path):
-            return []
-        with open(self.file_path, "r", encoding="utf-8") as f:
-            return [line.strip() for line in f if line.strip()]
+        return self.store.all()
 
 def prepare(bot):
     print("prepare() called for DerpismCog; id(bot):", id(bot))  # DEBUG
@@ -1,55 +1,108 @@
+import logging
+import time
+
 from twitchio.ext import commands
 
+from command_router import DispatchTable
+from loop_watchdog import clear_handler, note_handler
+from metrics import CHAT_MESSAGES, COMMAND_ERRORS, COMMANDS, HANDLER_LATENCY
+
+logger = logging.getLogger("router")
+
 class MessageRouter(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.table = DispatchTable()
+        self.handler_labels = {}  # command -> metric labels, only for commands that exist
+        # Cogs that answer "!" commands outside of twitchio declare them through
+        # dispatch_entries(); lower dispatch_priority wins on a shared token.
+        dispatch_cogs = [cog for cog in bot.cogs.values() if hasattr(cog, "dispatch_entries")]
+        dispatch_cogs.sort(key=lambda cog: getattr(cog, "dispatch_priority", 50))
+        for cog in dispatch_cogs:
+            self.table.add_source(cog.name, cog.dispatch_entries, getattr(cog, "dispatch_version", None))
+        # Everything else goes to the regular twitchio commands
+        self.table.add_source("commands", self.command_entries, lambda: len(self.bot.commands))
 
-    @commands.Cog.event()
-    async def event_message(self, message):
-        print(f"[MessageRouter] event_message received: {message.content} (echo={message.echo})")
-        if message.echo:
-            return
+    def command_entries(self):
+        names = list(self.bot.commands) + list(getattr(self.bot, "_command_aliases", {}))
+        return {f"!{name}": self.run_command for name in names}, []
 
-        handled = False
-
-        overlay_cog = self.bot.get_cog("OverlayCog")
-        if overlay_cog:
-            if await overlay_cog.try_handle_overlay(message):
-                print(f"[MessageRouter] try_handle_overlay({message.content}) -> True")
-                handled = True
+    def _labels(self, command, handler):
+        labels = self.handler_labels.get(command)
+        if labels is None:
+            if handler == self.run_command:
+                # twitchio command: label it with its cog and command name
+                cmd = self.bot.get_command(command[1:])
+                cog = getattr(getattr(cmd, "cog", None), "name", None) or "Bot"
+                labels = {"cog": cog, "handler": cmd.name if cmd else command[1:]}
             else:
-                print(f"[MessageRouter] try_handle_overlay({message.content}) -> False")
+                owner = getattr(handler, "__self__", None)
+                labels = {"cog": type(owner).__name__ if owner is not None else "-",
+                          "handler": getattr(handler, "__name__", str(handler))}
+            self.handler_labels[command] = labels
+        return labels
 
-        sfx_cog = self.bot.get_cog("SFXCog")
-        if sfx_cog and not handled:
-            if await sfx_cog.try_handle_sfx(message):
-                print(f"[MessageRouter] try_handle_sfx({message.content}) -> True")
-                handled = True
-            else:
-                print(f"[MessageRouter] try_handle_sfx({message.content}) -> False")
+    async def run_command(self, message, command, args):
+        await self.bot.handle_commands(message)
+        return True
 
-        raffle_cog = self.bot.get_cog("RaffleCog")
-        if raffle_cog and not handled:
-            if await raffle_cog.try_handle_raffle(message):
-                print(f"[MessageRouter] try_handle_raffle({message.content}) -> True")
-                handled = True
-            else:
-                print(f"[MessageRouter] try_handle_raffle({message.content}) -> False")
+    @commands.Cog.event()
+    async def event_message(self, message):
+        if message.echo:
+            return
+        CHAT_MESSAGES.inc(channel=message.channel.name if message.channel else "-")
+        content = message.content
+        # Plain chat never reaches the command table (RaffleCog has its own listener for it)
+        if not content or content[0] != "!":
+            return
+        if message.author and message.author.name.lower() == self.bot.nick.lower():
+            return
 
-        if not handled:
-            print(f"[MessageRouter] Passing to handle_commands: {message.content}")
-            await self.bot.handle_commands(message)
+        parts = content.split(maxsplit=1)
+        command = parts[0]
+        args = parts[1] if len(parts) > 1 else ""
+        if self.table.refresh():
+            self.handler_labels.clear()  # a command may have moved to another handler
+        handler = self.table.lookup(command)
+        if handler is None:
+            return
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%s -> %s", command, getattr(handler, "__qualname__", handler),
+                         extra={"user": message.author.name if message.author else None})
+        labels = self._labels(command, handler)
+        COMMANDS.inc(**labels)
+        # Lets the loop watchdog name the handler and message if this blocks the loop
+        token = note_handler(f"{labels['cog']}.{labels['handler']}", message)
+        start = time.perf_counter()
+        try:
+            handled = await handler(message, command, args)
+            if handled is False and handler != self.run_command:
+                # e.g. a clip removed after the table was built: let twitchio have it,
+                # as its default event_message would have
+                await self.bot.handle_commands(message)
+        except Exception:
+            COMMAND_ERRORS.inc(**labels)
+            raise
+        finally:
+            HANDLER_LATENCY.observe(time.perf_counter() - start, **labels)
+            clear_handler(token)
 
     # ADD THIS METHOD:
     @commands.Cog.event()
     async def event_command_error(self, ctx, error):
         from twitchio.ext.commands.errors import CommandNotFound
         if isinstance(error, CommandNotFound):
-            print(f"[MessageRouter] Suppressed CommandNotFound: {ctx.message.content}")
+            logger.debug("Suppressed CommandNotFound: %s", ctx.message.content)
             return  # Suppress this error!
         # (You may want to handle/log other errors, or re-raise)
         raise error  # Or log, or pass
 
+async def _no_default_command_handling(message):
+    # twitchio's Bot.event_message would run handle_commands a second time for
+    # every message; MessageRouter is the single entry point for commands.
+    return
+
 def prepare(bot):
     if not bot.get_cog("MessageRouter"):
-        bot.add_cog(MessageRouter(bot))
\ No newline at end of file
+        bot.event_message = _no_default_command_handling
+        bot.add_cog(MessageRouter(bot))
@@ -1,87 +1,171 @@
-import json
+import asyncio
 import os
-import random
+import secrets
+import time
+from collections import Counter, OrderedDict
+
 from twitchio.ext import commands
 
+from chat_scheduler import notify, say
+from convert_raffle_json import convert_state
+from metrics import RAFFLE_SAVE, RAFFLE_SHARDS
+from raffle_draw import weighted_sample, weights_digest
+from raffle_index import NumberIndex
+from raffle_journal import RaffleJournal, apply_record, channel_key, copy_state_files, default_state
+from raffle_sqlite import RaffleDB, SqliteRaffleStore
+
 # Always use raffle_state.json in the /data directory at project root
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_DIR = os.path.join(PROJECT_ROOT, "data")
 os.makedirs(DATA_DIR, exist_ok=True)
 RAFFLE_STATE_FILE = os.path.join(DATA_DIR, "raffle_state.json")
+# One state file + journal per channel: data/raffle/<channel>.json
+RAFFLE_DIR = os.path.join(DATA_DIR, "raffle")
+RAFFLE_IDLE_SECONDS = float(os.getenv("RAFFLE_IDLE_SECONDS", "1800"))
+# "json" (snapshot + journal files) or "sqlite" (every channel in one WAL database)
+RAFFLE_BACKEND = os.getenv("RAFFLE_BACKEND", "json").lower()
+RAFFLE_DB_FILE = os.getenv("RAFFLE_DB_FILE", os.path.join(DATA_DIR, "raffle.sqlite3"))
+# New chatters' entries are collected this long and written as one commit (0 = right away)
+RAFFLE_AWARD_WINDOW = float(os.getenv("RAFFLE_AWARD_WINDOW", "0.5"))
+# Highest number !openraffle accepts; the number index allocates a slot for each one
+RAFFLE_MAX_NUMBER = int(os.getenv("RAFFLE_MAX_NUMBER", "99999"))
+MAX_WEIGHTED_WINNERS = 10  # so the winners fit in one chat line
+DRAW_LOG_SIZE = 50
 
 class RaffleState:
-    def __init__(self, state_file=RAFFLE_STATE_FILE):
+    def __init__(self, state_file=RAFFLE_STATE_FILE, journal_file=None, store=None):
         self.state_file = state_file
-        self.state = {
-            "is_open": False,
-            "entries_per_chat": 1,
-            "entries": {},
-            "picks": {},
-            "chat_awarded": set(),
-            "winning_number": None,
-            "winner": None,
-        }
+        # Anything with RaffleJournal's load/append/compact, e.g. a SqliteRaffleStore
+        self.journal = store or RaffleJournal(state_file, journal_file)
+        self.state = default_state()
+        self.index = NumberIndex(self.state["max_number"] + 1)
         self.load()
 
     def load(self):
-        if os.path.exists(self.state_file):
-            with open(self.state_file, "r") as f:
-                data = json.load(f)
-            self.state.update(data)
+        snapshot, records = self.journal.load()
+        if snapshot is not None:
+            self.state.update(convert_state(snapshot))
             def intify(nums):
                 return set(int(n) for n in nums)
             self.state["picks"] = {user: intify(nums) for user, nums in self.state.get("picks", {}).items()}
             self.state["chat_awarded"] = set(self.state.get("chat_awarded", []))
-        else:
+            # Zero balances are the same as no balance; don't hold them in memory
+            self.state["entries"] = {user: n for user, n in self.state["entries"].items() if n}
+        for rec in records:
+            apply_record(self.state, rec)
+        self.index = NumberIndex(self.state["max_number"] + 1)
+        self.index.rebuild(self.state["picks"])
+        if self.journal.needs_snapshot():
             self.save()
 
     def save(self):
-        data = dict(self.state)
-        data["picks"] = {user: [int(n) for n in nums] for user, nums in self.state["picks"].items()}
-        data["chat_awarded"] = list(self.state["chat_awarded"])
-        with open(self.state_file, "w") as f:
-            json.dump(data, f, indent=2)
+        """Write a compacted snapshot of the whole state and truncate the journal."""
+        with RAFFLE_SAVE.time(kind="snapshot"):
+            self.journal.compact(self.state)
+
+    def close(self):
+        """Snapshot anything still only in the journal and release the file handle."""
+        if self.journal.pending:
+            self.save()
+        self.journal.close()
+
+    def commit(self, *records):
+        """Write records to the journal as one transaction, then apply them in memory.
+
+        If the write fails nothing is applied, so memory never runs ahead of disk.
+        """
+        with RAFFLE_SAVE.time(kind="journal"):
+            self.journal.append(records)
+        for rec in records:
+            apply_record(self.state, rec)
+            self._index_record(rec)
+        if self.journal.should_compact():
+            self.save()
 
-    def open_raffle(self, entries_per_chat):
+    def _index_record(self, rec):
+        # Keep the number index in step with the picks in self.state
+        op = rec["op"]
+        if op == "pick":
+            for n in rec["n"]:
+                self.index.claim(n, rec["u"])
+        elif op == "clear" and rec["k"] == "picks":
+            self.index.clear()
+        elif op == "set" and rec["k"] == "max_number":
+            self.index = NumberIndex(rec["v"] + 1)
+            self.index.rebuild(self.state["picks"])
+
+    def max_number(self):
+        return self.state["max_number"]
+
+    def format_number(self, n):
+        return f"{int(n):0{len(str(self.state['max_number']))}}"
+
+    def open_raffle(self, entries_per_chat, max_number=None):
         if not isinstance(entries_per_chat, int) or entries_per_chat < 1:
             raise ValueError("Entries per chat must be a positive integer.")
-        self.state["is_open"] = True
-        self.state["entries_per_chat"] = entries_per_chat
+        records = []
+        if max_number is not None and max_number != self.state["max_number"]:
+            if not isinstance(max_number, int) or max_number < 1:
+                raise ValueError("Max number must be a positive integer.")
+            if max_number > RAFFLE_MAX_NUMBER:
+                raise ValueError(f"Max number can't be more than {RAFFLE_MAX_NUMBER}.")
+            if self.state["picks"]:
+                raise ValueError("Can't change the number range while there are picks.")
+            records.append({"op": "set", "k": "max_number", "v": max_number})
         # DO NOT CLEAR picks or chat_awarded here!
-        self.state["winning_number"] = None
-        self.state["winner"] = None
-        self.save()
+        self.commit(
+            *records,
+            {"op": "set", "k": "is_open", "v": True},
+            {"op": "set", "k": "entries_per_chat", "v": entries_per_chat},
+            {"op": "set", "k": "winning_number", "v": None},
+            {"op": "set", "k": "winner", "v": None},
+        )
 
     def close_raffle(self):
-        self.state["is_open"] = False
+        self.commit({"op": "set", "k": "is_open", "v": False})
         self.save()
 
     def reset_for_new_round(self):
         # Only clear everything when explicitly called
-        self.state["picks"] = {}
-        self.state["chat_awarded"] = set()
-        self.state["winning_number"] = None
-        self.state["winner"] = None
-        self.state["entries"] = {}
+        self.commit(
+            {"op": "clear", "k": "picks"},
+            {"op": "clear", "k": "chat_awarded"},
+            {"op": "set", "k": "winning_number", "v": None},
+            {"op": "set", "k": "winner", "v": None},
+            {"op": "clear", "k": "entries"},
+        )
         self.save()
 
     def clear_picks(self):
-        self.state["picks"] = {}
-        self.save()
+        self.commit({"op": "clear", "k": "picks"})
 
     def clear_chat_awarded(self):
-        self.state["chat_awarded"] = set()
-        self.save()
+        self.commit({"op": "clear", "k": "chat_awarded"})
 
     def award_chat_entry(self, user):
         if user not in self.state["chat_awarded"]:
-            self.state["entries"].setdefault(user, 0)
-            self.state["entries"][user] += self.state["entries_per_chat"]
-            self.state["chat_awarded"].add(user)
-            self.save()
-            return self.state["entries_per_chat"]
+            count = self.state["entries_per_chat"]
+            self.commit(
+                {"op": "ent", "u": user, "v": self.user_entries(user) + count},
+                {"op": "award", "u": user},
+            )
+            return count
         return 0
 
+    def award_chat_entries(self, users):
+        """award_chat_entry for a batch of chatters as one commit; returns (users awarded, entries each)."""
+        count = self.state["entries_per_chat"]
+        awarded = self.state["chat_awarded"]
+        new = [user for user in dict.fromkeys(users) if user not in awarded]
+        if not new:
+            return [], count
+        records = []
+        for user in new:
+            records.append({"op": "ent", "u": user, "v": self.user_entries(user) + count})
+            records.append({"op": "award", "u": user})
+        self.commit(*records)
+        return new, count
+
     def add_entries(self, user, count):
         try:
             count = int(count)
@@ -89,9 +173,7 @@ class RaffleState:
             return False, "Entry count must be a number."
         if count < 1:
             return False, "You must add at least 1 entry."
-        self.state["entries"].setdefault(user, 0)
-        self.state["entries"][user] += count
-        self.save()
+        self.commit({"op": "ent", "u": user, "v": self.user_entries(user) + count})
         return True, f"Added {count} entr{'y' if count == 1 else 'ies'} to @{user}."
 
     def remove_entries(self, user, count):
@@ -101,36 +183,31 @@ class RaffleState:
             return False
         if count < 1:
             return False
-        self.state["entries"].setdefault(user, 0)
-        if self.state["entries"][user] < count:
+        if self.user_entries(user) < count:
             return False
-        self.state["entries"][user] -= count
-        self.save()
+        self.commit({"op": "ent", "u": user, "v": self.user_entries(user) - count})
         return True
 
     def pick_numbers(self, user, numbers):
-        already_picked = set()
-        for nums in self.state["picks"].values():
-            already_picked.update(nums)
         to_pick = []
         for number in numbers:
             try:
                 n = int(number)
             except Exception:
                 return False, f"Invalid number: {number}"
-            if n < 0 or n > 999:
-                return False, f"Pick a number between 0 and 999."
-            if n in already_picked or n in to_pick:
-                return False, f"Number {n:03} has already been picked."
+            if not self.index.in_range(n):
+                return False, f"Pick a number between 0 and {self.state['max_number']}."
+            if not self.index.is_free(n) or n in to_pick:
+                return False, f"Number {self.format_number(n)} has already been picked."
             to_pick.append(n)
         entries_user = self.state["entries"].get(user, 0)
         if entries_user < len(to_pick):
             return False, f"Not enough entries left (need {len(to_pick)}, have {entries_user})."
-        self.state["entries"][user] -= len(to_pick)
-        self.state["picks"].setdefault(user, set())
-        self.state["picks"][user].update(to_pick)
-        self.save()
-        pick_str = ", ".join(f"{n:03}" for n in to_pick)
+        self.commit(
+            {"op": "ent", "u": user, "v": entries_user - len(to_pick)},
+            {"op": "pick", "u": user, "n": to_pick},
+        )
+        pick_str = ", ".join(self.format_number(n) for n in to_pick)
         return True, f"Your picks: {pick_str}"
 
     def pick_random_numbers(self, user, count):
@@ -142,18 +219,14 @@ class RaffleState:
             return False, "You must pick at least 1 number."
         if self.state["entries"].get(user, 0) < count:
             return False, f"Not enough entries left (need {count}, have {self.state['entries'].get(user,0)})."
-        already_picked = set()
-        for nums in self.state["picks"].values():
-            already_picked.update(nums)
-        available = [n for n in range(1000) if n not in already_picked]
-        if len(available) < count:
+        if self.index.free_count() < count:
             return False, f"Not enough available numbers left to pick {count}."
-        picks = random.sample(available, count)
-        self.state["entries"][user] -= count
-        self.state["picks"].setdefault(user, set())
-        self.state["picks"][user].update(picks)
-        self.save()
-        pick_str = ", ".join(f"{n:03}" for n in sorted(picks))
+        picks = self.index.sample_free(count)
+        self.commit(
+            {"op": "ent", "u": user, "v": self.user_entries(user) - count},
+            {"op": "pick", "u": user, "n": picks},
+        )
+        pick_str = ", ".join(self.format_number(n) for n in sorted(picks))
         return True, f"Random picks: {pick_str}"
 
     def pick_number(self, user, number):
@@ -172,20 +245,47 @@ class RaffleState:
         return {user: sorted(int(n) for n in nums) for user, nums in self.state["picks"].items()}
 
     def draw_winner(self):
-        all_picked_numbers = []
-        for user, picks in self.state["picks"].items():
-            for num in picks:
-                all_picked_numbers.append((user, num))
-        if not all_picked_numbers:
+        drawn = self.index.random_taken()
+        if drawn is None:
             return None, "No numbers have been picked."
-        winner_user, winning_number = random.choice(all_picked_numbers)
-        self.state["winning_number"] = winning_number
-        self.state["winner"] = winner_user
-        self.save()
+        winner_user, winning_number = drawn
         # Only clear picks and chat_awarded after drawing a winner, NOT on open/close
-        self.clear_picks()
-        self.clear_chat_awarded()
-        return winner_user, f"Winner: @{winner_user} with {int(winning_number):03}!"
+        self.commit(
+            {"op": "draw", "u": winner_user, "n": winning_number},
+            {"op": "clear", "k": "picks"},
+            {"op": "clear", "k": "chat_awarded"},
+        )
+        self.save()
+        return winner_user, f"Winner: @{winner_user} with {self.format_number(winning_number)}!"
+
+    def draw_weighted(self, count=1, by="entries", seed=None, weights=None):
+        """Draw `count` different users weighted by entries left (or by `weights`, e.g. chat lines).
+
+        Entries and picks are left alone. Returns (winners, seed); the draw is
+        journaled and kept in draw_log with its seed and a digest of the
+        weights, so it can be replayed for an audit.
+        """
+        if weights is None:
+            weights = self.state["entries"]
+        if seed is None:
+            seed = secrets.randbits(32)
+        winners = weighted_sample(weights, count, seed)
+        if not winners:
+            return [], seed
+        audit = {
+            "at": int(time.time()),
+            "by": by,
+            "seed": seed,
+            "winners": winners,
+            "users": sum(1 for w in weights.values() if w > 0),
+            "weights": weights_digest(weights),
+        }
+        draw_log = self.state.get("draw_log", [])[-(DRAW_LOG_SIZE - 1):] + [audit]
+        self.commit(
+            {"op": "wdraw", "u": winners, "by": by, "seed": seed},
+            {"op": "set", "k": "draw_log", "v": draw_log},
+        )
+        return winners, seed
 
     def my_entries_string(self, user):
         entries = self.user_entries(user)
@@ -195,7 +295,7 @@ class RaffleState:
         picks = self.user_picks(user)
         if not picks:
             return "You have no picks in the current raffle."
-        return "Your picks: " + ", ".join(f"{n:03}" for n in picks)
+        return "Your picks: " + ", ".join(self.format_number(n) for n in picks)
 
     def gift_entries(self, giver, recipient, count):
         try:
@@ -208,10 +308,10 @@ class RaffleState:
             return False, "Cannot gift entries to yourself."
         if self.user_entries(giver) < count:
             return False, "Not enough entries to gift."
-        self.state["entries"][giver] -= count
-        self.state["entries"].setdefault(recipient, 0)
-        self.state["entries"][recipient] += count
-        self.save()
+        self.commit(
+            {"op": "ent", "u": giver, "v": self.user_entries(giver) - count},
+            {"op": "ent", "u": recipient, "v": self.user_entries(recipient) + count},
+        )
         return True, f"Gifted {count} entr{'y' if count == 1 else 'ies'} to @{recipient}."
 
     def trade_entries(self, from_user, to_user, count):
@@ -225,55 +325,217 @@ class RaffleState:
             return False, "Cannot trade with yourself."
         if self.user_entries(from_user) < count:
             return False, "Not enough entries to trade."
-        self.state["entries"][from_user] -= count
-        self.state["entries"].setdefault(to_user, 0)
-        self.state["entries"][to_user] += count
-        self.save()
+        self.commit(
+            {"op": "ent", "u": from_user, "v": self.user_entries(from_user) - count},
+            {"op": "ent", "u": to_user, "v": self.user_entries(to_user) + count},
+        )
         return True, f"Traded {count} entr{'y' if count == 1 else 'ies'} to @{to_user}."
 
 
+class RaffleShards:
+    """Per-channel RaffleState, loaded on first use and dropped again when idle.
+
+    Each channel has its own snapshot + journal under data/raffle/, so a raffle
+    opened in one channel never touches another's entries. States live in an
+    OrderedDict in last-use order; whenever one is fetched, the ones nobody has
+    touched for idle_seconds are closed (compacted) and let go from the front,
+    so memory follows the channels that are actually busy.
+
+    The single raffle_state.json from before channels had their own state is
+    copied in as the legacy channel's state (the first of TWITCH_CHANNELS)
+    the first time that channel is loaded; the old file is left as it was.
+    With the sqlite backend a channel with no rows yet imports its JSON file
+    (or the legacy one) the same way.
+    """
+
+    def __init__(self, data_dir=RAFFLE_DIR, idle_seconds=RAFFLE_IDLE_SECONDS,
+                 legacy_file=RAFFLE_STATE_FILE, legacy_channel=None, clock=time.monotonic,
+                 backend=RAFFLE_BACKEND, db_file=RAFFLE_DB_FILE):
+        if backend not in ("json", "sqlite"):
+            raise ValueError(f"Unknown raffle backend: {backend}")
+        self.backend = backend
+        self.db_file = db_file
+        self.db = None
+        self.data_dir = data_dir
+        self.idle_seconds = idle_seconds
+        self.legacy_file = legacy_file
+        if legacy_channel is None:
+            legacy_channel = os.getenv("TWITCH_CHANNELS", "").split(",")[0]
+        self.legacy_channel = channel_key(legacy_channel) if legacy_channel.strip() else None
+        self.clock = clock
+        self.states = OrderedDict()  # channel -> [RaffleState, last use]
+        self.loaded = 0
+        self.evicted = 0
+
+    def state_file(self, channel):
+        return os.path.join(self.data_dir, channel_key(channel) + ".json")
+
+    def get(self, channel):
+        key = channel_key(channel)
+        now = self.clock()
+        shard = self.states.get(key)
+        if shard is None:
+            shard = self.states[key] = [self._load(key), now]
+            self.loaded += 1
+        else:
+            shard[1] = now
+            self.states.move_to_end(key)
+        self._evict(now)
+        return shard[0]
+
+    def _load(self, key):
+        os.makedirs(self.data_dir, exist_ok=True)
+        path = self.state_file(key)
+        legacy = key == self.legacy_channel and os.path.exists(self.legacy_file)
+        if self.backend == "sqlite":
+            if self.db is None:
+                self.db = RaffleDB(self.db_file)
+            import_file = path if os.path.exists(path) else (self.legacy_file if legacy else None)
+            return RaffleState(path, store=SqliteRaffleStore(self.db, key, import_file))
+        if legacy and not os.path.exists(path):
+            copy_state_files(self.legacy_file, path)
+        return RaffleState(path)
+
+    def _evict(self, now):
+        cutoff = now - self.idle_seconds
+        while self.states:
+            key, (state, last) = next(iter(self.states.items()))
+            if last > cutoff:
+                break
+            del self.states[key]
+            state.close()
+            self.evicted += 1
+
+    def close(self):
+        while self.states:
+            _, (state, _) = self.states.popitem(last=False)
+            state.close()
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    def stats(self):
+        return {"loaded": len(self.states), "loads": self.loaded, "evicted": self.evicted}
+
+
+_shards = None
+
+
+def get_raffle_shards():
+    """Return the process-wide RaffleShards."""
+    global _shards
+    if _shards is None:
+        _shards = RaffleShards()
+        RAFFLE_SHARDS.set_function(lambda: len(_shards.states))
+    return _shards
+
+
 class RaffleCog(commands.Cog):
 
-    def __init__(self, bot):
+    def __init__(self, bot, state=None, shards=None, award_window=RAFFLE_AWARD_WINDOW):
         self.bot = bot
-        self.state = RaffleState()
+        # A fixed state (benchmarks) serves every channel; otherwise each channel gets its own
+        self.fixed_state = state
+        self.shards = shards or (None if state else get_raffle_shards())
+        self.award_window = award_window
+        self.pending_awards = {}  # channel name -> (first message, {user: None})
+        self.award_tasks = {}
+        self.activity = {}  # channel name -> Counter of chat lines per user since the raffle opened
+
+    def channel_state(self, channel):
+        if self.fixed_state is not None:
+            return self.fixed_state
+        return self.shards.get(channel.name if channel else None)
+
+    async def ready_state(self, ctx):
+        """The channel's state with any awards still in the window applied, so replies see them."""
+        await self.flush_awards(ctx.channel.name)
+        return self.channel_state(ctx.channel)
+
+    def apply_awards(self, channel_name):
+        """Commit a channel's pending awards as one batch; returns (message, users, count)."""
+        pending = self.pending_awards.pop(channel_name, None)
+        if pending is None:
+            return None, [], 0
+        message, users = pending
+        state = self.channel_state(message.channel)
+        if not state.state["is_open"]:
+            return message, [], 0
+        users, count = state.award_chat_entries(users)
+        return message, users, count
+
+    async def flush_awards(self, channel_name):
+        message, users, count = self.apply_awards(channel_name)
+        if not users:
+            return
+        # The scheduler merges these into as few lines as fit
+        template = f"{{items}} – Here {'is' if count == 1 else 'are'} {count} complimentary entr{'y' if count == 1 else 'ies'}."
+        for user in users:
+            await notify(message, f"chat_award:{count}", f"@{user}", template)
+
+    async def _flush_awards_later(self, channel_name):
+        try:
+            await asyncio.sleep(self.award_window)
+            await self.flush_awards(channel_name)
+        finally:
+            self.award_tasks.pop(channel_name, None)
+
+    def close(self):
+        """Write any awards still in their window (without announcing them) and close the shards."""
+        for task in self.award_tasks.values():
+            task.cancel()
+        for channel_name in list(self.pending_awards):
+            self.apply_awards(channel_name)
+        if self.shards:
+            self.shards.close()
 
     @commands.command(name="openraffle")
-    async def open_raffle_cmd(self, ctx, entries_per_chat: int = 1):
+    async def open_raffle_cmd(self, ctx, entries_per_chat: int = 1, max_number: int = None):
         if not ctx.author.is_mod:
-            await ctx.send("Only mods can open the raffle.")
+            await say(ctx, "Only mods can open the raffle.")
             return
+        state = await self.ready_state(ctx)
         if entries_per_chat < 1:
-            await ctx.send("Entries per chat must be at least 1.")
+            await say(ctx, "Entries per chat must be at least 1.")
             return
-        self.state.open_raffle(entries_per_chat)
-        await ctx.send(f"Raffle is now open! Anyone who chats gets {entries_per_chat} free entr{'y' if entries_per_chat == 1 else 'ies'}!")
+        was_open = state.state["is_open"]
+        try:
+            state.open_raffle(entries_per_chat, max_number)
+        except ValueError as e:
+            await say(ctx, str(e))
+            return
+        if not was_open:
+            self.activity.pop(ctx.channel.name, None)  # chat lines count from this opening
+        await say(ctx, f"Raffle is now open! Anyone who chats gets {entries_per_chat} free entr{'y' if entries_per_chat == 1 else 'ies'}!")
 
     @commands.command(name="closeraffle")
     async def close_raffle_cmd(self, ctx):
         if not ctx.author.is_mod:
-            await ctx.send("Only mods can close the raffle.")
+            await say(ctx, "Only mods can close the raffle.")
             return
-        self.state.close_raffle()
-        await ctx.send("Raffle is now closed.")
+        state = await self.ready_state(ctx)
+        state.close_raffle()
+        await say(ctx, "Raffle is now closed.")
 
     @commands.command(name="clearraffle")
     async def clearraffle_cmd(self, ctx):
         if not ctx.author.is_mod:
-            await ctx.send("Only mods can clear the raffle.")
+            await say(ctx, "Only mods can clear the raffle.")
             return
+        state = await self.ready_state(ctx)
         # This is the NUCLEAR OPTION: clears everything, for emergencies only!
-        self.state.reset_for_new_round()
-        await ctx.send("All raffle data has been cleared. This action is irreversible!")
+        state.reset_for_new_round()
+        await say(ctx, "All raffle data has been cleared. This action is irreversible!")
 
     @commands.command(name="raffle")
     async def raffle_cmd(self, ctx, *args):
+        state = await self.ready_state(ctx)
         user = ctx.author.name.lower()
-        if not self.state.state["is_open"]:
-            await ctx.send("Raffle is not open.")
+        if not state.state["is_open"]:
+            await say(ctx, "Raffle is not open.")
             return
         if not args:
-            await ctx.send("Pick a number: !raffle <number>, !raffle random, !raffle random 3, or !raffle 123,456,789")
+            await say(ctx, "Pick a number: !raffle <number>, !raffle random, !raffle random 3, or !raffle 123,456,789")
             return
 
         # !raffle random N
@@ -282,16 +544,16 @@ class RaffleCog(commands.Cog):
                 try:
                     n = int(args[1])
                 except Exception:
-                    await ctx.send("Usage: !raffle random [amount]")
+                    await say(ctx, "Usage: !raffle random [amount]")
                     return
                 if n < 1:
-                    await ctx.send("You must pick at least 1 number.")
+                    await say(ctx, "You must pick at least 1 number.")
                     return
-                ok, msg = self.state.pick_random_numbers(user, n)
-                await ctx.send(f"@{user} – {msg}")
+                ok, msg = state.pick_random_numbers(user, n)
+                await say(ctx, f"@{user} – {msg}")
                 return
-            ok, msg = self.state.pick_random_number(user)
-            await ctx.send(f"@{user} – {msg}")
+            ok, msg = state.pick_random_number(user)
+            await say(ctx, f"@{user} – {msg}")
             return
 
         # !raffle 123,456,789 or !raffle 123 456 789
@@ -306,70 +568,106 @@ class RaffleCog(commands.Cog):
             try:
                 n = int(number)
             except Exception:
-                await ctx.send(f"@{user} – Invalid number: {number}")
+                await say(ctx, f"@{user} – Invalid number: {number}")
                 return
-            if n < 0 or n > 999:
-                await ctx.send(f"@{user} – Pick a number between 0 and 999.")
+            if n < 0 or n > state.max_number():
+                await say(ctx, f"@{user} – Pick a number between 0 and {state.max_number()}.")
                 return
         if len(numbers) == 1:
-            ok, msg = self.state.pick_number(user, numbers[0])
+            ok, msg = state.pick_number(user, numbers[0])
         else:
-            ok, msg = self.state.pick_numbers(user, numbers)
-        await ctx.send(f"@{user} – {msg}")
+            ok, msg = state.pick_numbers(user, numbers)
+        await say(ctx, f"@{user} – {msg}")
 
     @commands.command(name="myentries")
     async def myentries_cmd(self, ctx):
+        state = await self.ready_state(ctx)
         user = ctx.author.name.lower()
-        await ctx.send(f"@{user} – {self.state.my_entries_string(user)}")
+        await say(ctx, f"@{user} – {state.my_entries_string(user)}")
 
     @commands.command(name="mypicks")
     async def mypicks_cmd(self, ctx):
+        state = await self.ready_state(ctx)
         user = ctx.author.name.lower()
-        await ctx.send(f"@{user} – {self.state.my_picks_string(user)}")
+        await say(ctx, f"@{user} – {state.my_picks_string(user)}")
 
     @commands.command(name="drawraffle")
     async def drawraffle_cmd(self, ctx):
         if not ctx.author.is_mod:
-            await ctx.send("Only mods can draw a winner.")
+            await say(ctx, "Only mods can draw a winner.")
             return
-        winner, msg = self.state.draw_winner()
-        await ctx.send(msg if winner else "No winner could be drawn.")
+        state = await self.ready_state(ctx)
+        winner, msg = state.draw_winner()
+        await say(ctx, msg if winner else "No winner could be drawn.")
+
+    @commands.command(name="drawweighted")
+    async def drawweighted_cmd(self, ctx, *args):
+        # !drawweighted [winners] [entries|activity] [seed=<seed>], in any order
+        if not ctx.author.is_mod:
+            await say(ctx, "Only mods can draw a winner.")
+            return
+        count, by, seed = 1, "entries", None
+        counted = False
+        for arg in args:
+            key, sep, value = arg.partition("=")
+            if arg.lower() in ("entries", "activity"):
+                by = arg.lower()
+            elif not counted and arg.isdigit():
+                count, counted = int(arg), True
+            elif sep and key.lower() == "seed" and value:
+                seed = int(value) if value.isdigit() else value
+            else:
+                await say(ctx, "Usage: !drawweighted [winners] [entries|activity] [seed=<seed>]")
+                return
+        if not 1 <= count <= MAX_WEIGHTED_WINNERS:
+            await say(ctx, f"Draw between 1 and {MAX_WEIGHTED_WINNERS} winners.")
+            return
+        state = await self.ready_state(ctx)
+        weights = self.activity.get(ctx.channel.name, {}) if by == "activity" else None
+        winners, seed = state.draw_weighted(count, by, seed, weights)
+        if not winners:
+            await say(ctx, "No one has any entries." if by == "entries" else "No one has chatted since the raffle opened.")
+            return
+        names = ", ".join(f"@{user}" for user in winners)
+        await say(ctx, f"Winner{'s' if len(winners) > 1 else ''} (weighted by {by}, seed={seed}): {names}")
 
     @commands.command(name="giveraffle")
     async def giveraffle_cmd(self, ctx, count: int = None, recipient: str = None):
+        state = await self.ready_state(ctx)
         user = ctx.author.name.lower()
         if count is None or recipient is None:
-            await ctx.send("Usage: !giveraffle <count> @user")
+            await say(ctx, "Usage: !giveraffle <count> @user")
             return
         recipient = recipient.lstrip("@").lower()
         try:
             count = int(count)
         except Exception:
-            await ctx.send("Entry count must be a number.")
+            await say(ctx, "Entry count must be a number.")
             return
         if count < 1:
-            await ctx.send("You must gift at least 1 entry.")
+            await say(ctx, "You must gift at least 1 entry.")
             return
-        ok, msg = self.state.gift_entries(user, recipient, count)
-        await ctx.send(f"@{user} – {msg}")
+        ok, msg = state.gift_entries(user, recipient, count)
+        await say(ctx, f"@{user} – {msg}")
 
     @commands.command(name="traderaffle")
     async def traderaffle_cmd(self, ctx, count: int = None, recipient: str = None):
+        state = await self.ready_state(ctx)
         user = ctx.author.name.lower()
         if count is None or recipient is None:
-            await ctx.send("Usage: !traderaffle <count> @user")
+            await say(ctx, "Usage: !traderaffle <count> @user")
             return
         recipient = recipient.lstrip("@").lower()
         try:
             count = int(count)
         except Exception:
-            await ctx.send("Entry count must be a number.")
+            await say(ctx, "Entry count must be a number.")
             return
         if count < 1:
-            await ctx.send("You must trade at least 1 entry.")
+            await say(ctx, "You must trade at least 1 entry.")
             return
-        ok, msg = self.state.trade_entries(user, recipient, count)
-        await ctx.send(f"@{user} – {msg}")
+        ok, msg = state.trade_entries(user, recipient, count)
+        await say(ctx, f"@{user} – {msg}")
 
     @commands.Cog.event()
     async def event_message(self, message):
@@ -377,12 +675,26 @@ class RaffleCog(commands.Cog):
         if message.echo or message.content.startswith("!"):
             return
         user = message.author.name.lower()
-        if self.state.state["is_open"] and user not in self.state.state["chat_awarded"]:
-            count = self.state.award_chat_entry(user)
-            if count > 0:
-                await message.channel.send(
-                    f"@{user} – Here {'is' if count == 1 else 'are'} {count} complimentary entr{'y' if count == 1 else 'ies'}."
-                )
+        state = self.channel_state(message.channel)
+        if not state.state["is_open"]:
+            return
+        channel_name = message.channel.name
+        activity = self.activity.get(channel_name)
+        if activity is None:
+            activity = self.activity[channel_name] = Counter()
+        activity[user] += 1  # weights for !drawweighted activity
+        if user in state.state["chat_awarded"]:
+            return
+        # New chatters arrive in bursts when a raffle opens: collect them for
+        # award_window and write them as one commit instead of one per chatter
+        pending = self.pending_awards.get(channel_name)
+        if pending is None:
+            pending = self.pending_awards[channel_name] = (message, {})
+        pending[1][user] = None
+        if self.award_window <= 0:
+            await self.flush_awards(channel_name)
+        elif channel_name not in self.award_tasks:
+            self.award_tasks[channel_name] = asyncio.create_task(self._flush_awards_later(channel_name))
 
 def prepare(bot):
     if not bot.get_cog("RaffleCog"):
@@ -1,14 +1,23 @@
+import asyncio
 import os
 import random
 import logging
 from twitchio.ext import commands
 
+from chat_scheduler import notify, say
+from cooldowns import get_cooldowns, sfx_group
+from sfx_player import build_sfx_player
+
 logger = logging.getLogger("sfx")
 
 class SFXCog(commands.Cog):
-    def __init__(self, bot, sfx_registry):
+    dispatch_priority = 20  # after overlay commands, before twitchio commands
+
+    def __init__(self, bot, sfx_registry, sfx_player=None):
         self.bot = bot
         self.sfx_registry = sfx_registry
+        self.sfx_player = sfx_player or build_sfx_player()
+        self.cooldowns = get_cooldowns()
         print(f"[SFXCog __init__] sfx_registry: {self.sfx_registry}")
         if self.sfx_registry:
             file_count = len(getattr(self.sfx_registry, "file_commands", {}))
@@ -17,6 +26,41 @@ class SFXCog(commands.Cog):
         else:
             print("[SFXCog __init__] No sfx_registry provided!")
 
+    def dispatch_entries(self):
+        tokens = {}
+        if self.sfx_registry:
+            tokens.update({cmd: self.play_folder_command for cmd in self.sfx_registry.folder_commands})
+            tokens.update({cmd: self.play_file_command for cmd in self.sfx_registry.file_commands})
+        return tokens, []
+
+    def dispatch_version(self):
+        return getattr(self.sfx_registry, "version", 0)
+
+    async def play_file_command(self, message, command, args=""):
+        # SFX file command: play sound, no chat message
+        rel_path = self.sfx_registry.file_commands.get(command)
+        if rel_path is None:
+            return False  # removed since the dispatch table was built
+        if not self.cooldowns.allow("sfx", sfx_group(command, rel_path), command, message):
+            return True
+        self.sfx_player.play(os.path.join(self.sfx_registry.sfx_dir, rel_path))
+        return True
+
+    async def play_folder_command(self, message, command, args=""):
+        # SFX folder command: play random sound, announce the trigger command in chat
+        files = self.sfx_registry.folder_commands.get(command)
+        if not files:
+            return False  # removed since the dispatch table was built
+        if not self.cooldowns.allow("sfx", command.lstrip("!"), command, message):
+            return True
+        sfx_path = os.path.join(self.sfx_registry.sfx_dir, random.choice(files))
+        file_cmd = f"!{os.path.splitext(os.path.basename(sfx_path))[0]}"
+        self.sfx_player.play(sfx_path)
+        # Announce the trigger for the sound that was played; a burst of
+        # folder commands is announced as one line
+        await notify(message, "sfx_played", file_cmd, "{items}")
+        return True
+
     async def try_handle_sfx(self, message):
         if message.echo:
             return False
@@ -27,39 +71,41 @@ class SFXCog(commands.Cog):
             return False
 
         cmd = message.content.split()[0]
-
-        # SFX file command: play sound, no chat message
         if self.sfx_registry and cmd in getattr(self.sfx_registry, "file_commands", {}):
-            sfx_path = os.path.join(self.sfx_registry.sfx_dir, self.sfx_registry.file_commands[cmd])
-            try:
-                from playsound import playsound
-                playsound(sfx_path)
-            except Exception as e:
-                logger.error(f"Error playing SFX sound: {e}")
-            return True  # SFX handled
-
-        # SFX folder command: play random sound, announce the trigger command in chat
+            return await self.play_file_command(message, cmd)
         if self.sfx_registry and cmd in getattr(self.sfx_registry, "folder_commands", {}):
-            files = self.sfx_registry.folder_commands[cmd]
-            if files:
-                sfx_path = os.path.join(self.sfx_registry.sfx_dir, random.choice(files))
-                file_cmd = f"!{os.path.splitext(os.path.basename(sfx_path))[0]}"
-                try:
-                    from playsound import playsound
-                    playsound(sfx_path)
-                except Exception as e:
-                    logger.error(f"Error playing SFX sound: {e}")
-                # Announce the trigger for the sound that was played
-                await message.channel.send(file_cmd)
-            return True  # SFX handled
-
+            return await self.play_folder_command(message, cmd)
         return False  # Not an SFX command
 
+    @commands.command(name="sfxstats")
+    async def sfxstats_cmd(self, ctx):
+        if not ctx.author.is_mod:
+            return
+        stats = self.sfx_player.stats()
+        await say(ctx,
+            f"SFX ({stats['policy']}, {stats['voices']} voice{'s' if stats['voices'] != 1 else ''}): "
+            f"{stats['queue_depth']} queued, {stats['active']} playing, "
+            f"{stats['played']} played, {stats['dropped']} dropped."
+        )
+
+    @commands.command(name="sfxrescan")
+    async def sfxrescan_cmd(self, ctx):
+        # Rebuild the SFX manifest from scratch (the walk runs off the event loop)
+        if not ctx.author.is_mod or not self.sfx_registry:
+            return
+        dirs, index, stats = await asyncio.to_thread(self.sfx_registry.scan, rebuild=True)
+        self.sfx_registry.apply(dirs, index)
+        await say(ctx,
+            f"SFX library rescanned: {len(index.file_commands)} file and {len(index.folder_commands)} folder commands "
+            f"({stats['clips_probed']} clips in {stats['seconds']}s)."
+        )
+
 def prepare(bot):
     sfx_registry = getattr(bot, "sfx_registry", None)
+    sfx_player = getattr(bot, "sfx_player", None)
     print(f"[SFXCog.prepare] sfx_registry: {sfx_registry}")
     if not bot.get_cog("SFXCog"):
-        bot.add_cog(SFXCog(bot, sfx_registry))
+        bot.add_cog(SFXCog(bot, sfx_registry, sfx_player))
         print("Loaded cog : SFXCog")
     else:
         print("SFXCog already loaded")
\ No newline at end of file
@@ -1,50 +1,22 @@
 import os
-import random
 import logging
-import aiohttp
 from twitchio.ext import commands
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DERPISM_FILE = os.path.join(BASE_DIR, "..", "data", "derpisms.txt")
-TWITCH_CLIENT_ID = os.getenv("TWITCH_CLIENT_ID")
-TWITCH_OAUTH_TOKEN = os.getenv("TWITCH_OAUTH_TOKEN")
+from chat_scheduler import say
+from helix_client import get_helix_client
+from quote_store import DATA_DIR, get_quote_store
+
+DERPISM_FILE = os.path.join(DATA_DIR, "derpisms.txt")
 
 async def get_last_game(twitch_name):
     """Fetch the last game played by the user using Twitch API."""
-    if not TWITCH_CLIENT_ID or not TWITCH_OAUTH_TOKEN:
+    client = get_helix_client()
+    if client is None:
         return None
-
-    headers = {
-        "Client-ID": TWITCH_CLIENT_ID,
-        "Authorization": f"Bearer {TWITCH_OAUTH_TOKEN}"
-    }
-
-    # Get user ID
-    async with aiohttp.ClientSession() as session:
-        async with session.get(
-            f"https://api.twitch.tv/helix/users?login={twitch_name}",
-            headers=headers
-        ) as resp:
-            data = await resp.json()
-            if "data" not in data or not data["data"]:
-                return None
-            user_id = data["data"][0]["id"]
-
-        # Get last stream info (if any)
-        async with session.get(
-            f"https://api.twitch.tv/helix/channels?broadcaster_id={user_id}",
-            headers=headers
-        ) as resp:
-            data = await resp.json()
-            if "data" in data and data["data"]:
-                return data["data"][0].get("game_name")
-    return None
+    return await client.get_last_game(twitch_name)
 
 def load_derpisms():
-    if not os.path.isfile(DERPISM_FILE):
-        return []
-    with open(DERPISM_FILE, "r", encoding="utf-8") as f:
-        return [line.strip() for line in f if line.strip()]
+    return get_quote_store(DERPISM_FILE).all()
 
 class ShoutoutCog(commands.Cog):
 
@@ -56,7 +28,7 @@ class ShoutoutCog(commands.Cog):
     async def so(self, ctx: commands.Context):
         parts = ctx.message.content.split(maxsplit=1)
         if len(parts) != 2 or not parts[1].startswith("@"):
-            await ctx.send("Usage: !so @username")
+            await say(ctx, "Usage: !so @username")
             return
 
         twitchname = parts[1].lstrip("@").strip()
@@ -65,26 +37,26 @@ class ShoutoutCog(commands.Cog):
             msg = f"Hey go check out our friend @{twitchname} at https://twitch.tv/{twitchname}! Last seen playing: {game}"
         else:
             msg = f"Hey go check out our friend @{twitchname} at https://twitch.tv/{twitchname}!"
-        await ctx.send(msg)
+        await say(ctx, msg)
 
     @commands.command(name="os")
     async def os(self, ctx: commands.Context):
         parts = ctx.message.content.split(maxsplit=1)
         if len(parts) != 2 or not parts[1].startswith("@"):
-            await ctx.send("Usage: !os @username")
+            await say(ctx, "Usage: !os @username")
             return
 
         twitchname = parts[1].lstrip("@").strip()
-        derpisms = load_derpisms()
+        derpisms = get_quote_store(DERPISM_FILE)
         if len(derpisms) < 2:
-            await ctx.send("Not enough derpisms for anti-shoutout!")
+            await say(ctx, "Not enough derpisms for anti-shoutout!")
             return
-        derp1, derp2 = random.sample(derpisms, 2)
+        derp1, derp2 = derpisms.sample(2)
         msg = (
             f"iAmDar is such a {derp1}! Why would you waste your time with such a {derp2}? "
             f"Go check out @{twitchname} at https://twitch.tv/{twitchname}!"
         )
-        await ctx.send(msg)
+        await say(ctx, msg)
 
 def prepare(bot):
     if not bot.get_cog("ShoutoutCog"):
@@ -1,8 +1,10 @@
 import os
-import random
 import logging
 from twitchio.ext import commands
 
+from chat_scheduler import say
+from quote_store import get_quote_store
+
 # Always use tic.txt in the src/data directory (relative to this file)
 SRC_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(SRC_DIR, "..", "data")
@@ -18,6 +20,7 @@ class TicCog(commands.Cog):
         if not os.path.isfile(self.file_path):
             with open(self.file_path, "w", encoding="utf-8") as f:
                 f.write("")
+        self.store = get_quote_store(self.file_path)
         self.logger = logging.getLogger("tic")
 
     @commands.command(name="tic")
@@ -31,14 +34,14 @@ class TicCog(commands.Cog):
 
         elif parts[1].lower() == "add":
             if not (hasattr(ctx.author, "is_mod") and ctx.author.is_mod):
-                await ctx.send("❌ Only mods can add tics.")
+                await say(ctx, "❌ Only mods can add tics.")
                 return
             if len(parts) < 3:
-                await ctx.send("⚠️ Usage: !tic add <text>")
+                await say(ctx, "⚠️ Usage: !tic add <text>")
                 return
             new_tic = parts[2].strip()
             if not new_tic:
-                await ctx.send("⚠️ Cannot add empty tic.")
+                await say(ctx, "⚠️ Cannot add empty tic.")
                 return
             await self.add_tic(ctx, new_tic)
 
@@ -46,38 +49,32 @@ class TicCog(commands.Cog):
             index = int(parts[1]) - 1  # 1-based input
             await self.send_tic_by_index(ctx, index)
         else:
-            await ctx.send("❌ Invalid usage. Try !tic, !tic 12, or !tic add <text>")
+            await say(ctx, "❌ Invalid usage. Try !tic, !tic 12, or !tic add <text>")
 
     async def send_random_tic(self, ctx):
-        tics = self.load_tics()
-        if not tics:
-            await ctx.send("🫠 No tics found.")
+        quote = self.store.random()
+        if quote is None:
+            await say(ctx, "🫠 No tics found.")
             return
-        quote = random.choice(tics)
-        await ctx.send(f"🔔 Tic: \"{quote}\"")
+        await say(ctx, f"🔔 Tic: \"{quote}\"")
 
     async def send_tic_by_index(self, ctx, index):
-        tics = self.load_tics()
-        if 0 <= index < len(tics):
-            await ctx.send(f"📘 Tic #{index + 1}: \"{tics[index]}\"")
+        tic = self.store.get(index)
+        if tic is not None:
+            await say(ctx, f"📘 Tic #{index + 1}: \"{tic}\"")
         else:
-            await ctx.send(f"❌ No tic at #{index + 1}.")
+            await say(ctx, f"❌ No tic at #{index + 1}.")
 
     async def add_tic(self, ctx, text):
-        tics = self.load_tics()
-        if text in tics:
-            await ctx.send("⚠️ That tic already exists.")
+        number = await self.store.add(text)
+        if number is None:
+            await say(ctx, "⚠️ That tic already exists.")
             return
-        with open(self.file_path, "a", encoding="utf-8") as f:
-            f.write(f"{text}\n")
-        await ctx.send(f"✅ Added tic #{len(tics) + 1}: \"{text}\"")
+        await say(ctx, f"✅ Added tic #{number}: \"{text}\"")
         self.logger.info(f"Tic added by {ctx.author.name}: {text}")
 
     def load_tics(self):
-        if not os.path.isfile(self.file_path):
-            return []
-        with open(self.file_path, "r", encoding="utf-8") as f:
-            return [line.strip() for line in f if line.strip()]
+        return self.store.all()
 
 def prepare(bot):
     if not bot.get_cog("TicCog"):
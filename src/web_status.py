@@ -1,28 +1,118 @@
+import asyncio
+import contextlib
+import os
+import time
+from html import escape
+
+import uvicorn
 from fastapi import FastAPI
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse
+
+from metrics import CHANNELS, CHAT_MESSAGES, REGISTRY, SERVICE_UP, START_TIME, Histogram
 
 app = FastAPI()
 
-status_data = {
-    "twitch": {"status": "disconnected", "channels": []},
-    "discord": {"status": "disconnected", "channels": []}
-}
+# Status comes from the metrics registry: main.py sets bot_connected /
+# bot_channel_joined, everything else is updated where it happens.
+SERVICES = ("twitch", "discord")
+
+
+def _service_rows():
+    rows = []
+    for service in SERVICES:
+        up = SERVICE_UP.values.get((service,), 0)
+        channels = [channel for (svc, channel), joined in sorted(CHANNELS.values.items()) if svc == service and joined]
+        rows.append(f"""
+        <h2>{escape(service.capitalize())}</h2>
+        <p>Status: {"connected" if up else "disconnected"}</p>
+        <p>Channels: {escape(', '.join(channels))}</p>""")
+    return "".join(rows)
+
+
+def _fmt(value):
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return "+Inf" if value == float("inf") else f"{value:.4g}"
+    return str(value)
 
+
+def _metric_rows():
+    rows = []
+    for metric in REGISTRY.metrics.values():
+        if isinstance(metric, Histogram):
+            for key, (counts, total, count) in sorted(metric.values.items()):
+                labels = ", ".join(f"{n}={v}" for n, v in zip(metric.labelnames, key))
+                avg_ms = total / count * 1000 if count else None
+                p50 = metric.quantile(0.5, key)
+                p95 = metric.quantile(0.95, key)
+                rows.append(
+                    f"<tr><td>{escape(metric.name)}</td><td>{escape(labels)}</td>"
+                    f"<td>n={count}, avg={_fmt(avg_ms)} ms, p50&le;{_fmt(p50 * 1000 if p50 is not None else None)} ms, "
+                    f"p95&le;{_fmt(p95 * 1000 if p95 is not None else None)} ms</td></tr>"
+                )
+        else:
+            for _, key, _, value in metric.samples():
+                labels = ", ".join(f"{n}={v}" for n, v in zip(metric.labelnames, key))
+                rows.append(f"<tr><td>{escape(metric.name)}</td><td>{escape(labels)}</td><td>{_fmt(value)}</td></tr>")
+    return "".join(rows)
+
+
+# Both endpoints are async so they run on the bot's loop, the only thread that
+# adds label series; a plain def would iterate the registry from uvicorn's threadpool.
 @app.get("/", response_class=HTMLResponse)
-def root():
+async def root():
+    uptime = time.time() - START_TIME
+    messages = CHAT_MESSAGES.total()
     return f"""
     <html>
     <head><title>Mean Gene Bot Status</title></head>
     <body>
         <h1>Mean Gene Bot Status</h1>
-        <h2>Twitch</h2>
-        <p>Status: {status_data['twitch']['status']}</p>
-        <p>Channels: {', '.join(status_data['twitch']['channels'])}</p>
-        <h2>Discord</h2>
-        <p>Status: {status_data['discord']['status']}</p>
-        <p>Channels: {', '.join(status_data['discord']['channels'])}</p>
+        <p>Up {int(uptime // 3600)}h {int(uptime % 3600 // 60)}m, {messages} chat messages ({messages / max(uptime, 1):.2f}/s)</p>
+        {_service_rows()}
+        <h2>Metrics</h2>
+        <table border="1" cellpadding="4">
+        <tr><th>Metric</th><th>Labels</th><th>Value</th></tr>
+        {_metric_rows()}
+        </table>
+        <p><a href="/metrics">/metrics</a></p>
     </body>
     </html>
     """
 
-# For integration: update status_data in your bots as you connect/disconnect/etc.
\ No newline at end of file
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+STATUS_HOST = os.getenv("STATUS_HOST", "127.0.0.1")
+STATUS_PORT = int(os.getenv("STATUS_PORT", "8080"))
+
+
+class EmbeddedServer(uvicorn.Server):
+    """uvicorn server that runs as a task next to the bot.
+
+    main.py owns Ctrl+C and the shutdown order, so uvicorn must not install its
+    own signal handlers.
+    """
+
+    def install_signal_handlers(self):
+        pass
+
+    @contextlib.contextmanager
+    def capture_signals(self):
+        yield
+
+
+async def start_status_server(host=STATUS_HOST, port=STATUS_PORT):
+    """Serve the status app on the running loop. Returns (server, task)."""
+    server = EmbeddedServer(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+    task = asyncio.ensure_future(server.serve())
+    print(f"Status page serving at http://{host}:{port}")
+    return server, task
+
+
+async def stop_status_server(server, task):
+    server.should_exit = True
+    await task
\ No newline at end of file